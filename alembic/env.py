@@ -1,4 +1,5 @@
 from logging.config import fileConfig
+import re
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
@@ -7,7 +8,7 @@ from alembic import context
 
 # Import your models and settings
 from database.database import Base
-from database.models import User, Document, Chunk, Chat, Message, QueryLog
+from database.models import User, Document, Chunk, EmbeddingCache, Chat, Message, QueryLog
 from config.settings import settings
 
 # this is the Alembic Config object, which provides
@@ -27,6 +28,15 @@ target_metadata = Base.metadata
 DATABASE_URL = f"postgresql://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 config.set_main_option("sqlalchemy.url", DATABASE_URL)
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    # the hash partitions of chunks (and their indexes) are created by the partitioning
+    # migration, not by the models, so autogenerate must not drop them
+    if type_ == "table" and reflected and compare_to is None and re.fullmatch(r"chunks_p\d+", name):
+        return False
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -49,6 +59,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -72,7 +83,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
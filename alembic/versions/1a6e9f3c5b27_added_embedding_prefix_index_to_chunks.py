@@ -0,0 +1,35 @@
+"""added embedding prefix hnsw index to chunks
+
+Revision ID: 1a6e9f3c5b27
+Revises: f0b7c3e94d18
+Create Date: 2026-10-18 02:27:51.604418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1a6e9f3c5b27'
+down_revision: Union[str, Sequence[str], None] = 'f0b7c3e94d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # an expression index, the 512 dimension prefix is only stored in the index
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chunks_embedding_prefix_hnsw ON chunks "
+            "USING hnsw ((subvector(embedding, 1, 512)::vector(512)) vector_cosine_ops) "
+            "WITH (m = 16, ef_construction = 64)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chunks_embedding_prefix_hnsw")
@@ -0,0 +1,45 @@
+"""added content_hash and chunk_index to chunks
+
+Revision ID: 24ad9bc93be0
+Revises: 432861266e0d
+Create Date: 2026-10-17 13:27:05.481276
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '24ad9bc93be0'
+down_revision: Union[str, Sequence[str], None] = '432861266e0d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chunks', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.add_column('chunks', sa.Column('chunk_index', sa.Integer(), nullable=True))
+    op.create_index('ix_chunks_document_id_content_hash', 'chunks', ['document_id', 'content_hash'], unique=False)
+
+    # backfill, hashing the same way the ingestion pipeline does (sha256 of the utf-8 text)
+    op.execute("UPDATE chunks SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex')")
+    op.execute(
+        """
+        UPDATE chunks SET chunk_index = numbered.chunk_index
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY document_id ORDER BY id) - 1 AS chunk_index
+            FROM chunks
+        ) AS numbered
+        WHERE chunks.id = numbered.id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chunks_document_id_content_hash', table_name='chunks')
+    op.drop_column('chunks', 'chunk_index')
+    op.drop_column('chunks', 'content_hash')
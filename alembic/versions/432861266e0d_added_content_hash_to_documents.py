@@ -0,0 +1,32 @@
+"""added content_hash to documents
+
+Revision ID: 432861266e0d
+Revises: d7e43a69750d
+Create Date: 2026-10-17 11:04:52.630915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '432861266e0d'
+down_revision: Union[str, Sequence[str], None] = 'd7e43a69750d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ux_documents_user_id_content_hash', 'documents', ['user_id', 'content_hash'], unique=True)
+    op.create_index('ix_documents_content_hash', 'documents', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_documents_content_hash', table_name='documents')
+    op.drop_index('ux_documents_user_id_content_hash', table_name='documents')
+    op.drop_column('documents', 'content_hash')
@@ -0,0 +1,93 @@
+"""added chunks_partitioned, hash partitioned on user_id, kept in sync with chunks by a trigger
+
+Revision ID: 4b8d2f6a1c93
+Revises: 1a6e9f3c5b27
+Create Date: 2026-10-18 03:04:12.318840
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b8d2f6a1c93'
+down_revision: Union[str, Sequence[str], None] = '1a6e9f3c5b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+PARTITIONS = 16
+# every column; content_tsv is copied as computed by the chunks_content_tsv trigger of chunks
+COLUMNS = [
+    "id", "document_id", "user_id", "content", "embedding", "content_hash", "chunk_index",
+    "page_number", "char_start", "char_end", "minhash", "minhash_bands", "near_duplicate_key", "content_tsv",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # step 1 of moving chunks to a partitioned table without downtime: the new table, and a
+    # trigger mirroring every write to chunks into it. The next revision backfills the
+    # existing rows, builds the indexes and swaps the tables.
+    # ids keep coming from chunks_id_seq, so mirrored and backfilled rows keep their id
+    op.execute(
+        "CREATE TABLE chunks_partitioned ("
+        "id integer NOT NULL DEFAULT nextval('chunks_id_seq'), "
+        "document_id integer NOT NULL, "
+        "user_id integer NOT NULL, "
+        "content varchar NOT NULL, "
+        "embedding vector(3072), "
+        "content_hash varchar(64), "
+        "chunk_index integer, "
+        "page_number integer, "
+        "char_start integer, "
+        "char_end integer, "
+        "minhash bytea, "
+        "minhash_bands bigint[], "
+        "near_duplicate_key varchar(64), "
+        "content_tsv tsvector, "
+        "CONSTRAINT chunks_partitioned_pkey PRIMARY KEY (id, user_id), "
+        "CONSTRAINT chunks_partitioned_document_id_fkey FOREIGN KEY (document_id) "
+        "REFERENCES documents (id) ON DELETE CASCADE, "
+        "CONSTRAINT chunks_partitioned_user_id_fkey FOREIGN KEY (user_id) "
+        "REFERENCES users (id) ON DELETE CASCADE"
+        ") PARTITION BY HASH (user_id)"
+    )
+    for remainder in range(PARTITIONS):
+        op.execute(
+            f"CREATE TABLE chunks_p{remainder:02d} PARTITION OF chunks_partitioned "
+            f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})"
+        )
+
+    # an update is a delete and an insert, so a chunk moved to another user changes partition;
+    # the upsert wins over a backfill batch that copied an older version of the row
+    columns = ", ".join(COLUMNS)
+    values = ", ".join(f"NEW.{column}" for column in COLUMNS)
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in COLUMNS[2:])
+    op.execute(
+        "CREATE FUNCTION chunks_mirror_to_partitioned() RETURNS trigger LANGUAGE plpgsql AS $$\n"
+        "BEGIN\n"
+        "    IF TG_OP IN ('UPDATE', 'DELETE') THEN\n"
+        "        DELETE FROM chunks_partitioned WHERE id = OLD.id AND user_id = OLD.user_id;\n"
+        "    END IF;\n"
+        "    IF TG_OP IN ('INSERT', 'UPDATE') THEN\n"
+        f"        INSERT INTO chunks_partitioned ({columns}) VALUES ({values})\n"
+        f"        ON CONFLICT (id, user_id) DO UPDATE SET {updates};\n"
+        "    END IF;\n"
+        "    RETURN NULL;\n"
+        "END\n"
+        "$$"
+    )
+    op.execute(
+        "CREATE TRIGGER chunks_mirror_to_partitioned AFTER INSERT OR UPDATE OR DELETE ON chunks "
+        "FOR EACH ROW EXECUTE FUNCTION chunks_mirror_to_partitioned()"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS chunks_mirror_to_partitioned ON chunks")
+    op.execute("DROP FUNCTION IF EXISTS chunks_mirror_to_partitioned()")
+    op.execute("DROP TABLE IF EXISTS chunks_partitioned")
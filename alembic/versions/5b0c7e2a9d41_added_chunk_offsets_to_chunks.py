@@ -0,0 +1,32 @@
+"""added page_number, char_start and char_end to chunks
+
+Revision ID: 5b0c7e2a9d41
+Revises: 2fe19e0b9e19
+Create Date: 2026-10-17 16:02:47.418263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b0c7e2a9d41'
+down_revision: Union[str, Sequence[str], None] = '2fe19e0b9e19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chunks', sa.Column('page_number', sa.Integer(), nullable=True))
+    op.add_column('chunks', sa.Column('char_start', sa.Integer(), nullable=True))
+    op.add_column('chunks', sa.Column('char_end', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chunks', 'char_end')
+    op.drop_column('chunks', 'char_start')
+    op.drop_column('chunks', 'page_number')
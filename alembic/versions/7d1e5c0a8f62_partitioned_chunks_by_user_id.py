@@ -0,0 +1,111 @@
+"""partitioned chunks by user_id: backfilled chunks_partitioned, built its indexes, swapped it in
+
+Revision ID: 7d1e5c0a8f62
+Revises: 4b8d2f6a1c93
+Create Date: 2026-10-18 03:41:37.902115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d1e5c0a8f62'
+down_revision: Union[str, Sequence[str], None] = '4b8d2f6a1c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+PARTITIONS = 16
+BATCH_SIZE = 5000
+# every column, content_tsv as computed by the chunks_content_tsv trigger
+COLUMNS = [
+    "id", "document_id", "user_id", "content", "embedding", "content_hash", "chunk_index",
+    "page_number", "char_start", "char_end", "minhash", "minhash_bands", "near_duplicate_key", "content_tsv",
+]
+# the indexes of chunks, named ix_chunks_<name>
+INDEXES = {
+    "user_id": "(user_id)",
+    "document_id_content_hash": "(document_id, content_hash)",
+    "embedding_hnsw": "USING hnsw ((embedding::halfvec(3072)) halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)",
+    "embedding_binary_hnsw": "USING hnsw ((binary_quantize(embedding)::bit(3072)) bit_hamming_ops) "
+                             "WITH (m = 16, ef_construction = 64)",
+    "embedding_prefix_hnsw": "USING hnsw ((subvector(embedding, 1, 512)::vector(512)) vector_cosine_ops) "
+                             "WITH (m = 16, ef_construction = 64)",
+    "content_tsv": "USING gin (content_tsv)",
+    "minhash_bands": "USING gin (minhash_bands)",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    columns = ", ".join(COLUMNS)
+
+    with op.get_context().autocommit_block():
+        # 1. copy the rows chunks had when the trigger was installed, one short transaction per
+        # id range. FOR SHARE makes updates and deletes of the batch's rows wait for its commit,
+        # so the trigger then finds (and fixes) the copied row instead of missing it. Rows
+        # written since the trigger exists are already there, ON CONFLICT skips them.
+        max_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM chunks")).scalar()
+        for start in range(0, max_id, BATCH_SIZE):
+            bind.execute(
+                sa.text(
+                    f"INSERT INTO chunks_partitioned ({columns}) "
+                    f"SELECT {columns} FROM chunks WHERE id > :start AND id <= :end FOR SHARE "
+                    f"ON CONFLICT (id, user_id) DO NOTHING"
+                ),
+                {"start": start, "end": start + BATCH_SIZE},
+            )
+        op.execute("ANALYZE chunks_partitioned")
+
+        # 2. indexes, built on the loaded partitions rather than maintained row by row during the
+        # backfill. Each partition's index is built concurrently and attached to an index created
+        # ON ONLY the parent, which becomes valid once every partition has one.
+        for name, definition in INDEXES.items():
+            op.execute(f"CREATE INDEX IF NOT EXISTS ix_chunks_partitioned_{name} ON ONLY chunks_partitioned {definition}")
+            for remainder in range(PARTITIONS):
+                partition = f"chunks_p{remainder:02d}"
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_{name} ON {partition} {definition}")
+                op.execute(f"ALTER INDEX ix_chunks_partitioned_{name} ATTACH PARTITION {partition}_{name}")
+
+    # 3. the swap, one short transaction; fail rather than queue every query behind a long one
+    op.execute("SET LOCAL lock_timeout = '10s'")
+    op.execute("LOCK TABLE chunks IN ACCESS EXCLUSIVE MODE")
+    op.execute("DROP TRIGGER chunks_mirror_to_partitioned ON chunks")
+    op.execute("DROP FUNCTION chunks_mirror_to_partitioned()")
+    # from now on the partitioned table computes content_tsv itself (the trigger goes to every partition)
+    op.execute(
+        "CREATE TRIGGER chunks_content_tsv BEFORE INSERT OR UPDATE OF content ON chunks_partitioned "
+        "FOR EACH ROW EXECUTE FUNCTION chunks_content_tsv()"
+    )
+    # the sequence belongs to chunks.id and would be dropped with it
+    op.execute("ALTER SEQUENCE chunks_id_seq OWNED BY chunks_partitioned.id")
+    op.execute("DROP TABLE chunks")
+    op.execute("ALTER TABLE chunks_partitioned RENAME TO chunks")
+    for constraint in ("pkey", "document_id_fkey", "user_id_fkey"):
+        op.execute(f"ALTER TABLE chunks RENAME CONSTRAINT chunks_partitioned_{constraint} TO chunks_{constraint}")
+    for name in INDEXES:
+        op.execute(f"ALTER INDEX ix_chunks_partitioned_{name} RENAME TO ix_chunks_{name}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # offline: copies every chunk back into a plain table and rebuilds its indexes
+    columns = ", ".join(COLUMNS)
+    op.execute("CREATE TABLE chunks_unpartitioned (LIKE chunks INCLUDING DEFAULTS)")
+    op.execute(f"INSERT INTO chunks_unpartitioned ({columns}) SELECT {columns} FROM chunks")
+    op.execute("ALTER SEQUENCE chunks_id_seq OWNED BY chunks_unpartitioned.id")
+    op.execute("DROP TABLE chunks")
+    op.execute("ALTER TABLE chunks_unpartitioned RENAME TO chunks")
+    op.execute("ALTER TABLE chunks ADD CONSTRAINT chunks_pkey PRIMARY KEY (id)")
+    op.execute(
+        "CREATE TRIGGER chunks_content_tsv BEFORE INSERT OR UPDATE OF content ON chunks "
+        "FOR EACH ROW EXECUTE FUNCTION chunks_content_tsv()"
+    )
+    op.create_foreign_key('chunks_document_id_fkey', 'chunks', 'documents', ['document_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('chunks_user_id_fkey', 'chunks', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+    for name, definition in INDEXES.items():
+        op.execute(f"CREATE INDEX ix_chunks_{name} ON chunks {definition}")
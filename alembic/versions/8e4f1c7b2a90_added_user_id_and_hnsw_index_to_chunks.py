@@ -0,0 +1,67 @@
+"""added user_id and hnsw index to chunks, fixed embedding dimensions
+
+Revision ID: 8e4f1c7b2a90
+Revises: 5b0c7e2a9d41
+Create Date: 2026-10-17 19:12:05.663127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import pgvector.sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4f1c7b2a90'
+down_revision: Union[str, Sequence[str], None] = '5b0c7e2a9d41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # user_id denormalized from documents, so searches don't join through documents
+    op.add_column('chunks', sa.Column('user_id', sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE chunks SET user_id = documents.user_id "
+        "FROM documents WHERE documents.id = chunks.document_id"
+    )
+    op.alter_column('chunks', 'user_id', nullable=False)
+    op.create_foreign_key(
+        op.f('chunks_user_id_fkey'), 'chunks', 'users', ['user_id'], ['id'], ondelete='CASCADE'
+    )
+    op.create_index('ix_chunks_user_id', 'chunks', ['user_id'], unique=False)
+
+    # every stored embedding is text-embedding-3-large at 3072 dimensions
+    op.alter_column(
+        'chunks', 'embedding',
+        existing_type=pgvector.sqlalchemy.Vector(),
+        type_=pgvector.sqlalchemy.Vector(3072),
+        existing_nullable=True,
+    )
+
+    # hnsw only indexes vector columns of up to 2000 dimensions, halfvec goes up to 4000
+    # built concurrently so ingestion and search keep running while it builds
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chunks_embedding_hnsw ON chunks "
+            "USING hnsw ((embedding::halfvec(3072)) halfvec_cosine_ops) "
+            "WITH (m = 16, ef_construction = 64)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chunks_embedding_hnsw")
+
+    op.alter_column(
+        'chunks', 'embedding',
+        existing_type=pgvector.sqlalchemy.Vector(3072),
+        type_=pgvector.sqlalchemy.Vector(),
+        existing_nullable=True,
+    )
+    op.drop_index('ix_chunks_user_id', table_name='chunks')
+    op.drop_constraint(op.f('chunks_user_id_fkey'), 'chunks', type_='foreignkey')
+    op.drop_column('chunks', 'user_id')
@@ -0,0 +1,69 @@
+"""added content_tsv and a gin index to chunks
+
+Revision ID: a3c95d07e6b1
+Revises: 8e4f1c7b2a90
+Create Date: 2026-10-17 23:31:48.207519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c95d07e6b1'
+down_revision: Union[str, Sequence[str], None] = '8e4f1c7b2a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # a plain column kept in sync with content by a trigger: adding a STORED generated column
+    # would rewrite the whole table under an ACCESS EXCLUSIVE lock. Adding a nullable column
+    # and the trigger only takes the lock for a moment
+    op.add_column('chunks', sa.Column('content_tsv', postgresql.TSVECTOR(), nullable=True))
+    op.execute(
+        "CREATE FUNCTION chunks_content_tsv() RETURNS trigger LANGUAGE plpgsql AS $$\n"
+        "BEGIN\n"
+        "    NEW.content_tsv := to_tsvector('english', NEW.content);\n"
+        "    RETURN NEW;\n"
+        "END\n"
+        "$$"
+    )
+    op.execute(
+        "CREATE TRIGGER chunks_content_tsv BEFORE INSERT OR UPDATE OF content ON chunks "
+        "FOR EACH ROW EXECUTE FUNCTION chunks_content_tsv()"
+    )
+
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        # the rows that existed before the trigger, one short transaction per id range
+        max_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM chunks")).scalar()
+        for start in range(0, max_id, BATCH_SIZE):
+            bind.execute(
+                sa.text(
+                    "UPDATE chunks SET content_tsv = to_tsvector('english', content) "
+                    "WHERE id > :start AND id <= :end AND content_tsv IS NULL"
+                ),
+                {"start": start, "end": start + BATCH_SIZE},
+            )
+
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chunks_content_tsv ON chunks USING gin (content_tsv)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chunks_content_tsv")
+
+    op.execute("DROP TRIGGER IF EXISTS chunks_content_tsv ON chunks")
+    op.execute("DROP FUNCTION IF EXISTS chunks_content_tsv()")
+    op.drop_column('chunks', 'content_tsv')
@@ -0,0 +1,31 @@
+"""added document_set_version to users
+
+Revision ID: c81f4e2d9a36
+Revises: a3c95d07e6b1
+Create Date: 2026-10-18 00:12:37.540183
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81f4e2d9a36'
+down_revision: Union[str, Sequence[str], None] = 'a3c95d07e6b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'users',
+        sa.Column('document_set_version', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'document_set_version')
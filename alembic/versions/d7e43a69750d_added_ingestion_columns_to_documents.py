@@ -0,0 +1,39 @@
+"""added ingestion columns to documents
+
+Revision ID: d7e43a69750d
+Revises: e3d15aff1031
+Create Date: 2026-10-17 09:12:40.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7e43a69750d'
+down_revision: Union[str, Sequence[str], None] = 'e3d15aff1031'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('ingestion_attempts', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.add_column('documents', sa.Column('next_attempt_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.add_column('documents', sa.Column('claimed_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.add_column('documents', sa.Column('last_error', sa.String(), nullable=True))
+    op.create_index('ix_documents_processing_status_next_attempt_at', 'documents', ['processing_status', 'next_attempt_at'], unique=False)
+
+    # nothing ever processed the documents uploaded so far, hand them to the worker
+    op.execute("UPDATE documents SET processing_status = 'PENDING' WHERE processing_status = 'PROCESSING'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_documents_processing_status_next_attempt_at', table_name='documents')
+    op.drop_column('documents', 'last_error')
+    op.drop_column('documents', 'claimed_at')
+    op.drop_column('documents', 'next_attempt_at')
+    op.drop_column('documents', 'ingestion_attempts')
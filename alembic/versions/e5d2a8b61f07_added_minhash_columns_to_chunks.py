@@ -0,0 +1,43 @@
+"""added minhash columns to chunks
+
+Revision ID: e5d2a8b61f07
+Revises: c81f4e2d9a36
+Create Date: 2026-10-18 00:58:14.902716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5d2a8b61f07'
+down_revision: Union[str, Sequence[str], None] = 'c81f4e2d9a36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # existing chunks stay NULL (retrieval falls back to content_hash for them) until
+    # `python -m core.workers.minhash_backfill` fills them in batches; hashing needs python
+    op.add_column('chunks', sa.Column('minhash', sa.LargeBinary(), nullable=True))
+    op.add_column('chunks', sa.Column('minhash_bands', postgresql.ARRAY(sa.BigInteger()), nullable=True))
+    op.add_column('chunks', sa.Column('near_duplicate_key', sa.String(length=64), nullable=True))
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chunks_minhash_bands ON chunks USING gin (minhash_bands)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chunks_minhash_bands")
+
+    op.drop_column('chunks', 'near_duplicate_key')
+    op.drop_column('chunks', 'minhash_bands')
+    op.drop_column('chunks', 'minhash')
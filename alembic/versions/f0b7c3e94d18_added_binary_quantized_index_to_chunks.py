@@ -0,0 +1,36 @@
+"""added binary quantized hnsw index to chunks
+
+Revision ID: f0b7c3e94d18
+Revises: e5d2a8b61f07
+Create Date: 2026-10-18 01:44:09.318265
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f0b7c3e94d18'
+down_revision: Union[str, Sequence[str], None] = 'e5d2a8b61f07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # the full precision embeddings stay in chunks.embedding (toasted out of line, pgvector's
+    # default storage), only the shortlist of each query reads them
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chunks_embedding_binary_hnsw ON chunks "
+            "USING hnsw ((binary_quantize(embedding)::bit(3072)) bit_hamming_ops) "
+            "WITH (m = 16, ef_construction = 64)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chunks_embedding_binary_hnsw")
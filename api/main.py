@@ -5,8 +5,10 @@ import logging
 import datetime
 import os
 
+from config.settings import settings
 from database.database import Base, engine
 
+from .middleware import UploadSizeLimitMiddleware
 from .routes import auth, chat, documents, users
 
 
@@ -43,6 +45,10 @@ async def lifespan(app: FastAPI):
 app = FastAPI(lifespan=lifespan)
 # uvicorn api.main:app --reload        for local testing
 
+# upload bodies are capped while they are received, not after starlette spooled them
+# (added before CORS, so its error responses still get the CORS headers)
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024)
+
 # defining CORS origins
 origins = ["*"]
 app.add_middleware(
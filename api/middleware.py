@@ -0,0 +1,57 @@
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from core.services.errors.document_errors import FileTooLargeException
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Caps multipart request bodies while they are received. Starlette spools an UploadFile to
+    disk before the route runs, so a size check in the route only happens after the whole body
+    was taken in; this one rejects a declared Content-Length up front, and a chunked body as
+    soon as it goes over.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.max_body_bytes = max_bytes + MULTIPART_OVERHEAD_BYTES
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        detail = FileTooLargeException(self.max_bytes).message
+        content_length = headers.get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            logger.warning(f"Request body exceeds limit: {int(content_length)} bytes declared")
+            response = JSONResponse({"detail": detail}, status_code=400)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    logger.warning(f"Request body exceeds limit: over {received} bytes received")
+                    # raised into the form parsing of the route, answered with a 400
+                    raise HTTPException(status_code=400, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
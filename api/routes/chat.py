@@ -1,6 +1,9 @@
-from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi import APIRouter, HTTPException, Depends, Body, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import AsyncIterator, List
+import asyncio
+import json
 import logging
 
 from ..schemas import chat_schemas
@@ -141,7 +144,7 @@ def get_all_messages_for_chat(
 
 # post a new message to a specific chat
 @router.post("/{chat_id}/message", response_model=List[chat_schemas.Message])
-def post_message_to_chat(
+async def post_message_to_chat(
     chat_id: int,
     message: chat_schemas.MessageCreate = Body(...),
     user: dict = Depends(get_current_user),
@@ -161,7 +164,7 @@ def post_message_to_chat(
 
     # authentication via get_current_user dependency (done)
     # check if the chat exists -- could be optimized later so we don't havee to make multiple checks every time
-    chat = chat_services.get_chat_by_id(chat_id, db)
+    chat = await asyncio.to_thread(chat_services.get_chat_by_id, chat_id, db)
     if not chat:
         logger.error(f"Chat with ID {chat_id} not found")
         raise HTTPException(status_code=404, detail="Chat not found")
@@ -171,8 +174,8 @@ def post_message_to_chat(
         logger.error(f"User {user['id']} is unauthorized to access chat {chat_id}")
         raise HTTPException(status_code=403, detail="Unauthorized access to chat")
 
-    # Add the message to the db via the service layer
-    new_message, assistant_response = chat_services.post_message_to_chat(
+    # Add the message to the db via the service layer, the LLM call doesn't hold a thread
+    new_message, assistant_response = await chat_services.post_message_to_chat(
         chat_id = chat_id,
         user_id = user["id"],
         content = message.content,
@@ -194,3 +197,80 @@ def post_message_to_chat(
             created_at = assistant_response.get("created_at"),
         )
     ]
+
+
+def _sse(event: str, data: str) -> str:
+    # one server-sent event; data is JSON, so it never spans lines
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+def _message_json(message: dict) -> str:
+    return chat_schemas.Message(
+        id = message.get("id"),
+        role = message.get("role"),
+        content = message.get("content"),
+        created_at = message.get("created_at"),
+    ).model_dump_json()
+
+
+# post a new message to a specific chat, streaming the response
+@router.post("/{chat_id}/message/stream")
+async def stream_message_to_chat(
+    chat_id: int,
+    request: Request,
+    message: chat_schemas.MessageCreate = Body(...),
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Posts a new message to a specific chat and streams the assistant response as server-sent
+    events: "message" (the saved user message), "token" ({"content": ...}, as the LLM produces
+    it), then "done" (the saved assistant message) or "error". The user message is saved
+    before generation starts, the assistant message once it is complete. When the client
+    disconnects the generation is cancelled and no assistant message is saved.
+
+    :param chat_id: The ID of the chat to which the message is being posted
+    :param message: The content of the message being posted
+    :param user: The authenticated user object
+    :param db: Database session dependency
+
+    :return: text/event-stream response
+    """
+    logger.info(f"Streaming a new message to chat ID {chat_id} from the service layer")
+
+    chat = await asyncio.to_thread(chat_services.get_chat_by_id, chat_id, db)
+    if not chat:
+        logger.error(f"Chat with ID {chat_id} not found")
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    if chat.get("user_id") != user["id"]:
+        logger.error(f"User {user['id']} is unauthorized to access chat {chat_id}")
+        raise HTTPException(status_code=403, detail="Unauthorized access to chat")
+
+    new_message = await asyncio.to_thread(chat_services.post_user_message, chat_id, message.content, db)
+    pieces: AsyncIterator[str | dict] = chat_services.stream_assistant_response(chat_id, user["id"], message.content)
+
+    async def events():
+        yield _sse("message", _message_json(new_message))
+        try:
+            async for piece in pieces:
+                if isinstance(piece, dict):
+                    yield _sse("done", _message_json(piece))
+                    break
+                yield _sse("token", json.dumps({"content": piece}))
+                if await request.is_disconnected():
+                    logger.info(f"Client disconnected from chat {chat_id}, cancelling the generation")
+                    break
+        except Exception as e:
+            logger.error(f"Error streaming response to chat {chat_id}: {e}")
+            yield _sse("error", json.dumps({"detail": "Failed to generate a response"}))
+        finally:
+            # also runs when the response task is cancelled on disconnect
+            await pieces.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # no caching, and no proxy buffering that would hold tokens back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -5,12 +5,16 @@ from sqlalchemy.orm import Session
 from typing import List
 
 from ..schemas import document_schemas
-from core.services import document_services
+from core.services import document_services, upload_services
 from core.entities import document_entity
+from core.services.errors.document_errors import (
+    DuplicateDocumentException, FileTooLargeException, InvalidUploadException
+)
 from database.database import get_db
 from api.routes.auth import get_current_user
 from config.settings import settings
 
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -34,48 +38,215 @@ Endpoints for document management
 """
 
 
-@router.post("/upload", status_code=status.HTTP_201_CREATED)
-async def upload_document(
-    file: UploadFile = File(...),
-    user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
+async def _spooled_pdf_upload(file: UploadFile, user_id: int) -> document_entity.DocumentUpload:
     """
-    Uploads a document, sanitizes it, stores it in R2, and saves the metadata in the database.
+    Checks and hashes an uploaded PDF, off the event loop. Starlette has already spooled the
+    body to disk, and nothing is sent to R2 here: the services dedup the upload by its hash
+    first and only stream it to R2 when it is new.
 
-    :return: A success message or the created document's metadata
+    :return: DocumentUpload entity of the spooled file (no staged_key)
     """
-    logger.info(f"Received request to upload document")
-
     # allowing only pdf files for now, can add more types later
     if file.content_type != "application/pdf":
         logger.warning(f"Unsupported file type: {file.content_type}")
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
-    # checking size cap of 10 MB
-    file_bytes = await file.read()
-    if len(file_bytes) > 10 * 1024 * 1024:
-        logger.warning(f"File size exceeds limit: {len(file_bytes)} bytes")
-        raise HTTPException(status_code=400, detail="File size exceeds 10 MB limit")
+    max_bytes = settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+    # the request body was already capped while it was received (UploadSizeLimitMiddleware),
+    # this is the exact check on the file itself
+    if file.size is not None and file.size > max_bytes:
+        logger.warning(f"File size exceeds limit: {file.size} bytes")
+        raise HTTPException(status_code=400, detail=FileTooLargeException(max_bytes).message)
 
-    # creating document entity
-    doc_upload: document_entity.DocumentUpload = document_entity.DocumentUpload(
-        user_id=user["id"],
+    try:
+        content_hash, size = await asyncio.to_thread(upload_services.hash_file, file.file, max_bytes)
+    except FileTooLargeException as e:
+        logger.warning(f"File size exceeds limit: over {max_bytes} bytes")
+        raise HTTPException(status_code=400, detail=e.message)
+
+    return document_entity.DocumentUpload(
+        user_id=user_id,
         file_name=file.filename,
-        file_size=len(file_bytes),
+        file_size=size,
         content_type=file.content_type,
-        file_bytes=file_bytes
+        content_hash=content_hash,
     )
 
-    # uploading file to R2
-    # meta data is returned if upload is successful, otherwise an exception is raised
-    file_meta_data = document_services.upload_document(doc_upload, db)
 
-    # convert it to a schema and return
-    document_schema = document_schemas.DocumentCreate(
+def _to_document_schema(file_meta_data: dict) -> document_schemas.DocumentCreate:
+    return document_schemas.DocumentCreate(
+        id=file_meta_data["id"],
         user_id=file_meta_data["user_id"],
         file_name=file_meta_data["file_name"],
         file_size=file_meta_data["file_size"],
         content_type=file_meta_data["content_type"],
+        processing_status=file_meta_data["processing_status"],
+        is_duplicate=file_meta_data["is_duplicate"],
     )
-    return document_schema
+
+
+@router.post("/upload", status_code=status.HTTP_201_CREATED)
+async def upload_document(
+    response: Response,
+    file: UploadFile = File(...),
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Uploads a document, sanitizes it, stores it in R2, and saves the metadata in the database.
+    Re-uploading a file the user already has returns the existing document with a 200.
+
+    :return: A success message or the created document's metadata
+    """
+    logger.info(f"Received request to upload document")
+
+    # hashing the spooled file, the service streams it to R2 only if it isn't a duplicate
+    doc_upload = await _spooled_pdf_upload(file, user["id"])
+
+    # meta data is returned if upload is successful, otherwise an exception is raised
+    try:
+        file_meta_data = await asyncio.to_thread(document_services.upload_document, doc_upload, db, file.file)
+    except Exception as e:
+        logger.error(f"Error uploading document: {e}")
+        raise HTTPException(status_code=500, detail="Failed to upload document")
+
+    if file_meta_data["is_duplicate"]:
+        # nothing was created
+        response.status_code = status.HTTP_200_OK
+
+    # convert it to a schema and return
+    return _to_document_schema(file_meta_data)
+
+
+@router.post("/uploads", response_model=document_schemas.PresignedUploadResponse)
+async def create_direct_upload(
+    request: document_schemas.PresignedUploadRequest,
+    user: dict = Depends(get_current_user),
+):
+    """
+    Presigns a direct upload: the client PUTs the file to the returned URL (with the returned
+    headers), then calls /docs/uploads/{upload_id}/complete. No file bytes go through the API.
+
+    :return: The presigned URL and the headers the PUT must carry
+    """
+    logger.info(f"Received request to presign a direct upload")
+
+    # same checks as a proxied upload, R2 can't enforce them for us
+    if request.content_type != "application/pdf":
+        logger.warning(f"Unsupported file type: {request.content_type}")
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+
+    max_bytes = settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+    if request.file_size > max_bytes:
+        logger.warning(f"File size exceeds limit: {request.file_size} bytes")
+        raise HTTPException(status_code=400, detail=FileTooLargeException(max_bytes).message)
+
+    try:
+        presigned = await asyncio.to_thread(
+            upload_services.create_presigned_upload,
+            user["id"], request.file_name, request.content_type, request.sha256.lower(),
+        )
+    except InvalidUploadException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+    return document_schemas.PresignedUploadResponse(**presigned)
+
+
+@router.post("/uploads/{upload_id}/complete", status_code=status.HTTP_201_CREATED)
+async def complete_direct_upload(
+    upload_id: str,
+    response: Response,
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Verifies a direct upload against R2 and creates the document, with the same dedup as
+    /docs/upload (a file the user already has returns the existing document with a 200).
+
+    :param upload_id: upload_id returned by /docs/uploads
+    :return: The created document's metadata
+    """
+    logger.info(f"Received request to complete direct upload {upload_id}")
+
+    try:
+        doc_upload = await asyncio.to_thread(upload_services.complete_presigned_upload, user["id"], upload_id)
+    except InvalidUploadException as e:
+        logger.error("InvalidUploadException caught in complete_direct_upload endpoint")
+        raise HTTPException(status_code=400, detail=e.message)
+    except FileTooLargeException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+    file_meta_data = await asyncio.to_thread(document_services.upload_document, doc_upload, db)
+
+    if file_meta_data["is_duplicate"]:
+        # nothing was created
+        response.status_code = status.HTTP_200_OK
+
+    return _to_document_schema(file_meta_data)
+
+
+@router.put("/{document_id}", response_model=document_schemas.DocumentCreate)
+async def replace_document(
+    document_id: int,
+    file: UploadFile = File(...),
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Replaces the file behind an existing document, e.g. an edited version of a resume.
+    The document is re-ingested incrementally: only new or changed chunks are embedded.
+
+    :param document_id: The ID of the document being replaced
+    :return: The updated document's metadata
+    """
+    logger.info(f"Received request to replace document {document_id}")
+
+    document = await asyncio.to_thread(document_services.get_document_by_id, document_id, db)
+    if not document:
+        logger.error(f"Document with ID {document_id} not found")
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    if document.get("user_id") != user["id"]:
+        logger.error(f"User {user['id']} is unauthorized to access document {document_id}")
+        raise HTTPException(status_code=403, detail="Unauthorized access to document")
+
+    doc_upload = await _spooled_pdf_upload(file, user["id"])
+
+    try:
+        file_meta_data = await asyncio.to_thread(
+            document_services.replace_document, document_id, doc_upload, db, file.file
+        )
+    except DuplicateDocumentException as e:
+        logger.error("DuplicateDocumentException caught in replace_document endpoint")
+        raise HTTPException(status_code=409, detail=e.message)
+    except Exception as e:
+        logger.error(f"Error replacing document: {e}")
+        raise HTTPException(status_code=500, detail="Failed to upload document")
+
+    return _to_document_schema(file_meta_data)
+
+
+@router.delete("/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_document(
+    document_id: int,
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Deletes a document, its chunks, and its file in R2 if no other document shares it
+
+    :param document_id: The ID of the document being deleted
+    """
+    logger.info(f"Received request to delete document {document_id}")
+
+    document = await asyncio.to_thread(document_services.get_document_by_id, document_id, db)
+    if not document:
+        logger.error(f"Document with ID {document_id} not found")
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    if document.get("user_id") != user["id"]:
+        logger.error(f"User {user['id']} is unauthorized to access document {document_id}")
+        raise HTTPException(status_code=403, detail="Unauthorized access to document")
+
+    await asyncio.to_thread(document_services.delete_document, document_id, db)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
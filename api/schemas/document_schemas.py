@@ -5,7 +5,26 @@ from datetime import datetime
 
 # document metadata schema for response after upload
 class DocumentCreate(BaseModel):
+    id: int
     user_id: int
     file_name: str
     file_size: int
     content_type: str
+    processing_status: str
+    is_duplicate: bool = False      # True when the same file was already uploaded by this user
+
+
+# request for a presigned direct-to-R2 upload
+class PresignedUploadRequest(BaseModel):
+    file_name: str
+    file_size: int
+    content_type: str
+    sha256: str                     # hex digest of the file, R2 rejects a PUT whose bytes don't match
+
+
+class PresignedUploadResponse(BaseModel):
+    upload_id: str
+    url: str
+    method: str = "PUT"
+    headers: dict                   # must be sent as-is with the PUT, they are part of the signature
+    expires_in: int
@@ -0,0 +1,141 @@
+"""
+Chunker benchmark: TokenChunker against the RecursiveCharacterTextSplitter it replaced.
+
+Builds a synthetic resume-like corpus (paragraphs, bullet lines, sentences of varying length),
+splits it with both chunkers at roughly the same chunk size (1000 characters ~ 256 tokens),
+and reports throughput plus chunk quality: token length distribution, chunks over the token
+limit and chunks that end on a sentence / line / paragraph boundary.
+
+    python -m benchmarks.chunker --pages 2000 --chunk-tokens 256
+"""
+import argparse
+import random
+import statistics
+import time
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from core.RAG.chunker import DEFAULT_ENCODING, TokenChunker
+
+
+WORDS = (
+    "python engineer data pipeline team led designed built managed api service latency "
+    "postgres kubernetes aws model training inference customers revenue improved reduced "
+    "migrated streaming platform analytics dashboard research university project intern"
+).split()
+
+
+def make_page(rng: random.Random, paragraphs: int) -> str:
+    blocks = []
+    for _ in range(paragraphs):
+        if rng.random() < 0.4:
+            # bullet list, one item per line
+            lines = [
+                "- " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 14)))
+                for _ in range(rng.randint(2, 6))
+            ]
+            blocks.append("\n".join(lines))
+        else:
+            sentences = [
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 28))).capitalize() + "."
+                for _ in range(rng.randint(2, 9))
+            ]
+            blocks.append(" ".join(sentences))
+    return "\n\n".join(blocks)
+
+
+def ends_on_boundary(text: str, page: str, char_end: int) -> bool:
+    # sentence end, or a newline right after the chunk in the source page
+    return text.rstrip()[-1:] in ".!?:;" or page[char_end:char_end + 1] in ("\n", "")
+
+
+def describe(name: str, chunks, pages, token_counts, limit: int, elapsed: float, total_chars: int) -> None:
+    over = sum(1 for count in token_counts if count > limit)
+    boundary = sum(1 for text, page_index, char_end in chunks if ends_on_boundary(text, pages[page_index], char_end))
+    quantiles = statistics.quantiles(token_counts, n=20)
+    print(f"{name}")
+    print(f"  time:             {elapsed:.3f}s ({total_chars / elapsed / 1e6:.2f} M chars/s)")
+    print(f"  chunks:           {len(chunks)}")
+    print(f"  tokens/chunk:     mean {statistics.mean(token_counts):.1f}, p5 {quantiles[0]:.0f}, "
+          f"p50 {statistics.median(token_counts):.0f}, p95 {quantiles[-1]:.0f}, max {max(token_counts)}")
+    print(f"  over {limit} tokens:  {over / len(chunks):.1%}")
+    print(f"  boundary endings: {boundary / len(chunks):.1%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--paragraphs", type=int, default=8, help="paragraphs per page")
+    parser.add_argument("--chunk-tokens", type=int, default=256)
+    parser.add_argument("--overlap-tokens", type=int, default=32)
+    parser.add_argument("--chunk-chars", type=int, default=1000, help="RecursiveCharacterTextSplitter chunk_size")
+    parser.add_argument("--overlap-chars", type=int, default=150)
+    parser.add_argument("--encoding", default=DEFAULT_ENCODING)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pages = [make_page(rng, args.paragraphs) for _ in range(args.pages)]
+    docs = [Document(page_content=page, metadata={"page": index}) for index, page in enumerate(pages)]
+    total_chars = sum(len(page) for page in pages)
+    print(f"corpus: {len(pages)} pages, {total_chars / 1e6:.1f} M characters\n")
+
+    chunker = TokenChunker(args.chunk_tokens, args.overlap_tokens, args.encoding)
+    encoding = chunker.encoding
+
+    started = time.perf_counter()
+    token_chunks = chunker.split_documents(docs)
+    token_elapsed = time.perf_counter() - started
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_chars, chunk_overlap=args.overlap_chars, add_start_index=True
+    )
+    started = time.perf_counter()
+    recursive_chunks = splitter.split_documents(docs)
+    recursive_elapsed = time.perf_counter() - started
+
+    describe(
+        "TokenChunker",
+        [(c.page_content, c.metadata["page"], c.metadata["char_end"]) for c in token_chunks],
+        pages,
+        [c.metadata["token_count"] for c in token_chunks],
+        args.chunk_tokens, token_elapsed, total_chars,
+    )
+    # token counts for the character splitter are measured after the fact, outside the timing
+    describe(
+        "RecursiveCharacterTextSplitter",
+        [
+            (c.page_content, c.metadata["page"], c.metadata["start_index"] + len(c.page_content))
+            for c in recursive_chunks
+        ],
+        pages,
+        [len(encoding.encode_ordinary(c.page_content)) for c in recursive_chunks],
+        args.chunk_tokens, recursive_elapsed, total_chars,
+    )
+
+    # the like-for-like baseline: the same splitter measuring length in tokens
+    token_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=args.encoding,
+        chunk_size=args.chunk_tokens, chunk_overlap=args.overlap_tokens, add_start_index=True,
+    )
+    started = time.perf_counter()
+    token_recursive_chunks = token_splitter.split_documents(docs)
+    token_recursive_elapsed = time.perf_counter() - started
+    describe(
+        "RecursiveCharacterTextSplitter.from_tiktoken_encoder",
+        [
+            (c.page_content, c.metadata["page"], c.metadata["start_index"] + len(c.page_content))
+            for c in token_recursive_chunks
+        ],
+        pages,
+        [len(encoding.encode_ordinary(c.page_content)) for c in token_recursive_chunks],
+        args.chunk_tokens, token_recursive_elapsed, total_chars,
+    )
+
+    print(f"\nspeedup vs character splitter:       {recursive_elapsed / token_elapsed:.1f}x")
+    print(f"speedup vs token-counting splitter:  {token_recursive_elapsed / token_elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Offline load test for the embedding batcher.
+
+Simulates several documents being ingested at once, each submitting its chunks in pipeline
+sized batches, against the deterministic local provider with simulated request latency.
+
+    python -m benchmarks.embedding_batcher --documents 16 --chunks 400 --latency-ms 150
+"""
+import argparse
+import threading
+import time
+
+from core.RAG.embeddings.batcher import EmbeddingBatcher
+from core.RAG.embeddings.providers import LocalEmbeddingProvider
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=16, help="documents ingested concurrently")
+    parser.add_argument("--chunks", type=int, default=400, help="chunks per document")
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks per submit() (pipeline batch)")
+    parser.add_argument("--chunk-chars", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=150.0, help="simulated provider latency")
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--max-batch-texts", type=int, default=512)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--tpm", type=int, default=5_000_000, help="tokens per minute budget")
+    args = parser.parse_args()
+
+    provider = LocalEmbeddingProvider(dimensions=args.dimensions, latency_seconds=args.latency_ms / 1000)
+    batcher = EmbeddingBatcher(
+        provider,
+        max_batch_texts=args.max_batch_texts,
+        max_in_flight=args.max_in_flight,
+        tokens_per_minute=args.tpm,
+    )
+    filler = "x" * args.chunk_chars
+
+    def ingest(document_id: int) -> None:
+        chunks = [f"{document_id}:{i}:{filler}" for i in range(args.chunks)]
+        for start in range(0, len(chunks), args.batch_size):
+            batcher.embed(chunks[start:start + args.batch_size])
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=ingest, args=(i,)) for i in range(args.documents)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = args.documents * args.chunks
+    unbatched = -(-args.chunks // args.batch_size) * args.documents
+    stats = batcher.stats()
+    batcher.close()
+
+    print(f"embedded {total} chunks from {args.documents} documents in {elapsed:.2f}s ({total / elapsed:.0f} chunks/s)")
+    print(f"provider requests: {stats['requests']} (vs {unbatched} without cross-document merging)")
+    for key, value in sorted(stats.items()):
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
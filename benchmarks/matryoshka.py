@@ -0,0 +1,187 @@
+"""
+Matryoshka benchmark: recall@k and latency of a first pass on a shortened embedding prefix
+(renormalized), rescored on the full embedding, against exact search on the full embedding.
+
+text-embedding-3 models are trained so that the first dimensions of an embedding carry most
+of its information. Random synthetic vectors spread it evenly over every dimension and would
+make any prefix look useless, so the offline vectors get a decaying per-dimension scale
+(--decay, 0 disables it). For real numbers use --from-chunks, which loads stored embeddings
+from the chunks table and holds some of them out as queries.
+
+Offline (numpy) it times an exact float32 scan and, per --prefixes and --factors, the prefix
+scan plus the rescoring of top k * factor candidates. With --database it builds prefix hnsw
+indexes on the scratch table left by `python -m benchmarks.vector_index --keep` and runs the
+VECTOR_SEARCH_MODE=matryoshka query shape against an exact scan.
+
+    python -m benchmarks.matryoshka --rows 100000 --prefixes 256 512 1024
+    python -m benchmarks.matryoshka --from-chunks --rows 50000
+    python -m benchmarks.matryoshka --database --prefixes 256 512
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from config.settings import settings
+from benchmarks.quantization import recall, rescored, synthetic_vectors, top_k
+from benchmarks.vector_index import TABLE, vector_literal
+
+
+def normalized(vectors: np.ndarray) -> np.ndarray:
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def synthetic_embeddings(args, rng: np.random.Generator):
+    # leading dimensions carry more variance, roughly like a matryoshka trained embedding
+    scale = (1 + np.arange(args.dimensions) / 64) ** -args.decay
+    centers = normalized(rng.normal(size=(args.clusters, args.dimensions)) * scale)
+    vectors = normalized(synthetic_vectors(rng, centers, args.rows, args.noise) * scale)
+    queries = normalized(synthetic_vectors(rng, centers, args.queries, args.noise) * scale)
+    return vectors, queries
+
+
+def stored_embeddings(args, rng: np.random.Generator):
+    from sqlalchemy import select
+    from database import models
+    from database.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(models.Chunk.embedding).where(models.Chunk.embedding.is_not(None)).limit(args.rows + args.queries)
+        ).scalars().all()
+    finally:
+        db.close()
+    if len(rows) <= args.queries:
+        raise SystemExit(f"only {len(rows)} embedded chunks, need more than --queries {args.queries}")
+
+    embeddings = normalized(np.asarray(rows, dtype=np.float32))
+    held_out = rng.choice(len(embeddings), size=args.queries, replace=False)
+    mask = np.ones(len(embeddings), dtype=bool)
+    mask[held_out] = False
+    return embeddings[mask], embeddings[held_out]
+
+
+def timed(function, repeat: int = 3):
+    # best of a few runs, in seconds
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def bench_offline(args, vectors: np.ndarray, queries: np.ndarray) -> None:
+    k = args.k
+    dimensions = vectors.shape[1]
+    truth, exact_seconds = timed(lambda: top_k(queries @ vectors.T, k))
+    per_query = 1000 / len(queries)
+
+    print(f"{len(vectors)} vectors of {dimensions} dimensions, {len(queries)} queries, recall@{k} against float32:")
+    print(f"  {'full':<22} {dimensions * 4:6d} B/vector   recall 1.000   {exact_seconds * per_query:7.3f} ms/query")
+
+    for prefix in args.prefixes:
+        short_vectors = normalized(vectors[:, :prefix])
+        short_queries = normalized(queries[:, :prefix])
+        for factor in args.factors:
+            def search():
+                candidates = top_k(short_queries @ short_vectors.T, k * factor)
+                return rescored(candidates, vectors, queries, k)
+
+            found, seconds = timed(search)
+            print(f"  {f'{prefix} + rescore x{factor}':<22} {prefix * 4:6d} B/vector   "
+                  f"recall {recall(found, truth):.3f}   {seconds * per_query:7.3f} ms/query")
+
+
+def bench_database(args, queries: np.ndarray) -> None:
+    from database.database import engine
+
+    connection = engine.raw_connection()
+    connection.driver_connection.autocommit = True
+    cursor = connection.cursor()
+    dimensions = args.dimensions
+
+    for prefix in args.prefixes:
+        short = f"vector({prefix})"
+        started = time.perf_counter()
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TABLE}_prefix_{prefix} ON {TABLE} "
+            f"USING hnsw ((subvector(embedding, 1, {prefix})::{short}) vector_cosine_ops) "
+            f"WITH (m = 16, ef_construction = 64)"
+        )
+        print(f"\nbuilt (or found) the {prefix} dimension prefix index in {time.perf_counter() - started:.1f}s")
+
+    cursor.execute(
+        "SELECT indexrelid::regclass::text, pg_relation_size(indexrelid) FROM pg_index WHERE indrelid = %s::regclass",
+        (TABLE,),
+    )
+    for name, size in cursor.fetchall():
+        print(f"  {name:<40} {size / 1024 / 1024:10.1f} MB")
+
+    literals = [vector_literal(query) for query in queries]
+    exact_sql = f"SELECT id FROM {TABLE} ORDER BY embedding <=> %s::vector({dimensions}) LIMIT {args.k}"
+    cursor.execute("SET enable_indexscan = off")
+    truth, exact_latencies = [], []
+    for literal in literals:
+        started = time.perf_counter()
+        cursor.execute(exact_sql, (literal,))
+        truth.append({row[0] for row in cursor.fetchall()})
+        exact_latencies.append((time.perf_counter() - started) * 1000)
+    cursor.execute("SET enable_indexscan = on")
+    print(f"exact scan p50 {statistics.median(exact_latencies):.2f} ms")
+
+    cursor.execute("SET hnsw.ef_search = %s", (max(settings.VECTOR_HNSW_EF_SEARCH, args.k * max(args.factors)),))
+    print(f"prefix + rescore, recall@{args.k} against an exact scan:")
+    for prefix in args.prefixes:
+        short = f"vector({prefix})"
+        shortlist_sql = (
+            f"WITH shortlist AS (SELECT id, embedding FROM {TABLE} "
+            f"ORDER BY subvector(embedding, 1, {prefix})::{short} <=> "
+            f"subvector(%s::vector({dimensions}), 1, {prefix})::{short} LIMIT %s) "
+            f"SELECT id FROM shortlist ORDER BY embedding <=> %s::vector({dimensions}) LIMIT {args.k}"
+        )
+        for factor in args.factors:
+            latencies, recalls = [], []
+            for literal, expected in zip(literals, truth):
+                started = time.perf_counter()
+                cursor.execute(shortlist_sql, (literal, args.k * factor, literal))
+                found = {row[0] for row in cursor.fetchall()}
+                latencies.append((time.perf_counter() - started) * 1000)
+                recalls.append(len(found & expected) / len(expected))
+            print(f"  {prefix:5d} + rescore x{factor:<3} recall {statistics.mean(recalls):.3f}   "
+                  f"p50 {statistics.median(latencies):.2f} ms")
+
+    cursor.close()
+    connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dimensions", type=int, default=settings.EMBEDDING_DIMENSIONS)
+    parser.add_argument("--clusters", type=int, default=512)
+    parser.add_argument("--noise", type=float, default=1.0, help="spread around the cluster centers")
+    parser.add_argument("--decay", type=float, default=0.25, help="per-dimension scale (1 + i / 64) ** -decay")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=settings.RETRIEVAL_TOP_K)
+    parser.add_argument("--prefixes", type=int, nargs="+", default=[256, 512, 1024])
+    parser.add_argument("--factors", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--from-chunks", action="store_true", help="use embeddings stored in the chunks table")
+    parser.add_argument("--database", action="store_true", help="also measure the benchmarks.vector_index table")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.from_chunks:
+        vectors, queries = stored_embeddings(args, rng)
+    else:
+        vectors, queries = synthetic_embeddings(args, rng)
+
+    bench_offline(args, vectors, queries)
+    if args.database:
+        bench_database(args, queries)
+
+
+if __name__ == "__main__":
+    main()
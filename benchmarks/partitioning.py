@@ -0,0 +1,160 @@
+"""
+Partitioning benchmark: per-user search latency as the number of tenants grows, on one plain
+table against a table hash partitioned on user_id like chunks (CHUNK_PARTITIONS partitions,
+an hnsw index per partition).
+
+Grows two scratch tables to each --tenants count with the same synthetic embeddings
+(--rows-per-user per tenant), rebuilds their hnsw indexes (timed), vacuums them (timed) and
+times user-scoped top-k queries with the search settings of the app, reporting recall@k
+against an exact scan. On the plain table the user filter runs inside one index over every
+tenant; on the partitioned table the query is pruned to one partition, whose index only
+covers 1 / partitions of the tenants.
+
+    python -m benchmarks.partitioning --tenants 100 400 1600 --rows-per-user 200
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from config.settings import settings
+from database.models import CHUNK_PARTITIONS
+from benchmarks.quantization import synthetic_vectors
+from benchmarks.vector_index import copy_rows, vector_literal
+
+
+PLAIN = "bench_chunks_plain"
+PARTITIONED = "bench_chunks_partitioned"
+
+
+def create_tables(cursor, dimensions: int, partitions: int) -> None:
+    columns = f"id bigserial, user_id integer NOT NULL, embedding vector({dimensions}) NOT NULL"
+    for table in (PLAIN, PARTITIONED):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor.execute(f"CREATE TABLE {PLAIN} ({columns}, PRIMARY KEY (id))")
+    cursor.execute(f"CREATE TABLE {PARTITIONED} ({columns}, PRIMARY KEY (id, user_id)) PARTITION BY HASH (user_id)")
+    for remainder in range(partitions):
+        cursor.execute(
+            f"CREATE TABLE {PARTITIONED}_p{remainder:02d} PARTITION OF {PARTITIONED} "
+            f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        )
+    for table in (PLAIN, PARTITIONED):
+        cursor.execute(f"CREATE INDEX ON {table} (user_id)")
+
+
+def build_hnsw(cursor, table: str, dimensions: int) -> float:
+    # on the partitioned table this builds one index per partition
+    cursor.execute(f"DROP INDEX IF EXISTS {table}_hnsw")
+    started = time.perf_counter()
+    cursor.execute(
+        f"CREATE INDEX {table}_hnsw ON {table} USING hnsw ((embedding::halfvec({dimensions})) halfvec_cosine_ops) "
+        f"WITH (m = 16, ef_construction = 64)"
+    )
+    return time.perf_counter() - started
+
+
+def largest_index_mb(cursor, table: str) -> float:
+    # the index one query has to walk: the whole index, or the largest partition's
+    # (pg_partition_tree has no rows for an index that isn't partitioned)
+    cursor.execute(
+        "SELECT greatest(pg_relation_size(%(index)s::regclass), "
+        "(SELECT max(pg_relation_size(relid)) FROM pg_partition_tree(%(index)s::regclass)))",
+        {"index": f"{table}_hnsw"},
+    )
+    return cursor.fetchone()[0] / 1024 / 1024
+
+
+def timed(cursor, sql: str) -> float:
+    started = time.perf_counter()
+    cursor.execute(sql)
+    return time.perf_counter() - started
+
+
+def run_queries(cursor, table: str, queries, dimensions: int, k: int, exact: bool):
+    if exact:
+        # no halfvec cast, so no index matches: the user's rows are scanned and sorted
+        sql = f"SELECT id FROM {table} WHERE user_id = %s ORDER BY embedding <=> %s::vector({dimensions}) LIMIT {k}"
+    else:
+        cast = f"halfvec({dimensions})"
+        sql = f"SELECT id FROM {table} WHERE user_id = %s ORDER BY embedding::{cast} <=> %s::{cast} LIMIT {k}"
+    latencies, results = [], []
+    for user_id, vector in queries:
+        started = time.perf_counter()
+        cursor.execute(sql, (user_id, vector))
+        rows = cursor.fetchall()
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append({row[0] for row in rows})
+    return latencies, results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, nargs="+", default=[100, 400, 1600])
+    parser.add_argument("--rows-per-user", type=int, default=200)
+    parser.add_argument("--dimensions", type=int, default=settings.EMBEDDING_DIMENSIONS)
+    parser.add_argument("--partitions", type=int, default=CHUNK_PARTITIONS)
+    parser.add_argument("--clusters", type=int, default=512)
+    parser.add_argument("--noise", type=float, default=1.0, help="spread around the cluster centers")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=settings.RETRIEVAL_TOP_K)
+    parser.add_argument("--ef-search", type=int, default=settings.VECTOR_HNSW_EF_SEARCH)
+    parser.add_argument("--maintenance-work-mem", default="4GB", help="memory for the index builds")
+    parser.add_argument("--keep", action="store_true", help="don't drop the tables at the end")
+    args = parser.parse_args()
+
+    from database.database import engine
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(args.clusters, args.dimensions))
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+    connection = engine.raw_connection()
+    connection.driver_connection.autocommit = True
+    cursor = connection.cursor()
+    create_tables(cursor, args.dimensions, args.partitions)
+    cursor.execute(f"SET maintenance_work_mem = '{args.maintenance_work_mem}'")
+    cursor.execute("SET hnsw.ef_search = %s", (args.ef_search,))
+    if settings.VECTOR_ITERATIVE_SCAN != "off":
+        cursor.execute("SET hnsw.iterative_scan = %s", (settings.VECTOR_ITERATIVE_SCAN,))
+
+    print(f"{args.rows_per_user} rows per tenant, {args.dimensions} dimensions, {args.partitions} partitions, "
+          f"top-{args.k} scoped to one tenant")
+    print(f"{'tenants':>8} {'table':<12} {'build s':>8} {'vacuum s':>9} {'index MB':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'recall':>7}")
+
+    tenants = 0
+    for target in sorted(args.tenants):
+        # the new tenants' rows, identical in both tables
+        for user_id in range(tenants, target):
+            vectors = synthetic_vectors(rng, centers, args.rows_per_user, args.noise)
+            user_ids = np.full(args.rows_per_user, user_id)
+            copy_rows(cursor, user_ids, vectors, PLAIN)
+            copy_rows(cursor, user_ids, vectors, PARTITIONED)
+        tenants = target
+
+        queries = [
+            (int(user_id), vector_literal(vector))
+            for user_id, vector in zip(rng.integers(0, tenants, size=args.queries),
+                                       synthetic_vectors(rng, centers, args.queries, args.noise))
+        ]
+        for table in (PLAIN, PARTITIONED):
+            build = build_hnsw(cursor, table, args.dimensions)
+            vacuum = timed(cursor, f"VACUUM ANALYZE {table}")
+            latencies, found = run_queries(cursor, table, queries, args.dimensions, args.k, exact=False)
+            _, truth = run_queries(cursor, table, queries, args.dimensions, args.k, exact=True)
+            recall = statistics.mean(len(f & t) / len(t) for f, t in zip(found, truth) if t)
+            p95 = statistics.quantiles(latencies, n=20)[-1]
+            print(f"{tenants:>8} {'plain' if table == PLAIN else 'partitioned':<12} {build:>8.1f} {vacuum:>9.2f} "
+                  f"{largest_index_mb(cursor, table):>9.1f} {statistics.median(latencies):>8.2f} {p95:>8.2f} "
+                  f"{recall:>7.3f}")
+
+    if not args.keep:
+        for table in (PLAIN, PARTITIONED):
+            cursor.execute(f"DROP TABLE {table}")
+    cursor.close()
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Quantization benchmark: memory per vector and recall@k of quantized first passes with full
+precision rescoring, against exact float32 search.
+
+Offline (numpy only) it scores --rows synthetic embeddings (clustered, see --noise) with float16 (halfvec), int8 and
+binary (1 bit per dimension) vectors, rescoring the top k * factor binary / int8 candidates
+on the float32 vectors. With --database it also measures the two hnsw indexes on the scratch
+table left by `python -m benchmarks.vector_index --keep`: their size on disk, and recall@k of
+the VECTOR_SEARCH_MODE=binary query shape against an exact scan.
+
+    python -m benchmarks.quantization --rows 100000 --dimensions 3072
+    python -m benchmarks.quantization --database
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from config.settings import settings
+from benchmarks.vector_index import TABLE, vector_literal
+
+
+def synthetic_vectors(rng: np.random.Generator, centers: np.ndarray, count: int, noise: float) -> np.ndarray:
+    # unit vectors around cluster centers; `noise` is the noise norm relative to the center,
+    # nearly identical vectors would make every ranking a tie
+    picks = rng.integers(0, len(centers), size=count)
+    dimensions = centers.shape[1]
+    vectors = centers[picks] + rng.normal(scale=noise / np.sqrt(dimensions), size=(count, dimensions))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    # indices of the k highest scores per row, best first
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def rescored(candidates: np.ndarray, vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    exact = np.einsum("qcd,qd->qc", vectors[candidates], queries)
+    return np.take_along_axis(candidates, top_k(exact, k), axis=1)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return statistics.mean(len(set(f) & set(t)) / len(t) for f, t in zip(found.tolist(), truth.tolist()))
+
+
+def bench_offline(args, vectors: np.ndarray, queries: np.ndarray) -> None:
+    k = args.k
+    truth = top_k(queries @ vectors.T, k)
+    dimensions = vectors.shape[1]
+
+    print(f"{args.rows} vectors of {dimensions} dimensions, {len(queries)} queries, recall@{k} against float32:")
+    print(f"  {'float32':<22} {dimensions * 4:6d} B/vector   recall 1.000")
+
+    halfvec = vectors.astype(np.float16).astype(np.float32)
+    print(f"  {'halfvec':<22} {dimensions * 2:6d} B/vector   recall {recall(top_k(queries @ halfvec.T, k), truth):.3f}")
+
+    scale = np.abs(vectors).max(axis=0)
+    int8 = np.round(vectors / scale * 127).astype(np.int8)
+    int8_scores = (queries * scale / 127) @ int8.T.astype(np.float32)
+
+    # sign bits; hamming distance ranks like the negated count of matching bits
+    bits = vectors > 0
+    query_bits = queries > 0
+    matching = query_bits.astype(np.float32) @ bits.T.astype(np.float32) + \
+        (~query_bits).astype(np.float32) @ (~bits).T.astype(np.float32)
+
+    for factor in args.factors:
+        candidates = k * factor
+        found = rescored(top_k(int8_scores, candidates), vectors, queries, k)
+        print(f"  {f'int8 + rescore x{factor}':<22} {dimensions:6d} B/vector   recall {recall(found, truth):.3f}")
+    for factor in args.factors:
+        candidates = k * factor
+        found = rescored(top_k(matching, candidates), vectors, queries, k)
+        print(f"  {f'binary + rescore x{factor}':<22} {dimensions // 8:6d} B/vector   recall {recall(found, truth):.3f}")
+
+
+def bench_database(args, queries: np.ndarray) -> None:
+    from database.database import engine
+
+    connection = engine.raw_connection()
+    connection.driver_connection.autocommit = True
+    cursor = connection.cursor()
+    dimensions = args.dimensions
+    bit = f"bit({dimensions})"
+
+    started = time.perf_counter()
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS {TABLE}_binary ON {TABLE} "
+        f"USING hnsw ((binary_quantize(embedding)::{bit}) bit_hamming_ops) WITH (m = 16, ef_construction = 64)"
+    )
+    print(f"\nbuilt (or found) the binary hnsw index in {time.perf_counter() - started:.1f}s")
+
+    # the user_id btree, the halfvec hnsw index (vector_index.py) and the binary one
+    cursor.execute(
+        "SELECT indexrelid::regclass::text, pg_relation_size(indexrelid) FROM pg_index WHERE indrelid = %s::regclass",
+        (TABLE,),
+    )
+    for name, size in cursor.fetchall():
+        print(f"  {name:<40} {size / 1024 / 1024:10.1f} MB")
+
+    cursor.execute("SET hnsw.ef_search = %s", (max(settings.VECTOR_HNSW_EF_SEARCH, args.k * max(args.factors)),))
+    shortlist_sql = (
+        f"WITH shortlist AS (SELECT id, embedding FROM {TABLE} "
+        f"ORDER BY binary_quantize(embedding)::{bit} <~> binary_quantize(%s::vector({dimensions})) LIMIT %s) "
+        f"SELECT id FROM shortlist ORDER BY embedding <=> %s::vector({dimensions}) LIMIT {args.k}"
+    )
+    exact_sql = f"SELECT id FROM {TABLE} ORDER BY embedding <=> %s::vector({dimensions}) LIMIT {args.k}"
+
+    literals = [vector_literal(query) for query in queries]
+    cursor.execute("SET enable_indexscan = off")
+    truth = []
+    for literal in literals:
+        cursor.execute(exact_sql, (literal,))
+        truth.append({row[0] for row in cursor.fetchall()})
+    cursor.execute("SET enable_indexscan = on")
+
+    print(f"binary + rescore, recall@{args.k} against an exact scan:")
+    for factor in args.factors:
+        latencies, recalls = [], []
+        for literal, expected in zip(literals, truth):
+            started = time.perf_counter()
+            cursor.execute(shortlist_sql, (literal, args.k * factor, literal))
+            found = {row[0] for row in cursor.fetchall()}
+            latencies.append((time.perf_counter() - started) * 1000)
+            recalls.append(len(found & expected) / len(expected))
+        print(f"  rescore x{factor:<3} recall {statistics.mean(recalls):.3f}   p50 {statistics.median(latencies):.2f} ms")
+
+    cursor.close()
+    connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dimensions", type=int, default=settings.EMBEDDING_DIMENSIONS)
+    parser.add_argument("--clusters", type=int, default=512)
+    parser.add_argument("--noise", type=float, default=1.0, help="spread around the cluster centers")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=settings.RETRIEVAL_TOP_K)
+    parser.add_argument("--factors", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--database", action="store_true", help="also measure the benchmarks.vector_index table")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(args.clusters, args.dimensions))
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    queries = synthetic_vectors(rng, centers, args.queries, args.noise)
+
+    bench_offline(args, synthetic_vectors(rng, centers, args.rows, args.noise), queries)
+    if args.database:
+        bench_database(args, queries)
+
+
+if __name__ == "__main__":
+    main()
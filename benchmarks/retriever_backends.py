@@ -0,0 +1,113 @@
+"""
+Retriever backend benchmark: the in-process NumPy index (numpy_index.NumpyVectorIndex)
+against pgvector, for one user's top-k search.
+
+Builds a shard of --chunks synthetic embeddings in a temporary directory and times searches
+(p50 / p99), then reports the process RSS and the shard size on disk. With --pgvector, runs
+the same user-scoped queries against the scratch table left by
+`python -m benchmarks.vector_index --keep` (the per-user row count there is rows / users).
+
+    python -m benchmarks.retriever_backends --chunks 20000 --dimensions 3072 --queries 200
+    python -m benchmarks.retriever_backends --pgvector
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from config.settings import settings
+from core.entities.chunk_entity import ChunkVector
+from core.RAG.retrievers.numpy_index import NumpyVectorIndex
+from benchmarks.vector_index import TABLE, synthetic_vectors, vector_literal
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def describe(name: str, latencies) -> None:
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"  {name:<10} p50 {statistics.median(latencies):8.2f} ms   p99 {quantiles[-1]:8.2f} ms")
+
+
+def bench_numpy(args, vectors: np.ndarray, queries: np.ndarray) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        index = NumpyVectorIndex(directory, dimensions=args.dimensions, dtype=args.dtype)
+        chunks = (
+            ChunkVector(
+                id=row, document_id=row // 100, content=f"chunk {row}", content_hash=f"{row:064x}",
+                page_number=row % 100 // 5, chunk_index=row % 100, embedding=vector,
+            )
+            for row, vector in enumerate(vectors)
+        )
+        started = time.perf_counter()
+        index.rebuild_user(1, chunks)
+        print(f"built a {args.chunks} chunk shard in {time.perf_counter() - started:.1f}s")
+
+        rss_before = rss_mb()
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(1, query, args.k, settings.RETRIEVAL_OVERFETCH)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        shard_bytes = sum(path.stat().st_size for path in Path(directory, "user_1").resolve().iterdir())
+        print(f"\nnumpy ({args.dtype}), top-{args.k} of {args.chunks} chunks:")
+        describe("numpy", latencies)
+        print(f"  shard {shard_bytes / 1024 / 1024:.1f} MB on disk, rss {rss_before:.0f} -> {rss_mb():.0f} MB")
+
+
+def bench_pgvector(args, queries: np.ndarray) -> None:
+    from database.database import engine
+
+    connection = engine.raw_connection()
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT user_id, count(*) FROM {TABLE} GROUP BY user_id ORDER BY count(*) DESC LIMIT 1")
+    user_id, rows = cursor.fetchone()
+
+    # same shape as chunk_access.search_user_chunks
+    cast = f"halfvec({args.dimensions})"
+    sql = (f"SELECT id FROM {TABLE} WHERE user_id = %s "
+           f"ORDER BY embedding::{cast} <=> %s::{cast} LIMIT {args.k * settings.RETRIEVAL_OVERFETCH}")
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        cursor.execute(sql, (user_id, vector_literal(query)))
+        cursor.fetchall()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    print(f"\npgvector (hnsw), top-{args.k} of {rows} chunks (user {user_id}):")
+    describe("pgvector", latencies)
+    cursor.close()
+    connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20_000, help="chunks in the user's shard")
+    parser.add_argument("--dimensions", type=int, default=settings.EMBEDDING_DIMENSIONS)
+    parser.add_argument("--dtype", default=settings.NUMPY_INDEX_DTYPE, choices=("float16", "float32"))
+    parser.add_argument("--clusters", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=settings.RETRIEVAL_TOP_K)
+    parser.add_argument("--pgvector", action="store_true", help="also query the benchmarks.vector_index table")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(args.clusters, args.dimensions))
+    queries = synthetic_vectors(rng, centers, args.queries)
+
+    bench_numpy(args, synthetic_vectors(rng, centers, args.chunks), queries)
+    if args.pgvector:
+        bench_pgvector(args, queries)
+
+
+if __name__ == "__main__":
+    main()
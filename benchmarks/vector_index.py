@@ -0,0 +1,155 @@
+"""
+Vector search benchmark: HNSW index against a sequential scan, on a scratch table shaped like
+chunks (user_id + embedding) in the configured database.
+
+Loads --rows synthetic embeddings (clustered unit vectors, spread over --users users) with a
+binary COPY, builds the same hnsw index as the chunks migration, then times top-k queries
+with the index and with index scans disabled, and reports the index's recall against the
+exact results. Needs pgvector >= 0.7 (halfvec); the iterative scan setting needs 0.8.
+
+    python -m benchmarks.vector_index --rows 1000000 --dimensions 3072 --queries 50
+"""
+import argparse
+import statistics
+import struct
+import time
+
+import numpy as np
+
+from config.settings import settings
+from database.database import engine
+
+
+TABLE = "bench_vector_chunks"
+
+
+def synthetic_vectors(rng: np.random.Generator, centers: np.ndarray, count: int) -> np.ndarray:
+    # points around random cluster centers, like embeddings of related text
+    picks = rng.integers(0, len(centers), size=count)
+    vectors = centers[picks] + rng.normal(scale=0.35 / np.sqrt(centers.shape[1]), size=(count, centers.shape[1]))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def copy_rows(cursor, user_ids: np.ndarray, vectors: np.ndarray, table: str = TABLE) -> None:
+    # binary COPY, same wire format as chunk_access.copy_chunks
+    dimensions = vectors.shape[1]
+    row_header = struct.pack(">h", 2)
+    vector_header = struct.pack(">ihh", 4 + 4 * dimensions, dimensions, 0)
+    big_endian = vectors.astype(">f4")
+    parts = [b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)]
+    for user_id, vector in zip(user_ids.tolist(), big_endian):
+        parts.append(row_header + struct.pack(">ii", 4, user_id) + vector_header + vector.tobytes())
+    parts.append(struct.pack(">h", -1))
+
+    class Stream:
+        def __init__(self, data: bytes):
+            self.data, self.offset = data, 0
+
+        def read(self, size: int = -1) -> bytes:
+            size = len(self.data) - self.offset if size < 0 else size
+            chunk = self.data[self.offset:self.offset + size]
+            self.offset += len(chunk)
+            return chunk
+
+    cursor.copy_expert(f"COPY {table} (user_id, embedding) FROM STDIN WITH (FORMAT binary)", Stream(b"".join(parts)))
+
+
+def vector_literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{value:.6f}" for value in vector) + "]"
+
+
+def run_queries(cursor, queries, dimensions: int, k: int, user_scoped: bool):
+    cast = f"halfvec({dimensions})"
+    where = "WHERE user_id = %s" if user_scoped else ""
+    sql = f"SELECT id FROM {TABLE} {where} ORDER BY embedding::{cast} <=> %s::{cast} LIMIT {k}"
+    latencies, results = [], []
+    for user_id, vector in queries:
+        params = (user_id, vector) if user_scoped else (vector,)
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append({row[0] for row in rows})
+    return latencies, results
+
+
+def describe(name: str, latencies) -> None:
+    quantiles = statistics.quantiles(latencies, n=20)
+    print(f"  {name:<14} mean {statistics.mean(latencies):8.2f} ms   p50 {statistics.median(latencies):8.2f} ms   "
+          f"p95 {quantiles[-1]:8.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dimensions", type=int, default=settings.EMBEDDING_DIMENSIONS)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--clusters", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, default=settings.VECTOR_HNSW_EF_SEARCH)
+    parser.add_argument("--maintenance-work-mem", default="4GB", help="memory for the index build")
+    parser.add_argument("--reuse", action="store_true", help="reuse the table and index of a previous run")
+    parser.add_argument("--keep", action="store_true", help="don't drop the table at the end")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(args.clusters, args.dimensions))
+    connection = engine.raw_connection()
+    connection.driver_connection.autocommit = True
+    cursor = connection.cursor()
+
+    if not args.reuse:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cursor.execute(f"CREATE TABLE {TABLE} (id bigserial PRIMARY KEY, user_id integer NOT NULL, "
+                       f"embedding vector({args.dimensions}) NOT NULL)")
+        started = time.perf_counter()
+        batch = 10_000
+        for offset in range(0, args.rows, batch):
+            count = min(batch, args.rows - offset)
+            copy_rows(cursor, rng.integers(0, args.users, size=count), synthetic_vectors(rng, centers, count))
+        print(f"loaded {args.rows} rows of {args.dimensions} dimensions in {time.perf_counter() - started:.1f}s")
+
+        cursor.execute(f"CREATE INDEX ON {TABLE} (user_id)")
+        cursor.execute(f"SET maintenance_work_mem = '{args.maintenance_work_mem}'")
+        started = time.perf_counter()
+        cursor.execute(
+            f"CREATE INDEX ON {TABLE} USING hnsw ((embedding::halfvec({args.dimensions})) halfvec_cosine_ops) "
+            f"WITH (m = 16, ef_construction = 64)"
+        )
+        print(f"built hnsw index in {time.perf_counter() - started:.1f}s")
+        cursor.execute(f"ANALYZE {TABLE}")
+
+    queries = [
+        (int(user_id), vector_literal(vector))
+        for user_id, vector in zip(rng.integers(0, args.users, size=args.queries),
+                                   synthetic_vectors(rng, centers, args.queries))
+    ]
+    cursor.execute("SET hnsw.ef_search = %s", (args.ef_search,))
+
+    for user_scoped in (False, True):
+        print(f"\ntop-{args.k}, {'scoped to one user' if user_scoped else 'whole table'}:")
+        cursor.execute("SET enable_indexscan = on")
+        cursor.execute("SET enable_bitmapscan = on")
+        indexed, indexed_results = run_queries(cursor, queries, args.dimensions, args.k, user_scoped)
+
+        # exact results and the sequential scan baseline
+        cursor.execute("SET enable_indexscan = off")
+        cursor.execute("SET enable_bitmapscan = off")
+        exact, exact_results = run_queries(cursor, queries, args.dimensions, args.k, user_scoped)
+
+        recall = statistics.mean(
+            len(found & truth) / len(truth) for found, truth in zip(indexed_results, exact_results) if truth
+        )
+        describe("index", indexed)
+        describe("sequential", exact)
+        print(f"  speedup {statistics.median(exact) / statistics.median(indexed):.1f}x, recall@{args.k} {recall:.3f}")
+
+    if not args.keep:
+        cursor.execute(f"DROP TABLE {TABLE}")
+    cursor.close()
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,76 @@ class Settings(BaseSettings):
     # RAG settings
     # Options: "placeholder" | "dev" | "production"
     RAG_IMPLEMENTATION: str
+    OPENAI_API_KEY: Optional[str] = None
+    LLM_MODEL: str = "gpt-4o-mini"
+    RETRIEVAL_TOP_K: int = 8
+    RETRIEVAL_OVERFETCH: int = 4               # candidates fetched per returned chunk, for deduplication
+    # Options: "pgvector" | "numpy" (in-process memory-mapped index, one shard per user)
+    RETRIEVER_BACKEND: str = "pgvector"
+    # Options: "vector" | "hybrid" (full text search + vector search, fused with reciprocal rank fusion)
+    RETRIEVAL_MODE: str = "hybrid"
+    HYBRID_CANDIDATES: int = 20                # chunks taken from each search before fusion
+    HYBRID_RRF_K: int = 60
+    # context packing: chunks go into the prompt best first until the budget is spent, chunks
+    # with a cosine similarity under this fraction of the best one are left out (in "hybrid"
+    # mode the cut is made on the vector candidates before fusion, fused scores are only ranks)
+    CONTEXT_TOKEN_BUDGET: int = 3000
+    CONTEXT_MIN_RELATIVE_SCORE: float = 0.3
+    NUMPY_INDEX_DIR: str = "./.cache/vector_index"
+    # "float16" halves the shard size, but numpy upcasts it block by block and scans ~10x slower
+    NUMPY_INDEX_DTYPE: str = "float32"
+    # semantic answer cache: near-duplicate questions over an unchanged document set reuse the answer
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY: float = 0.95      # cosine similarity between query embeddings
+    ANSWER_CACHE_MAX_ENTRIES_PER_USER: int = 128
+    ANSWER_CACHE_MAX_USERS: int = 1024
+    ANSWER_CACHE_TTL_SECONDS: int = 86_400
+
+    # embedding settings
+    # Options: "openai" | "local" (deterministic offline vectors, for load tests)
+    EMBEDDING_PROVIDER: str = "openai"
+    EMBEDDING_MODEL: str = "text-embedding-3-large"
+    EMBEDDING_DIMENSIONS: int = 3072
+    EMBEDDING_REQUEST_MAX_TEXTS: int = 512         # texts merged into one provider request
+    EMBEDDING_REQUEST_MAX_TOKENS: int = 100_000
+    EMBEDDING_BATCH_WAIT_MS: int = 20              # how long a partial request waits for more texts
+    EMBEDDING_MAX_IN_FLIGHT: int = 4
+    EMBEDDING_TOKENS_PER_MINUTE: int = 1_000_000
+    EMBEDDING_MAX_RETRIES: int = 5
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 1_000_000
+    EMBEDDING_CACHE_EVICT_EVERY: int = 10_000     # inserts between eviction passes
+    # in-process cache of query embeddings, in front of the embedding cache table
+    QUERY_EMBEDDING_CACHE_ENABLED: bool = True
+    QUERY_EMBEDDING_CACHE_MAX_ENTRIES: int = 2048  # ~12 KB each at 3072 float32 dimensions
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS: int = 3600
+
+    # vector search settings, applied to every database connection
+    VECTOR_HNSW_EF_SEARCH: int = 100               # candidates kept by an hnsw scan, higher = better recall
+    VECTOR_IVFFLAT_PROBES: int = 10                # lists scanned by an ivfflat index, if one is used
+    # pgvector >= 0.8: keeps scanning the index until enough rows pass the user filter
+    # Options: "off" | "relaxed_order" | "strict_order"
+    VECTOR_ITERATIVE_SCAN: str = "relaxed_order"
+    # Options: "halfvec" (hnsw on 16-bit floats) | "binary" (hnsw on 1 bit per dimension) |
+    # "matryoshka" (hnsw on the first 512 dimensions). binary and matryoshka rescore a shortlist
+    # of top_k * overfetch * VECTOR_RESCORE_FACTOR rows on the full precision embeddings, keep
+    # hnsw.ef_search at least that or leave the iterative scan on
+    VECTOR_SEARCH_MODE: str = "halfvec"
+    VECTOR_RESCORE_FACTOR: int = 4
+
+    # ingestion worker settings
+    INGESTION_WORKERS: int = 2
+    INGESTION_CONCURRENCY: int = 4              # documents ingested at once by each worker process
+    INGESTION_POLL_INTERVAL_SECONDS: float = 2.0
+    INGESTION_LEASE_SECONDS: int = 15 * 60     # a claimed document is reclaimable after this
+    INGESTION_MAX_ATTEMPTS: int = 5
+    INGESTION_RETRY_BASE_SECONDS: int = 30
+    INGESTION_RETRY_MAX_SECONDS: int = 60 * 60
+    CHUNK_TOKENS: int = 256                # tokens per chunk, in the embedding model's encoding
+    CHUNK_OVERLAP_TOKENS: int = 32
+    EMBEDDING_BATCH_SIZE: int = 64
+    INGESTION_QUEUE_SIZE: int = 4          # batches buffered between pipeline stages
+    NEAR_DUPLICATE_THRESHOLD: float = 0.8  # estimated Jaccard similarity of word 3-grams
 
     # R2 storage settings
     ACCOUNT_KEY_ID: str
@@ -25,6 +95,17 @@ class Settings(BaseSettings):
     S3_ENDPOINT_URL: str
     BUCKET_NAME: str
 
+    # upload settings
+    MAX_UPLOAD_SIZE_MB: int = 50
+    UPLOAD_PART_SIZE_MB: int = 8           # multipart part size, R2/S3 need at least 5 MB per part
+    UPLOAD_READ_SIZE_KB: int = 1024        # read from the request this much at a time
+    PRESIGNED_UPLOAD_EXPIRES_SECONDS: int = 15 * 60
+
+    # local disk cache of R2 objects, used by ingestion
+    R2_CACHE_ENABLED: bool = True
+    R2_CACHE_DIR: str = "./.cache/r2"
+    R2_CACHE_MAX_MB: int = 2048
+
     
     # NOT ACCESSED
     ACCOUNT_API_TOKEN: Optional[str] = None
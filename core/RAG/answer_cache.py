@@ -0,0 +1,185 @@
+"""
+Semantic answer cache: a question close enough to one the user already asked, over the same
+document set, gets the earlier answer instead of a new LLM call.
+
+Entries are kept per user in process, with the query embedding, the answer and the user's
+document_set_version when it was answered. A lookup compares the new query embedding against
+the user's cached ones (cosine similarity >= ANSWER_CACHE_SIMILARITY). Uploads, replacements,
+deletions and finished ingestions bump users.document_set_version, and a lookup with a newer
+version drops everything cached for that user.
+"""
+from dataclasses import dataclass
+from typing import List
+import collections
+import logging
+import threading
+import time
+
+import numpy as np
+
+from config.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+_answer_cache: "SemanticAnswerCache | None" = None
+_answer_cache_lock = threading.Lock()
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    answer: str
+    similarity: float
+    llm_seconds: float
+
+
+@dataclass
+class _Entry:
+    query: str
+    answer: str
+    llm_seconds: float
+    expires_at: float
+
+
+class _UserAnswers:
+    # one user's cached answers, all for the same document set version
+    def __init__(self, version: int, dimensions: int, capacity: int):
+        self.version = version
+        self.vectors = np.empty((capacity, dimensions), dtype=np.float32)
+        self.entries: List[_Entry] = []
+        self.next_slot = 0       # ring buffer, the oldest entry is overwritten first
+
+
+class SemanticAnswerCache:
+
+    def __init__(
+            self,
+            enabled: bool = settings.ANSWER_CACHE_ENABLED,
+            similarity: float = settings.ANSWER_CACHE_SIMILARITY,
+            max_entries_per_user: int = settings.ANSWER_CACHE_MAX_ENTRIES_PER_USER,
+            max_users: int = settings.ANSWER_CACHE_MAX_USERS,
+            ttl_seconds: float = settings.ANSWER_CACHE_TTL_SECONDS,
+    ):
+        self.enabled = enabled
+        self.similarity = similarity
+        self.max_entries_per_user = max_entries_per_user
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+
+        # least recently used user first
+        self._users: "collections.OrderedDict[int, _UserAnswers]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = collections.Counter()
+        self._saved_llm_seconds = 0.0
+
+    def lookup(self, user_id: int, version: int, query_embedding: List[float]) -> CachedAnswer | None:
+        """
+        Finds a cached answer to a similar question over the same document set
+
+        :param user_id: The ID of the user asking
+        :param version: The user's current document_set_version
+        :param query_embedding: Embedding of the new query
+
+        :return: The closest CachedAnswer above the similarity threshold, or None
+        """
+        if not self.enabled:
+            return None
+
+        query = _normalized(query_embedding)
+        now = time.monotonic()
+        with self._lock:
+            answers = self._users.get(user_id)
+            if answers is not None and answers.version != version:
+                # the document set changed, nothing cached for this user is valid anymore
+                del self._users[user_id]
+                self._counters["invalidations"] += 1
+                answers = None
+            if answers is None or not answers.entries:
+                self._counters["misses"] += 1
+                return None
+            self._users.move_to_end(user_id)
+
+            similarities = answers.vectors[:len(answers.entries)] @ query
+            for slot, entry in enumerate(answers.entries):
+                if entry.expires_at <= now:
+                    similarities[slot] = -1.0
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity:
+                self._counters["misses"] += 1
+                return None
+
+            entry = answers.entries[best]
+            cached = CachedAnswer(
+                query=entry.query,
+                answer=entry.answer,
+                similarity=float(similarities[best]),
+                llm_seconds=entry.llm_seconds,
+            )
+            self._counters["hits"] += 1
+            self._saved_llm_seconds += cached.llm_seconds
+        logger.info(
+            f"Answer cache hit for user {user_id} (similarity {cached.similarity:.3f}, "
+            f"saved {cached.llm_seconds * 1000:.0f} ms): {self.stats()}"
+        )
+        return cached
+
+    def store(self, user_id: int, version: int, query: str, query_embedding: List[float], answer: str, llm_seconds: float) -> None:
+        """
+        Caches an answer
+
+        :param user_id: The ID of the user who asked
+        :param version: The user's document_set_version the answer was generated over
+        :param query: The query, kept for logging
+        :param query_embedding: Embedding of the query
+        :param answer: The LLM's answer
+        :param llm_seconds: How long the LLM call took, counted as saved on every hit
+        """
+        if not self.enabled:
+            return
+
+        vector = _normalized(query_embedding)
+        with self._lock:
+            answers = self._users.get(user_id)
+            if answers is not None and answers.version > version:
+                # answered over a document set that has changed since
+                return
+            if answers is None or answers.version != version:
+                answers = self._users[user_id] = _UserAnswers(version, len(vector), self.max_entries_per_user)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+            entry = _Entry(query, answer, llm_seconds, time.monotonic() + self.ttl_seconds)
+            slot = answers.next_slot
+            answers.vectors[slot] = vector
+            if slot == len(answers.entries):
+                answers.entries.append(entry)
+            else:
+                answers.entries[slot] = entry
+            answers.next_slot = (slot + 1) % self.max_entries_per_user
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            saved = self._saved_llm_seconds
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        return {
+            **counters,
+            "hit_rate": round(counters.get("hits", 0) / lookups, 4) if lookups else 0.0,
+            "saved_llm_seconds": round(saved, 2),
+        }
+
+
+def _normalized(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    return array / (np.linalg.norm(array) or 1.0)
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    # one per process
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache()
+        return _answer_cache
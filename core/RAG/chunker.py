@@ -0,0 +1,203 @@
+"""
+Token-aware chunker.
+
+Encodes each page once with tiktoken (the BPE the embedding and chat models use), then walks
+the token array with a fixed-size window, backing the window end up to the nearest paragraph,
+line, sentence or word boundary. Chunks are sliced out of the original text by character
+offset, so every chunk records exactly where it came from (page, char_start, char_end).
+
+Each chunk is re-encoded once to count its tokens, and its window shrinks while it is over the
+limit: a slice doesn't always encode to the tokens of its window (BPE merges at a window start
+inside a word come out differently). One encode per page plus one per chunk and no recursive
+re-splitting: faster than a token-counting RecursiveCharacterTextSplitter, while never going
+over the token limit (see benchmarks/chunker.py). This module must stay importable without
+settings, the local RAG scripts use it.
+"""
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List
+import bisect
+import functools
+import itertools
+import re
+
+import tiktoken
+from langchain_core.documents import Document
+
+
+DEFAULT_CHUNK_TOKENS = 256
+DEFAULT_OVERLAP_TOKENS = 32
+DEFAULT_ENCODING = "cl100k_base"     # text-embedding-3-* and gpt-4 family
+
+# chunk boundaries from best to worst: paragraph, line, sentence, word. Chunks are cut at the
+# separator's trailing whitespace, which goes to the next chunk and gets trimmed there
+_BOUNDARIES = (
+    ("\n\n",),
+    ("\n",),
+    (". ", "! ", "? ", "; ", ": "),
+    (" ", "\t"),
+)
+_WHITESPACE = re.compile(r"\s")
+
+
+@functools.lru_cache(maxsize=None)
+def _chars_per_token(encoding_name: str) -> List[int]:
+    """
+    Number of characters that start inside each token's bytes, indexed by token id. A running
+    sum over a page's tokens gives the character offset of every token without decoding them
+    one by one in python (tiktoken's decode_with_offsets does, and dominates the runtime).
+    A token starting in the middle of a multi-byte character maps to the next character.
+    """
+    encoding = tiktoken.get_encoding(encoding_name)
+    counts = []
+    for token in range(encoding.n_vocab):
+        try:
+            token_bytes = encoding.decode_single_token_bytes(token)
+        except KeyError:
+            # gaps in the vocabulary, never produced by encode
+            counts.append(0)
+            continue
+        counts.append(sum(1 for byte in token_bytes if byte & 0xC0 != 0x80))
+    return counts
+
+
+@functools.lru_cache(maxsize=None)
+def _starts_mid_character(encoding_name: str) -> List[bool]:
+    """
+    Whether each token's first byte continues a multi-byte character started by the previous
+    token, indexed by token id. A window ending before such a token ends inside that character.
+    """
+    encoding = tiktoken.get_encoding(encoding_name)
+    flags = []
+    for token in range(encoding.n_vocab):
+        try:
+            token_bytes = encoding.decode_single_token_bytes(token)
+        except KeyError:
+            flags.append(False)
+            continue
+        flags.append(bool(token_bytes) and token_bytes[0] & 0xC0 == 0x80)
+    return flags
+
+
+@dataclass
+class TextChunk:
+    text: str
+    char_start: int
+    char_end: int
+    token_count: int
+
+
+class TokenChunker:
+
+    def __init__(
+            self,
+            chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+            overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+            encoding_name: str = DEFAULT_ENCODING,
+    ):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self._chars_per_token = _chars_per_token(encoding_name)
+        self._starts_mid_character = _starts_mid_character(encoding_name)
+        # only look for a boundary in the last quarter of the window, so chunks stay near full size
+        self.min_tokens = max(1, chunk_tokens - chunk_tokens // 4)
+
+    def _window_end(self, text: str, offsets: List[int], start: int, end: int) -> int:
+        # last paragraph, line, sentence or word break in the last quarter of the window; the
+        # searches run on the text (str.rfind), bisect maps the break back to a token
+        low = start + self.min_tokens
+        char_low, char_high = offsets[low], offsets[end]
+        for separators in _BOUNDARIES:
+            position = -1
+            for separator in separators:
+                found = text.rfind(separator, char_low, char_high)
+                if found >= 0:
+                    # cut at the separator's trailing whitespace
+                    position = max(position, found + len(separator) - 1)
+            if position > char_low:
+                return bisect.bisect_left(offsets, position, low, end)
+        return end
+
+    def _window_start(self, text: str, offsets: List[int], start: int, end: int) -> int:
+        # the overlap starts at the first word break, never in the middle of a word
+        match = _WHITESPACE.search(text, offsets[start], offsets[end])
+        if match is None:
+            return start
+        return bisect.bisect_left(offsets, match.start(), start, end)
+
+    def _char_span(self, text: str, tokens: List[int], offsets: List[int], start: int, end: int) -> tuple[int, int]:
+        # character range of the tokens start:end, whitespace trimmed
+        char_start = offsets[start]
+        char_end = offsets[end]
+        if end < len(tokens) and self._starts_mid_character[tokens[end]]:
+            # offsets[end] is past a character that ends in the next token, leave it out
+            char_end -= 1
+        # trim whitespace without losing the offsets
+        while char_start < char_end and text[char_start].isspace():
+            char_start += 1
+        while char_end > char_start and text[char_end - 1].isspace():
+            char_end -= 1
+        return char_start, char_end
+
+    def split_text(self, text: str) -> List[TextChunk]:
+        """
+        Splits text into chunks of at most chunk_tokens tokens
+
+        :param text: Text to split
+        :return: List of TextChunk with character offsets into `text`
+        """
+        tokens = self.encoding.encode_ordinary(text)
+        if not tokens:
+            return []
+        # character offset each token starts at, plus the end of the text
+        offsets = list(itertools.accumulate(map(self._chars_per_token.__getitem__, tokens), initial=0))
+        if offsets[-1] != len(text):
+            # text that doesn't round-trip (lone surrogates etc.), slice the decoded text instead
+            text = self.encoding.decode(tokens)
+
+        chunks = []
+        total = len(tokens)
+        start = 0
+        while start < total:
+            end = min(start + self.chunk_tokens, total)
+            if end < total:
+                end = self._window_end(text, offsets, start, end)
+
+            while True:
+                char_start, char_end = self._char_span(text, tokens, offsets, start, end)
+                token_count = len(self.encoding.encode_ordinary(text[char_start:char_end]))
+                if token_count <= self.chunk_tokens or end - start <= 1:
+                    break
+                # the slice encodes to more tokens than the window: a window starting inside a
+                # word merges differently on its own. Give the window up one token at a time
+                end -= 1
+            if char_end > char_start:
+                chunks.append(TextChunk(text[char_start:char_end], char_start, char_end, token_count))
+
+            if end >= total:
+                break
+            start = max(self._window_start(text, offsets, end - self.overlap_tokens, end), start + 1)
+        return chunks
+
+    def iter_documents(self, docs: Iterable[Document]) -> Iterator[Document]:
+        """
+        Splits page Documents into chunk Documents, keeping the page metadata (page, source...)
+        and adding char_start, char_end and token_count
+
+        :param docs: Page Documents
+        :return: Generator of chunk Documents
+        """
+        for doc in docs:
+            for chunk in self.split_text(doc.page_content):
+                metadata = dict(doc.metadata)
+                metadata.update({
+                    "char_start": chunk.char_start,
+                    "char_end": chunk.char_end,
+                    "token_count": chunk.token_count,
+                })
+                yield Document(page_content=chunk.text, metadata=metadata)
+
+    def split_documents(self, docs: Iterable[Document]) -> List[Document]:
+        return list(self.iter_documents(docs))
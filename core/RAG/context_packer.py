@@ -0,0 +1,166 @@
+"""
+Token-budgeted context packer: turns retrieved chunks into the context block of the prompt.
+
+Chunks are taken best score first while they fit in the token budget, and chunks scoring under
+a fraction of the best one are dropped. Chunks that follow each other in the same document and
+page are merged, so the text they share (the chunker's overlap) is sent once. Each packed
+context reports the prompt tokens it saved against joining every retrieved chunk.
+
+This module must stay importable without settings, the local RAG scripts use it.
+"""
+from dataclasses import dataclass
+from typing import Hashable, List, Sequence
+
+import tiktoken
+
+from core.RAG.chunker import DEFAULT_ENCODING
+
+
+DEFAULT_TOKEN_BUDGET = 3000
+DEFAULT_MIN_RELATIVE_SCORE = 0.3
+# shorter suffix / prefix matches between neighbouring chunks are taken as a coincidence
+MIN_OVERLAP_CHARS = 16
+SEPARATOR = "\n\n"
+
+
+@dataclass
+class ContextChunk:
+    # a retrieved chunk, as the packer sees it
+    text: str
+    score: float                    # higher is better, only compared with the other chunks' scores
+    source: str                     # shown in the chunk's [SOURCE: ...] header
+    document: Hashable              # chunks of the same document and page can be merged
+    page: int | None = None
+    position: int | None = None     # chunk_index, consecutive positions are neighbours
+    char_start: int | None = None   # offsets within the page, used instead of matching text when known
+    char_end: int | None = None
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    unpacked_tokens: int            # tokens of every retrieved chunk joined with its header
+    chunks: int                     # retrieved chunks in the context
+    dropped: int                    # under the relevance cutoff or over the budget
+    merged: int                     # chunks merged into their neighbour
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.unpacked_tokens - self.tokens)
+
+
+def _shared_chars(first: ContextChunk, second: ContextChunk) -> int | None:
+    # characters at the start of `second` that end `first`, None if they aren't neighbours
+    if first.document != second.document or first.page != second.page:
+        return None
+    if None not in (first.char_start, first.char_end, second.char_start):
+        if first.char_start < second.char_start <= first.char_end:
+            return first.char_end - second.char_start
+        return None
+    if first.position is None or second.position is None or second.position != first.position + 1:
+        return None
+
+    # the longest suffix of `first` that starts `second`
+    for start in range(max(0, len(first.text) - len(second.text)), len(first.text) - MIN_OVERLAP_CHARS + 1):
+        if second.text.startswith(first.text[start:]):
+            return len(first.text) - start
+    return None
+
+
+def _sort_key(chunk: ContextChunk):
+    return (
+        str(chunk.document), -1 if chunk.page is None else chunk.page,
+        chunk.char_start if chunk.char_start is not None else -1,
+        chunk.position if chunk.position is not None else -1,
+    )
+
+
+class ContextPacker:
+
+    def __init__(
+            self,
+            token_budget: int = DEFAULT_TOKEN_BUDGET,
+            min_relative_score: float = DEFAULT_MIN_RELATIVE_SCORE,
+            encoding_name: str = DEFAULT_ENCODING,
+    ):
+        self.token_budget = token_budget
+        self.min_relative_score = min_relative_score
+        self.encoding = tiktoken.get_encoding(encoding_name)
+
+    def _count(self, text: str) -> int:
+        return len(self.encoding.encode_ordinary(text))
+
+    def _render(self, chunks: List[ContextChunk]) -> tuple[str, int]:
+        """
+        Merges neighbouring chunks and joins the merged blocks, best block first
+
+        :return: (context text, number of chunks merged into a neighbour)
+        """
+        blocks = []     # [score, source, text, last chunk]
+        merged = 0
+        for chunk in sorted(chunks, key=_sort_key):
+            shared = _shared_chars(blocks[-1][3], chunk) if blocks else None
+            if shared is None:
+                blocks.append([chunk.score, chunk.source, chunk.text, chunk])
+                continue
+            block = blocks[-1]
+            block[0] = max(block[0], chunk.score)
+            block[2] = block[2] + chunk.text[shared:] if shared else f"{block[2]}\n{chunk.text}"
+            block[3] = chunk
+            merged += 1
+
+        blocks.sort(key=lambda block: block[0], reverse=True)
+        return SEPARATOR.join(f"[SOURCE: {source}] {text}" for _, source, text, _ in blocks), merged
+
+    def pack(self, chunks: Sequence[ContextChunk]) -> PackedContext:
+        """
+        Packs retrieved chunks into at most token_budget tokens of context
+
+        :param chunks: Retrieved chunks, in any order
+        :return: PackedContext with the context text and its token accounting
+        """
+        costs = [self._count(f"[SOURCE: {chunk.source}] {chunk.text}") for chunk in chunks]
+        # the old context: every chunk with its header, one separator token between them
+        unpacked_tokens = sum(costs) + max(0, len(chunks) - 1)
+        if not chunks:
+            return PackedContext("", 0, 0, 0, 0, 0)
+
+        ranked = sorted(range(len(chunks)), key=lambda i: chunks[i].score, reverse=True)
+        cutoff = chunks[ranked[0]].score * self.min_relative_score
+
+        # greedy by score; a chunk next to one already taken only costs its new text
+        selected: List[ContextChunk] = []
+        used = 0
+        for i in ranked:
+            chunk = chunks[i]
+            if chunk.score < cutoff:
+                break
+            cost = costs[i] + 1
+            for other in selected:
+                shared = _shared_chars(other, chunk)
+                if shared is not None:
+                    cost = self._count(chunk.text[shared:]) + 1
+                    break
+            if used + cost > self.token_budget:
+                continue
+            selected.append(chunk)
+            used += cost
+
+        if not selected:
+            # even the best chunk is over the budget, send as much of it as fits
+            best = chunks[ranked[0]]
+            header = f"[SOURCE: {best.source}] "
+            tokens = self.encoding.encode_ordinary(best.text)[:max(0, self.token_budget - self._count(header))]
+            text = header + self.encoding.decode(tokens)
+            return PackedContext(text, self._count(text), unpacked_tokens, 1, len(chunks) - 1, 0)
+
+        # the estimates above ignore merges across token boundaries, the rendered text is exact
+        text, merged = self._render(selected)
+        tokens = self._count(text)
+        while tokens > self.token_budget and len(selected) > 1:
+            selected.pop()
+            text, merged = self._render(selected)
+            tokens = self._count(text)
+
+        return PackedContext(text, tokens, unpacked_tokens, len(selected), len(chunks) - len(selected), merged)
@@ -0,0 +1,258 @@
+"""
+Embedding batcher shared by everything embedding in a process.
+
+Callers submit any number of texts; a dispatcher thread merges texts from all callers
+(e.g. several documents being ingested at once) into provider requests of up to
+EMBEDDING_REQUEST_MAX_TEXTS texts / EMBEDDING_REQUEST_MAX_TOKENS tokens. It caps the
+number of requests in flight, keeps under a tokens-per-minute budget, retries failed
+requests with jittered exponential backoff and keeps throughput counters.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List
+import collections
+import logging
+import random
+import threading
+import time
+
+from config.settings import settings
+from core.RAG.embeddings.providers import EmbeddingProvider, get_embedding_provider
+
+
+logger = logging.getLogger(__name__)
+
+_batcher: "EmbeddingBatcher | None" = None
+_batcher_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for english text; good enough for budgeting and needs no tokenizer
+    return len(text) // 4 + 1
+
+
+class _Submission:
+    # one submit() call, resolved once every text in it is embedded
+    def __init__(self, size: int):
+        self.future: Future = Future()
+        self.vectors: List[List[float] | None] = [None] * size
+        self.remaining = size
+        self.lock = threading.Lock()
+
+    def set_vector(self, index: int, vector: List[float]) -> None:
+        with self.lock:
+            self.vectors[index] = vector
+            self.remaining -= 1
+            done = self.remaining == 0 and not self.future.done()
+        if done:
+            self.future.set_result(self.vectors)
+
+    def set_error(self, error: BaseException) -> None:
+        with self.lock:
+            if self.future.done():
+                return
+            self.future.set_exception(error)
+
+
+@dataclass
+class _Item:
+    submission: _Submission
+    index: int
+    text: str
+    tokens: int
+
+
+class _TokenBucket:
+    # tokens-per-minute budget, refilled continuously
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+
+    def acquire(self, tokens: int) -> float:
+        """
+        Blocks until `tokens` are available and takes them
+
+        :return: Seconds spent waiting
+        """
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return waited
+            delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class EmbeddingBatcher:
+
+    def __init__(
+            self,
+            provider: EmbeddingProvider,
+            max_batch_texts: int = settings.EMBEDDING_REQUEST_MAX_TEXTS,
+            max_batch_tokens: int = settings.EMBEDDING_REQUEST_MAX_TOKENS,
+            max_wait_ms: int = settings.EMBEDDING_BATCH_WAIT_MS,
+            max_in_flight: int = settings.EMBEDDING_MAX_IN_FLIGHT,
+            tokens_per_minute: int = settings.EMBEDDING_TOKENS_PER_MINUTE,
+            max_retries: int = settings.EMBEDDING_MAX_RETRIES,
+    ):
+        self.provider = provider
+        self.max_batch_texts = max_batch_texts
+        self.max_batch_tokens = max_batch_tokens
+        self.max_wait = max_wait_ms / 1000
+        self.max_retries = max_retries
+
+        self._pending: collections.deque[_Item] = collections.deque()
+        self._condition = threading.Condition()
+        self._in_flight = threading.Semaphore(max_in_flight)
+        self._bucket = _TokenBucket(tokens_per_minute)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embedding-request")
+        self._closed = False
+
+        self._stats_lock = threading.Lock()
+        self._started = time.monotonic()
+        self._counters = collections.Counter()
+
+        self._dispatcher = threading.Thread(target=self._dispatch, name="embedding-batcher", daemon=True)
+        self._dispatcher.start()
+
+    # ---------- Public API ----------
+    def submit(self, texts: List[str]) -> Future:
+        """
+        Queues texts for embedding
+
+        :param texts: Texts to embed, any number
+        :return: Future resolving to one vector per text, in input order
+        """
+        submission = _Submission(len(texts))
+        if not texts:
+            submission.future.set_result([])
+            return submission.future
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("EmbeddingBatcher is closed")
+            for index, text in enumerate(texts):
+                self._pending.append(_Item(submission, index, text, estimate_tokens(text)))
+            self._condition.notify()
+
+        self._count(submitted_texts=len(texts))
+        return submission.future
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.submit(texts).result()
+
+    def stats(self) -> dict:
+        """
+        Throughput counters since the batcher started
+        """
+        with self._stats_lock:
+            counters = dict(self._counters)
+        elapsed = time.monotonic() - self._started
+        requests = counters.get("requests", 0)
+        return {
+            **counters,
+            "pending_texts": len(self._pending),
+            "elapsed_seconds": round(elapsed, 3),
+            "texts_per_second": round(counters.get("embedded_texts", 0) / elapsed, 2) if elapsed else 0.0,
+            "tokens_per_second": round(counters.get("embedded_tokens", 0) / elapsed, 2) if elapsed else 0.0,
+            "avg_texts_per_request": round(counters.get("embedded_texts", 0) / requests, 2) if requests else 0.0,
+            "avg_request_ms": round(counters.get("request_ms", 0) / requests, 2) if requests else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+    # ---------- Internals ----------
+    def _count(self, **values) -> None:
+        with self._stats_lock:
+            self._counters.update(values)
+
+    def _next_batch(self) -> List[_Item]:
+        # waits for work, then gives a partial batch max_wait to fill up with other callers' texts
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            deadline = time.monotonic() + self.max_wait
+            while len(self._pending) < self.max_batch_texts and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch: List[_Item] = []
+            tokens = 0
+            while self._pending and len(batch) < self.max_batch_texts:
+                item = self._pending[0]
+                if batch and tokens + item.tokens > self.max_batch_tokens:
+                    break
+                batch.append(self._pending.popleft())
+                tokens += item.tokens
+            return batch
+
+    def _dispatch(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                # closed and drained
+                return
+
+            self._in_flight.acquire()
+            waited = self._bucket.acquire(sum(item.tokens for item in batch))
+            if waited:
+                self._count(rate_limited_ms=int(waited * 1000))
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[_Item]) -> None:
+        try:
+            texts = [item.text for item in batch]
+            for attempt in range(self.max_retries + 1):
+                started = time.monotonic()
+                try:
+                    vectors = self.provider.embed(texts)
+                    if len(vectors) != len(texts):
+                        # a short answer would leave submissions unresolved and their ingestion waiting forever
+                        raise ValueError(f"the provider returned {len(vectors)} vectors for {len(texts)} texts")
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        logger.error(f"Embedding request of {len(texts)} texts failed after {attempt + 1} attempts: {e}")
+                        self._count(failed_requests=1)
+                        for item in batch:
+                            item.submission.set_error(e)
+                        return
+                    # full jitter on an exponential backoff
+                    delay = random.uniform(0, min(30.0, 0.5 * (2 ** attempt)))
+                    logger.warning(f"Embedding request failed ({e}), retrying in {delay:.2f}s")
+                    self._count(retries=1)
+                    time.sleep(delay)
+
+            self._count(
+                requests=1,
+                embedded_texts=len(batch),
+                embedded_tokens=sum(item.tokens for item in batch),
+                request_ms=int((time.monotonic() - started) * 1000),
+            )
+            for item, vector in zip(batch, vectors):
+                item.submission.set_vector(item.index, vector)
+        finally:
+            self._in_flight.release()
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    # one batcher per process, so concurrent ingestions share requests and rate limits
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = EmbeddingBatcher(get_embedding_provider())
+        return _batcher
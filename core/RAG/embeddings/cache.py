@@ -0,0 +1,120 @@
+"""
+Persistent embedding cache in front of the embedding batcher.
+
+Embeddings are keyed by (model, sha256(text)), where the model key includes the output
+dimensions, the same way vectors are already scoped to EMBEDDING_MODEL. Boilerplate chunks,
+repeated resume sections and repeated queries are embedded once and then served from the
+embedding_cache table. Every embedding call in ingestion and retrieval goes through
+get_embedder().
+"""
+from typing import Dict, List
+import collections
+import hashlib
+import logging
+import threading
+
+from config.settings import settings
+from core.RAG.embeddings.batcher import EmbeddingBatcher, get_embedding_batcher
+from database.database import SessionLocal
+from database.db_access import embedding_cache_access
+
+
+logger = logging.getLogger(__name__)
+
+_embedder: "CachedEmbedder | None" = None
+_embedder_lock = threading.Lock()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbedder:
+
+    def __init__(
+            self,
+            batcher: EmbeddingBatcher,
+            enabled: bool = settings.EMBEDDING_CACHE_ENABLED,
+            max_entries: int = settings.EMBEDDING_CACHE_MAX_ENTRIES,
+            evict_every: int = settings.EMBEDDING_CACHE_EVICT_EVERY,
+    ):
+        self.batcher = batcher
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self.model_key = f"{batcher.provider.model}@{batcher.provider.dimensions}"
+
+        self._lock = threading.Lock()
+        self._counters = collections.Counter()
+        self._inserts_since_eviction = 0
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds texts, serving cached ones from the embedding_cache table
+
+        :param texts: Texts to embed
+        :return: One vector per text, in input order
+        """
+        if not texts:
+            return []
+        if not self.enabled:
+            return self.batcher.embed(texts)
+
+        hashes = [text_hash(text) for text in texts]
+        db = SessionLocal()
+        try:
+            found = embedding_cache_access.get_cached_embeddings(self.model_key, list(set(hashes)), db)
+
+            # identical texts within the call are embedded once
+            missing: Dict[str, str] = {}
+            for text, digest in zip(texts, hashes):
+                if digest not in found:
+                    missing.setdefault(digest, text)
+
+            if missing:
+                vectors = self.batcher.embed(list(missing.values()))
+                new_embeddings = dict(zip(missing.keys(), vectors))
+                embedding_cache_access.save_embeddings(self.model_key, new_embeddings, db)
+                found.update(new_embeddings)
+                self._maybe_evict(len(new_embeddings), db)
+        finally:
+            db.close()
+
+        misses = sum(1 for digest in hashes if digest in missing)
+        self._count(hits=len(hashes) - misses, misses=misses)
+        return [found[digest] for digest in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed([text])[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        return {
+            **counters,
+            "hit_rate": round(counters.get("hits", 0) / lookups, 4) if lookups else 0.0,
+        }
+
+    def _count(self, **values) -> None:
+        with self._lock:
+            self._counters.update(values)
+
+    def _maybe_evict(self, inserted: int, db) -> None:
+        # eviction counts the whole table, so only run it every evict_every inserts
+        with self._lock:
+            self._inserts_since_eviction += inserted
+            if self._inserts_since_eviction < self.evict_every:
+                return
+            self._inserts_since_eviction = 0
+        evicted = embedding_cache_access.evict_embeddings(self.max_entries, db)
+        self._count(evictions=evicted)
+
+
+def get_embedder() -> CachedEmbedder:
+    # one per process, on top of the process-wide batcher
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            _embedder = CachedEmbedder(get_embedding_batcher())
+        return _embedder
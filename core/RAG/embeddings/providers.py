@@ -0,0 +1,93 @@
+"""
+Embedding providers -> one request to an embedding backend, no batching or retries.
+Batching, concurrency and rate limiting live in core/RAG/embeddings/batcher.py.
+
+*****EMBEDDING_PROVIDER setting in .env*****
+
+Values:
+    "openai"  → OpenAIEmbeddingProvider  (default)
+    "local"   → LocalEmbeddingProvider   (deterministic vectors, no network, for load tests)
+"""
+from abc import ABC, abstractmethod
+from typing import List
+import hashlib
+import math
+import random
+import time
+
+from config.settings import settings
+
+
+class EmbeddingProvider(ABC):
+
+    model: str
+    dimensions: int
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds texts in a single request.
+
+        :param texts: Texts to embed, already sized to fit one request
+        :return: One vector per text, in input order
+        """
+        pass
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+
+    def __init__(self, model: str = settings.EMBEDDING_MODEL, dimensions: int = settings.EMBEDDING_DIMENSIONS):
+        from openai import OpenAI
+
+        self.model = model
+        self.dimensions = dimensions
+        # retries are done by the batcher, with backoff shared across requests
+        self.client = OpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(
+            model=self.model,
+            input=texts,
+            dimensions=self.dimensions,
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic unit vectors seeded by the text hash. Same text -> same vector, across
+    runs and machines, which is all a load test or an offline dev setup needs.
+    """
+
+    def __init__(
+            self,
+            model: str = "local-hash",
+            dimensions: int = settings.EMBEDDING_DIMENSIONS,
+            latency_seconds: float = 0.0,
+    ):
+        self.model = model
+        self.dimensions = dimensions
+        # simulated request latency, so load tests exercise the in-flight limits
+        self.latency_seconds = latency_seconds
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        vector = [rng.gauss(0.0, 1.0) for _ in range(self.dimensions)]
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return [self._vector(text) for text in texts]
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    provider = settings.EMBEDDING_PROVIDER.lower()
+
+    if provider == "local":
+        return LocalEmbeddingProvider()
+
+    # default
+    return OpenAIEmbeddingProvider()
@@ -0,0 +1,141 @@
+"""
+In-process LRU + TTL cache for query embeddings, in front of the persistent cache.
+
+Users re-ask the same question and the frontend retries, so the chat path embeds the same
+query over and over. Lookups go memory (this cache) -> embedding_cache table (CachedEmbedder)
+-> embedding provider. Entries are keyed by (model, normalized query), held as float32 arrays
+to keep memory bounded by QUERY_EMBEDDING_CACHE_MAX_ENTRIES, and expire after
+QUERY_EMBEDDING_CACHE_TTL_SECONDS. Concurrent lookups of the same query share one embedding
+call (single flight).
+"""
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+import collections
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+from config.settings import settings
+from core.RAG.embeddings.cache import CachedEmbedder, get_embedder
+
+
+logger = logging.getLogger(__name__)
+
+_query_embedder: "QueryEmbeddingCache | None" = None
+_query_embedder_lock = threading.Lock()
+
+_WHITESPACE = re.compile(r"\s+")
+# stats are logged every this many lookups
+_LOG_STATS_EVERY = 1000
+
+
+def normalize_query(query: str) -> str:
+    # case is kept, it carries meaning for acronyms ("IT", "it")
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", query)).strip()
+
+
+class QueryEmbeddingCache:
+
+    def __init__(
+            self,
+            embedder: CachedEmbedder,
+            enabled: bool = settings.QUERY_EMBEDDING_CACHE_ENABLED,
+            max_entries: int = settings.QUERY_EMBEDDING_CACHE_MAX_ENTRIES,
+            ttl_seconds: float = settings.QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+    ):
+        self.embedder = embedder
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        # key -> (expires_at, vector), least recently used first
+        self._entries: "collections.OrderedDict[Tuple[str, str], Tuple[float, np.ndarray]]" = collections.OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+        self._counters = collections.Counter()
+        self._lookups = 0
+
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embeds a query, from memory when the same query was embedded within the TTL
+
+        :param query: The user's query
+        :return: The query's embedding
+        """
+        text = normalize_query(query)
+        if not self.enabled:
+            return self.embedder.embed_query(text)
+
+        key = (self.embedder.model_key, text)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._count("hits")
+                return entry[1].tolist()
+            if entry is not None:
+                del self._entries[key]
+                self._count("expired")
+
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+                self._count("misses")
+            else:
+                self._count("coalesced")
+
+        if not leader:
+            # an identical query is already being embedded, wait for its result
+            return future.result().tolist()
+
+        try:
+            vector = np.asarray(self.embedder.embed_query(text), dtype=np.float32)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+        future.set_result(vector)
+        return vector.tolist()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+        lookups = counters.get("hits", 0) + counters.get("misses", 0) + counters.get("coalesced", 0)
+        return {
+            **counters,
+            "entries": entries,
+            "hit_rate": round(counters.get("hits", 0) / lookups, 4) if lookups else 0.0,
+        }
+
+    def _count(self, name: str) -> None:
+        # called with self._lock held
+        self._counters[name] += 1
+        if name == "expired":
+            return
+        self._lookups += 1
+        if self._lookups % _LOG_STATS_EVERY == 0:
+            logger.info(f"Query embedding cache stats: {dict(self._counters)}, {len(self._entries)} entries")
+
+
+def get_query_embedder() -> QueryEmbeddingCache:
+    # one per process, on top of the persistent cache
+    global _query_embedder
+    with _query_embedder_lock:
+        if _query_embedder is None:
+            _query_embedder = QueryEmbeddingCache(get_embedder())
+        return _query_embedder
@@ -2,17 +2,169 @@
 Development RAG implementation — Aryan's personal RAG pipeline.
 Set RAG_IMPLEMENTATION=dev in your .env to use this.
 """
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterator, List
+import asyncio
+import logging
+import time
+
+from openai import AsyncOpenAI, OpenAI
+
+from config.settings import settings
+from core.entities.chunk_entity import RetrievedChunk
+from core.RAG.answer_cache import get_answer_cache
+from core.RAG.context_packer import ContextChunk, ContextPacker, PackedContext
+from core.RAG.embeddings.query_cache import get_query_embedder
 from core.RAG.rag_interface import RAGInterface
+from core.RAG.retrievers.retriever_factory import get_retriever
+from database.database import SessionLocal
+from database.db_access import user_access
+
+
+logger = logging.getLogger(__name__)
+
+NO_CONTEXT_RESPONSE = "I couldn't find anything about that in your documents."
+SYSTEM_PROMPT = (
+    "Respond with information from the document/s given to you. "
+    "Do not retrieve data from the internet or hallucinate."
+)
+
+
+@dataclass
+class _Turn:
+    # everything decided before the LLM call
+    version: int                        # document set version, for the answer cache
+    query_embedding: List[float]
+    answer: str | None = None           # set when no LLM call is needed (cached, or no context)
+    messages: List[dict] | None = None  # the LLM request otherwise
 
 
 class DevRAG(RAGInterface):
 
+    def __init__(self, top_k: int = settings.RETRIEVAL_TOP_K, model: str = settings.LLM_MODEL):
+        self.top_k = top_k
+        self.model = model
+        self.retriever = get_retriever()
+        # the hybrid retriever already applied the score cutoff before fusion
+        min_relative_score = settings.CONTEXT_MIN_RELATIVE_SCORE if settings.RETRIEVAL_MODE == "vector" else 0.0
+        self.packer = ContextPacker(settings.CONTEXT_TOKEN_BUDGET, min_relative_score)
+        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.async_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
     def get_response(self, user_id: int, query: str) -> str:
-        # TODO: implement your RAG pipeline here
-        # Steps: Roughly for now -- more on the details later
-        # 1. Embed the query
-        # 2. Run pgvector similarity search scoped to user_id
-        # 3. Build context from retrieved chunks
-        # 4. Call LLM with context + query
-        # 5. Return the response string
-        raise NotImplementedError("DevRAG.get_response() is not yet implemented")
+        turn = self._prepare(user_id, query)
+        if turn.answer is not None:
+            return turn.answer
+
+        # 4. call the LLM with context + query
+        started = time.monotonic()
+        response = self.client.chat.completions.create(model=self.model, messages=turn.messages)
+
+        # 5. cache and return the response string
+        answer = response.choices[0].message.content
+        get_answer_cache().store(user_id, turn.version, query, turn.query_embedding, answer, time.monotonic() - started)
+        return answer
+
+    def stream_response(self, user_id: int, query: str) -> Iterator[str]:
+        turn = self._prepare(user_id, query)
+        if turn.answer is not None:
+            yield turn.answer
+            return
+
+        # 4. stream the LLM response
+        started = time.monotonic()
+        stream = self.client.chat.completions.create(model=self.model, messages=turn.messages, stream=True)
+        parts = []
+        try:
+            for event in stream:
+                if event.choices and event.choices[0].delta.content:
+                    parts.append(event.choices[0].delta.content)
+                    yield parts[-1]
+        finally:
+            # also runs when the consumer closes the generator early: closing the http response
+            # makes the API stop generating the rest of the answer
+            stream.close()
+
+        # 5. only a complete answer is cached
+        get_answer_cache().store(
+            user_id, turn.version, query, turn.query_embedding, "".join(parts), time.monotonic() - started
+        )
+
+    async def get_response_async(self, user_id: int, query: str) -> str:
+        # the steps before the LLM are short and blocking (embedding cache, database), they get a
+        # worker thread; the LLM call is the long wait and is awaited without one
+        turn = await asyncio.to_thread(self._prepare, user_id, query)
+        if turn.answer is not None:
+            return turn.answer
+
+        started = time.monotonic()
+        response = await self.async_client.chat.completions.create(model=self.model, messages=turn.messages)
+
+        answer = response.choices[0].message.content
+        get_answer_cache().store(user_id, turn.version, query, turn.query_embedding, answer, time.monotonic() - started)
+        return answer
+
+    async def stream_response_async(self, user_id: int, query: str) -> AsyncIterator[str]:
+        turn = await asyncio.to_thread(self._prepare, user_id, query)
+        if turn.answer is not None:
+            yield turn.answer
+            return
+
+        started = time.monotonic()
+        stream = await self.async_client.chat.completions.create(model=self.model, messages=turn.messages, stream=True)
+        parts = []
+        try:
+            async for event in stream:
+                if event.choices and event.choices[0].delta.content:
+                    parts.append(event.choices[0].delta.content)
+                    yield parts[-1]
+        finally:
+            # aclose() or a cancelled task: closing the http response stops the generation
+            await stream.close()
+
+        get_answer_cache().store(
+            user_id, turn.version, query, turn.query_embedding, "".join(parts), time.monotonic() - started
+        )
+
+    def _prepare(self, user_id: int, query: str) -> _Turn:
+        # 0. a near-duplicate of an earlier question over the same documents reuses its answer
+        query_embedding = get_query_embedder().embed_query(query)
+        db = SessionLocal()
+        try:
+            version = user_access.get_document_set_version(user_id, db)
+        finally:
+            db.close()
+        cached = get_answer_cache().lookup(user_id, version, query_embedding)
+        if cached is not None:
+            return _Turn(version, query_embedding, answer=cached.answer)
+
+        # 1 + 2. embed the query and search the user's chunks (the embedding comes from the cache)
+        chunks = self.retriever.retrieve(user_id, query, self.top_k)
+        if not chunks:
+            return _Turn(version, query_embedding, answer=NO_CONTEXT_RESPONSE)
+
+        # 3. pack the retrieved chunks into the context token budget
+        context = self._build_context(chunks)
+        logger.info(
+            f"Context for user {user_id}: {context.chunks} of {len(chunks)} chunks ({context.merged} merged), "
+            f"{context.tokens} tokens, {context.tokens_saved} saved"
+        )
+        prompt = f"Context:\n{context.text}\n\nQuestion: {query}\nAnswer:"
+        return _Turn(version, query_embedding, messages=[
+            {"role": "developer", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ])
+
+    def _build_context(self, chunks: List[RetrievedChunk]) -> PackedContext:
+        return self.packer.pack([
+            ContextChunk(
+                text=chunk.content,
+                score=chunk.score,
+                source=f"document {chunk.document_id}"
+                       f"{'' if chunk.page_number is None else f', page {chunk.page_number + 1}'}",
+                document=chunk.document_id,
+                page=chunk.page_number,
+                position=chunk.chunk_index,
+            )
+            for chunk in chunks
+        ])
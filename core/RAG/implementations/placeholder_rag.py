@@ -9,3 +9,6 @@ class PlaceholderRAG(RAGInterface):
 
     def get_response(self, user_id: int, query: str) -> str:
         return "This is a placeholder response. No RAG implementation is active."
+
+    async def get_response_async(self, user_id: int, query: str) -> str:
+        return self.get_response(user_id, query)
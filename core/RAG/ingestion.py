@@ -0,0 +1,97 @@
+"""
+Document ingestion steps: parse -> chunk -> embed.
+
+Kept free of database and R2 access so the ingestion worker and the local RAG scripts
+can share them. stream_embedded_chunks() wires the steps into a bounded streaming
+pipeline (see core/RAG/streaming.py).
+"""
+from typing import Callable, Iterable, Iterator, List, Tuple
+import hashlib
+import logging
+
+from langchain_core.documents import Document
+
+from config.settings import settings
+from core.RAG.chunker import TokenChunker
+from core.RAG.minhash import lsh_bands, minhash_signature, signature_bytes
+from core.RAG.pdf_parsing import parse_pdf, iter_pdf
+from core.RAG.streaming import bounded, iter_batches
+from core.RAG.embeddings.cache import get_embedder
+
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Chunking ----------
+def chunk_documents(
+        docs: List[Document],
+        chunk_tokens: int = settings.CHUNK_TOKENS,
+        chunk_overlap_tokens: int = settings.CHUNK_OVERLAP_TOKENS,
+) -> List[Document]:
+    return TokenChunker(chunk_tokens, chunk_overlap_tokens).split_documents(docs)
+
+
+def iter_chunks(
+        pages: Iterable[Document],
+        chunk_tokens: int = settings.CHUNK_TOKENS,
+        chunk_overlap_tokens: int = settings.CHUNK_OVERLAP_TOKENS,
+) -> Iterator[Document]:
+    # page by page, so only one page worth of chunks exists at a time
+    chunker = TokenChunker(chunk_tokens, chunk_overlap_tokens)
+    for chunk_index, chunk in enumerate(chunker.iter_documents(pages)):
+        chunk.metadata["chunk_index"] = chunk_index
+        chunk.metadata["content_hash"] = content_hash(chunk.page_content)
+        # near-duplicate detection, computed here so it runs on the chunking thread
+        signature = minhash_signature(chunk.page_content)
+        chunk.metadata["minhash"] = signature_bytes(signature)
+        chunk.metadata["minhash_bands"] = lsh_bands(signature)
+        yield chunk
+
+
+def content_hash(text: str) -> str:
+    # must match the backfill in the chunks content_hash migration
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ---------- Embedding ----------
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    # goes through the persistent embedding cache, then the process-wide batcher which
+    # merges requests across concurrent ingestions
+    if not texts:
+        return []
+    return get_embedder().embed(texts)
+
+
+def embed_batches(
+        batches: Iterable[List[Document]],
+        needs_embedding: Callable[[Document], bool] | None = None,
+) -> Iterator[Tuple[List[Document], List[List[float] | None]]]:
+    # chunks rejected by needs_embedding get None instead of a vector
+    for batch in batches:
+        todo = [chunk for chunk in batch if needs_embedding is None or needs_embedding(chunk)]
+        vectors = iter(embed_texts([chunk.page_content for chunk in todo]))
+        todo_ids = {id(chunk) for chunk in todo}
+        yield batch, [next(vectors) if id(chunk) in todo_ids else None for chunk in batch]
+
+
+# ---------- Streaming pipeline ----------
+def stream_embedded_chunks(
+        pages: Iterable[Document],
+        batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+        queue_size: int = settings.INGESTION_QUEUE_SIZE,
+        needs_embedding: Callable[[Document], bool] | None = None,
+) -> Iterator[Tuple[List[Document], List[List[float] | None]]]:
+    """
+    pages -> chunks -> embedding batches, with parsing/chunking and embedding each on their
+    own thread behind bounded queues. Embedding starts as soon as the first batch is chunked,
+    and at most `queue_size` batches are held in memory between stages.
+
+    :param pages: Page Documents, ideally a lazy generator such as iter_pdf()
+    :param batch_size: Number of chunks per embedding request
+    :param queue_size: Number of batches buffered between stages
+    :param needs_embedding: Optional filter, chunks it rejects are not embedded (incremental re-ingestion)
+
+    :return: Generator of (chunk batch, embeddings) tuples in chunk order
+    """
+    chunk_batches = bounded(iter_batches(iter_chunks(pages), batch_size), queue_size)
+    return bounded(embed_batches(chunk_batches, needs_embedding), queue_size)
@@ -1,16 +1,23 @@
-import modules
+import logging
 import os
 import shutil
 from pathlib import Path
 import chromadb
 from dotenv import load_dotenv
 from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.schema import Document
 from openai import OpenAI
 
+from core.RAG.chunker import TokenChunker
+from core.RAG.context_packer import ContextChunk, ContextPacker
+from core.RAG.minhash import NearDuplicateIndex, lsh_bands, minhash_signature
+from core.RAG.pdf_parsing import load_pdfs_parallel
+from core.RAG.streaming import bounded, iter_batches
+
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
@@ -35,7 +42,12 @@ client = OpenAI()
 
 # ---------- To load Documents ----------
 #Below function, the argument 'folder' is of type 'Path'
-def load_all_pdfs(folder: Path):
+def load_all_pdfs(folder: Path, parallel: bool = False, max_workers: int | None = None):
+    #parallel=True spreads the files (and page ranges of big files) across a process pool,
+    #pages come back in the same order as the sequential loop below
+    if parallel:
+        return load_pdfs_parallel(sorted(folder.glob("*.pdf")), max_workers=max_workers)
+
     docs = [] #empty list created
     for pdf in sorted(folder.glob("*.pdf")):
         for d in PyMuPDFLoader(str(pdf)).load():
@@ -47,12 +59,33 @@ def load_all_pdfs(folder: Path):
     return docs
 
 
-#It is to chunk the documents using the RecursiveCharacterTextSplitter
-def chunk_documents(docs, chunk_size=1000, chunk_overlap=150):
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size, chunk_overlap=chunk_overlap
-    )
-    return splitter.split_documents(docs) #retruning chunked docs, as a list
+#Lazy version of load_all_pdfs: yields one page at a time instead of building the full list
+def iter_all_pdfs(folder: Path):
+    for pdf in sorted(folder.glob("*.pdf")):
+        for d in PyMuPDFLoader(str(pdf)).lazy_load():
+            d.metadata = dict(d.metadata or {})
+            d.metadata["source"] = str(pdf)
+            yield d
+
+
+#It is to chunk the documents into token-bounded chunks (see core/RAG/chunker.py)
+def chunk_documents(docs, chunk_tokens=256, chunk_overlap_tokens=32):
+    chunker = TokenChunker(chunk_tokens, chunk_overlap_tokens)
+    return chunker.split_documents(docs) #retruning chunked docs, as a list
+
+#Generator version of chunk_documents, chunks page by page
+#Near-identical chunks (the same section in several resume versions) get the same near_duplicate_key
+def iter_chunks(docs, chunk_tokens=256, chunk_overlap_tokens=32):
+    chunker = TokenChunker(chunk_tokens, chunk_overlap_tokens)
+    clusters = NearDuplicateIndex()
+    for chunk_number, chunk in enumerate(chunker.iter_documents(docs)):
+        signature = minhash_signature(chunk.page_content)
+        bands = lsh_bands(signature)
+        key = clusters.find(signature, bands) or f"chunk-{chunk_number}"
+        clusters.add(key, signature, bands)
+        chunk.metadata["near_duplicate_key"] = key
+        yield chunk
+
 
 def store_embeddings_in_chroma(chunks):
     #remove the chromaDB from the Chroma path, if it exist. Basically clearing the ChromaDB collection.
@@ -66,23 +99,43 @@ def store_embeddings_in_chroma(chunks):
     vs.persist()
     return vs
 
+#Streaming version of store_embeddings_in_chroma: embeds and inserts one batch at a time
+def store_chunk_batches_in_chroma(chunk_batches):
+    vs = Chroma(embedding_function=emb)
+    for batch in chunk_batches:
+        vs.add_documents(batch)
+    vs.persist()
+    return vs
+
 def retrieve_chunks(query, vectorstore, top_k=40):
-    #Run similarity search with Chroma; returns list
-    results = vectorstore.similarity_search(query, k=top_k * 2)
-    unique_chunks = set() # This set will be created to have only unique chunks that came out of the similarity search and no duplicate chunks.
+    #Run similarity search with Chroma; returns list, each chunk's relevance score goes in its metadata
+    results = vectorstore.similarity_search_with_relevance_scores(query, k=top_k * 2)
+    unique_chunks = set() # This set will be created to have only one chunk per near-duplicate cluster (set at ingestion).
     uniq =  []
-    for d in results:
-        if d.page_content not in unique_chunks:
-            uniq.append(d); unique_chunks.add(d.page_content)
+    for d, score in results:
+        key = d.metadata.get("near_duplicate_key", d.page_content)
+        if key not in unique_chunks:
+            d.metadata["score"] = score
+            uniq.append(d); unique_chunks.add(key)
         if len(uniq) >= top_k: break
     return uniq
 
-def generate_answer(query, top_chunks):
-    context = "\n\n".join(
-        f"[SOURCE: {d.metadata.get('source','?')}] {d.page_content}"
+#Packs the chunks best first into token_budget tokens; overlapping neighbours of the same page are merged
+def generate_answer(query, top_chunks, token_budget=3000):
+    context = ContextPacker(token_budget).pack([
+        ContextChunk(
+            text=d.page_content,
+            score=d.metadata.get("score", 0.0),
+            source=d.metadata.get("source", "?"),
+            document=d.metadata.get("source", "?"),
+            page=d.metadata.get("page"),
+            char_start=d.metadata.get("char_start"),
+            char_end=d.metadata.get("char_end"),
+        )
         for d in top_chunks
-    )
-    prompt = f"Context:\n{context}\n\nQuestion: {query}\nAnswer:"
+    ])
+    logger.info(f"Context: {context.chunks} of {len(top_chunks)} chunks, {context.tokens} tokens, {context.tokens_saved} saved")
+    prompt = f"Context:\n{context.text}\n\nQuestion: {query}\nAnswer:"
     dev = "Respond with infromation from the document/s given to you. Do not retrieve data from the internet or hallucinate. "
     resp = client.chat.completions.create(
         #model needs to be flexible based on user's decision of LLM
@@ -94,12 +147,13 @@ def generate_answer(query, top_chunks):
 # ---------- Data Ingestion (Loading the documents infromation ----------
 def resume_agent(user_query: str, pdf_path: Path ):
     #Data Ingestion starts.
-    raw_docs = load_all_pdfs(pdf_path)
-    if not raw_docs:
+    if not any(pdf_path.glob("*.pdf")):
         raise FileNotFoundError(f"No PDFs found in {pdf_path}")
-    chunks = chunk_documents(raw_docs)
-    #Storing the PDF's in ChromaDb as embeddings.
-    vectordb = store_embeddings_in_chroma(chunks)
+    #Streaming: pages -> chunks -> batches. Parsing/chunking runs on its own thread and stays
+    #at most 4 batches ahead of embedding, so memory does not grow with the number of pages.
+    chunk_batches = bounded(iter_batches(iter_chunks(iter_all_pdfs(pdf_path)), 64), maxsize=4)
+    #Storing the PDF's in ChromaDb as embeddings, batch by batch.
+    vectordb = store_chunk_batches_in_chroma(chunk_batches)
     # Data Ingestion ends.
 
     #This is retrieving the chunks based on the user prompt
@@ -0,0 +1,115 @@
+"""
+MinHash signatures and LSH bands for near-duplicate chunk detection.
+
+A chunk's signature is the minimum of NUM_PERM hash permutations over its word 3-gram
+shingles; the fraction of equal positions between two signatures estimates the Jaccard
+similarity of their shingle sets. Signatures are cut into BANDS bands of ROWS values and each
+band is hashed: chunks sharing any band hash are near-duplicate candidates (16 x 4 finds
+~99.9% of pairs at Jaccard 0.8), which are then confirmed on the full signature.
+
+NUM_PERM, BANDS, ROWS and the seed are part of the stored data (chunks.minhash,
+chunks.minhash_bands), changing them requires re-ingesting. This module must stay importable
+without settings, the local RAG scripts use it.
+"""
+from typing import Dict, List, Tuple
+import hashlib
+import re
+
+import numpy as np
+
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+DEFAULT_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+")
+
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, (1 << 32) - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, (1 << 32) - 1, size=NUM_PERM, dtype=np.uint64)
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    words = _WORD.findall(text.lower())
+    if len(words) >= SHINGLE_WORDS:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    else:
+        shingles = {" ".join(words)}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """
+    MinHash signature of a text
+
+    :param text: Chunk text
+    :return: NUM_PERM uint32 values
+    """
+    hashes = _shingle_hashes(text)
+    # (a * x + b) mod p per permutation, overflow wraps the same way on every run
+    with np.errstate(over="ignore"):
+        permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def signature_bytes(signature: np.ndarray) -> bytes:
+    return signature.astype("<u4").tobytes()
+
+
+def signature_from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<u4")
+
+
+def lsh_bands(signature: np.ndarray) -> List[int]:
+    """
+    Hashes each band of a signature to a signed 64-bit value (postgres bigint)
+
+    :param signature: MinHash signature
+    :return: BANDS band hashes
+    """
+    data = signature.astype("<u4").tobytes()
+    width = ROWS * 4
+    return [
+        int.from_bytes(
+            hashlib.blake2b(bytes([band]) + data[band * width:(band + 1) * width], digest_size=8).digest(),
+            "little", signed=True,
+        )
+        for band in range(BANDS)
+    ]
+
+
+def estimated_jaccard(first: np.ndarray, second: np.ndarray) -> float:
+    # count_nonzero over mean: this runs once per candidate pair, and mean's overhead is ~8x
+    return np.count_nonzero(first == second) / len(first)
+
+
+class NearDuplicateIndex:
+    """
+    In-memory LSH index of cluster keys, for matching chunks against each other
+    """
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._bands: Dict[int, List[Tuple[str, np.ndarray]]] = {}
+
+    def add(self, key: str, signature: np.ndarray, bands: List[int]) -> None:
+        for band in bands:
+            self._bands.setdefault(band, []).append((key, signature))
+
+    def find(self, signature: np.ndarray, bands: List[int]) -> str | None:
+        """
+        :return: Cluster key of the first indexed signature sharing a band with this one and
+                 similar above the threshold, or None
+        """
+        for band in bands:
+            for key, other in self._bands.get(band, ()):
+                if estimated_jaccard(signature, other) >= self.threshold:
+                    return key
+        return None
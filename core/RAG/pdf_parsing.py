@@ -0,0 +1,135 @@
+"""
+PDF parsing helpers, sequential and process-parallel.
+
+Parsing is CPU bound, so the parallel path spreads work units across a ProcessPoolExecutor.
+A work unit is a page range of one file: small files are a single unit, very large files are
+split so one 500-page PDF doesn't keep a single core busy while the others sit idle.
+
+This module must stay importable without settings or API keys, worker processes import it.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Tuple
+import logging
+
+import pymupdf
+from langchain_core.documents import Document
+
+
+logger = logging.getLogger(__name__)
+
+PAGES_PER_UNIT = 50
+
+
+def _page_metadata(pdf: pymupdf.Document, path: str, page_number: int) -> dict:
+    # same keys PyMuPDFLoader produces, so both load paths are interchangeable
+    metadata = {
+        "source": path,
+        "file_path": path,
+        "page": page_number,
+        "total_pages": pdf.page_count,
+    }
+    metadata.update({
+        key: value for key, value in (pdf.metadata or {}).items()
+        if isinstance(value, (str, int))
+    })
+    return metadata
+
+
+def iter_pdf(data: bytes | memoryview, source: str) -> Iterator[Document]:
+    """
+    Lazily parses a PDF held in memory, one page Document at a time
+
+    :param data: Raw PDF bytes, or a memoryview such as a memory-mapped file
+    :param source: Value stored in the "source" metadata of every page (the R2 key for uploads)
+
+    :return: Generator of page Documents in page order
+    """
+    with pymupdf.open(stream=data, filetype="pdf") as pdf:
+        for page in pdf:
+            yield Document(
+                page_content=page.get_text(),
+                metadata={"source": source, "page": page.number, "total_pages": pdf.page_count},
+            )
+
+
+def parse_pdf(data: bytes, source: str) -> List[Document]:
+    """
+    Parses a PDF held in memory into one Document per page
+
+    :param data: Raw PDF bytes
+    :param source: Value stored in the "source" metadata of every page (the R2 key for uploads)
+
+    :return: List of page Documents in page order
+    """
+    return list(iter_pdf(data, source))
+
+
+def load_pdf_pages(path: str, start: int, end: int) -> List[Tuple[str, dict]]:
+    """
+    Extracts pages [start, end) of a PDF file. Runs inside worker processes, so it returns
+    plain (text, metadata) tuples which are cheaper to pickle than Document objects.
+
+    :param path: Path of the PDF file
+    :param start: First page (0-based, inclusive)
+    :param end: Last page (exclusive)
+
+    :return: List of (page_text, metadata) tuples in page order
+    """
+    pages = []
+    with pymupdf.open(path) as pdf:
+        for page_number in range(start, min(end, pdf.page_count)):
+            page = pdf[page_number]
+            pages.append((page.get_text(), _page_metadata(pdf, path, page_number)))
+    return pages
+
+
+def _load_pdf_pages_unit(unit: Tuple[str, int, int]) -> List[Tuple[str, dict]]:
+    return load_pdf_pages(*unit)
+
+
+def plan_work_units(paths: List[Path], pages_per_unit: int = PAGES_PER_UNIT) -> List[Tuple[str, int, int]]:
+    """
+    Splits files into (path, start_page, end_page) work units, in file then page order
+
+    :param paths: PDF files, in the order their pages should be returned
+    :param pages_per_unit: Files with more pages than this are split into several units
+
+    :return: List of work units
+    """
+    units = []
+    for path in paths:
+        with pymupdf.open(str(path)) as pdf:
+            page_count = pdf.page_count
+        for start in range(0, max(page_count, 1), pages_per_unit):
+            units.append((str(path), start, start + pages_per_unit))
+    return units
+
+
+def load_pdfs_parallel(
+        paths: List[Path],
+        max_workers: int | None = None,
+        pages_per_unit: int = PAGES_PER_UNIT,
+) -> List[Document]:
+    """
+    Parses PDFs across a process pool. Pages come back in the same order as parsing the
+    files one after another (file order, then page order).
+
+    :param paths: PDF files to parse
+    :param max_workers: Number of worker processes, defaults to the number of CPUs
+    :param pages_per_unit: Page range size of a single work unit
+
+    :return: List of page Documents
+    """
+    units = plan_work_units(paths, pages_per_unit)
+    logger.info(f"Parsing {len(paths)} PDFs as {len(units)} work units")
+
+    docs = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # map() yields results in submission order, which keeps the sequential ordering
+        for pages in executor.map(_load_pdf_pages_unit, units):
+            docs.extend(
+                Document(page_content=text, metadata=metadata)
+                for text, metadata in pages
+            )
+    return docs
@@ -8,10 +8,15 @@ Values:
     "dev"          → DevRAG          (Aryan's personal dev implementation)
     "production"   → ProductionRAG   (Production-ready implementation owned by Renee)
 """
+import functools
+
 from core.RAG.rag_interface import RAGInterface
 from config.settings import settings
 
 
+# one engine per process: its http clients keep their connection pools across requests,
+# instead of a new client (and TLS handshakes) per chat message
+@functools.lru_cache(maxsize=None)
 def get_rag_engine() -> RAGInterface:
     impl = settings.RAG_IMPLEMENTATION.lower()
 
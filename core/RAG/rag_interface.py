@@ -3,6 +3,8 @@ Abstract interface for RAG implementations.
 All RAG implementations must inherit from this class.
 """
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, Iterator
+import asyncio
 
 
 class RAGInterface(ABC):
@@ -17,3 +19,38 @@ class RAGInterface(ABC):
         :return: The generated response string
         """
         pass
+
+    def stream_response(self, user_id: int, query: str) -> Iterator[str]:
+        """
+        Like get_response, but yields the response in pieces as the LLM produces them.
+        Closing the generator early (the client went away) must stop the generation.
+        Implementations without streaming yield the whole response at once.
+
+        :param user_id: The ID of the user making the query (used to scope document retrieval)
+        :param query: The user's question or prompt
+        :return: Generator of response text pieces
+        """
+        yield self.get_response(user_id, query)
+
+    async def get_response_async(self, user_id: int, query: str) -> str:
+        """
+        Async get_response, for the chat routes: an await on the LLM holds no thread, so one
+        worker serves many concurrent chats. Implementations without an async client run
+        get_response in a worker thread.
+
+        :param user_id: The ID of the user making the query (used to scope document retrieval)
+        :param query: The user's question or prompt
+        :return: The generated response string
+        """
+        return await asyncio.to_thread(self.get_response, user_id, query)
+
+    async def stream_response_async(self, user_id: int, query: str) -> AsyncIterator[str]:
+        """
+        Async stream_response. Closing the generator early (aclose, or cancelling the task
+        iterating it) must stop the generation.
+
+        :param user_id: The ID of the user making the query (used to scope document retrieval)
+        :param query: The user's question or prompt
+        :return: Async generator of response text pieces
+        """
+        yield await self.get_response_async(user_id, query)
@@ -0,0 +1,382 @@
+"""
+In-process vector index: one memory-mapped shard per user, searched with NumPy.
+
+For small and medium users a brute-force scan of their own vectors is faster than a round trip
+to postgres. Each user's shard is a directory of three append-only files:
+
+    vectors.bin   unit-normalized embeddings, float16 (or float32), row-major
+    rows.bin      one fixed-size record per vector: chunk id, document id, page, position,
+                  content key (for deduplication), text offset/length and a deleted flag
+    texts.bin     chunk texts, utf-8, concatenated
+
+`user_<id>` is a symlink to the current generation of the shard (`user_<id>.g<n>`).
+Re-ingesting a document marks its old rows deleted and appends the new ones; once a shard is
+mostly deleted rows it is compacted into a new generation and the symlink is swapped
+atomically, so readers never see a half-written shard. Writers (the ingestion worker) take a
+per-user flock; readers (the API) take no lock and remap when a shard grows or is swapped.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from config.settings import settings
+from core.entities.chunk_entity import ChunkVector, RetrievedChunk
+
+
+logger = logging.getLogger(__name__)
+
+ROW_DTYPE = np.dtype([
+    ("chunk_id", "<i8"),
+    ("document_id", "<i8"),
+    ("page_number", "<i4"),
+    ("chunk_index", "<i4"),
+    ("content_key", "<i8"),
+    ("text_offset", "<i8"),
+    ("text_length", "<i4"),
+    ("deleted", "u1"),
+], align=True)
+
+# rows are scored in blocks, so a float16 shard is never upcast to float32 all at once
+_SCORE_BLOCK_ROWS = 4096
+# row records are written after the texts and vectors of every this many rows
+_APPEND_BATCH_ROWS = 1024
+# compact once this fraction of a shard's rows are deleted
+_COMPACT_DELETED_FRACTION = 0.3
+
+
+def _content_key(chunk: ChunkVector) -> int:
+    # near-duplicate cluster, else the exact text, same as the pgvector search
+    digest = chunk.near_duplicate_key or chunk.content_hash or hashlib.sha256(chunk.content.encode("utf-8")).hexdigest()
+    return int(digest[:16], 16) - (1 << 63)
+
+
+def _content_key_hex(key: int) -> str:
+    # back to the digest's first 16 hex digits
+    return f"{key + (1 << 63):016x}"
+
+
+class _Shard:
+    # a reader's view of one generation of a user's shard
+    def __init__(self, path: Path, dimensions: int, dtype: np.dtype):
+        self.path = path
+        self.dimensions = dimensions
+        self.dtype = dtype
+        self.rows = 0
+        self.vectors: np.ndarray | None = None
+        self.records: np.ndarray | None = None
+        self._texts = os.open(path / "texts.bin", os.O_RDONLY)
+        self.refresh()
+
+    def refresh(self) -> None:
+        # picks up rows appended since the last search
+        row_bytes = self.dimensions * self.dtype.itemsize
+        texts_size = os.path.getsize(self.path / "texts.bin")
+        rows = min(
+            os.path.getsize(self.path / "rows.bin") // ROW_DTYPE.itemsize,
+            os.path.getsize(self.path / "vectors.bin") // row_bytes,
+        )
+        if rows <= self.rows:
+            return
+        records = np.memmap(self.path / "rows.bin", dtype=ROW_DTYPE, mode="r", shape=(rows,))
+        # texts are appended in row order, so only the newest rows can still miss their text
+        ends = records["text_offset"][self.rows:] + records["text_length"][self.rows:]
+        rows = self.rows + int(np.searchsorted(ends, texts_size, side="right"))
+        if rows == self.rows:
+            return
+        self.rows = rows
+        self.vectors = np.memmap(self.path / "vectors.bin", dtype=self.dtype, mode="r", shape=(rows, self.dimensions))
+        self.records = records[:rows]
+
+    def text(self, row: int) -> str:
+        record = self.records[row]
+        return os.pread(self._texts, int(record["text_length"]), int(record["text_offset"])).decode("utf-8")
+
+    def close(self) -> None:
+        os.close(self._texts)
+        self.vectors = self.records = None
+
+
+class NumpyVectorIndex:
+
+    def __init__(
+            self,
+            directory: str = settings.NUMPY_INDEX_DIR,
+            dimensions: int = settings.EMBEDDING_DIMENSIONS,
+            dtype: str = settings.NUMPY_INDEX_DTYPE,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dimensions = dimensions
+        self.dtype = np.dtype(dtype)
+
+        self._shards: Dict[int, _Shard] = {}
+        self._shards_lock = threading.Lock()
+
+    # ---------- Search ----------
+    def has_shard(self, user_id: int) -> bool:
+        return self._link(user_id).exists()
+
+    def search(
+            self, user_id: int, query_embedding: List[float], top_k: int, overfetch: int = 1
+    ) -> List[RetrievedChunk]:
+        """
+        Brute-force cosine top-k over the user's shard, duplicates of the same text dropped
+
+        :param user_id: The ID of the user whose shard is searched
+        :param query_embedding: Embedding of the query
+        :param top_k: Number of chunks to return
+        :param overfetch: Candidates taken per returned chunk, so duplicates can be dropped
+
+        :return: List of RetrievedChunk, most similar first
+        """
+        shard = self._shard(user_id)
+        if shard is None or shard.rows == 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+
+        # vectors are unit length, so the dot product is the cosine similarity
+        scores = np.empty(shard.rows, dtype=np.float32)
+        for start in range(0, shard.rows, _SCORE_BLOCK_ROWS):
+            block = shard.vectors[start:start + _SCORE_BLOCK_ROWS]
+            np.matmul(block.astype(np.float32, copy=False), query, out=scores[start:start + len(block)])
+        scores[shard.records["deleted"] != 0] = -np.inf
+
+        candidates = min(top_k * overfetch, shard.rows)
+        if candidates <= 0:
+            return []
+        top = np.argpartition(scores, shard.rows - candidates)[shard.rows - candidates:]
+        top = top[np.argsort(scores[top])[::-1]]
+
+        results, seen = [], set()
+        for row in top:
+            if scores[row] == -np.inf or len(results) == top_k:
+                break
+            record = shard.records[row]
+            if record["content_key"] in seen:
+                continue
+            seen.add(record["content_key"])
+            results.append(RetrievedChunk(
+                id=int(record["chunk_id"]),
+                document_id=int(record["document_id"]),
+                content=shard.text(row),
+                score=float(scores[row]),
+                page_number=None if record["page_number"] < 0 else int(record["page_number"]),
+                chunk_index=None if record["chunk_index"] < 0 else int(record["chunk_index"]),
+                content_key=_content_key_hex(int(record["content_key"])),
+            ))
+        return results
+
+    # ---------- Writes (ingestion worker) ----------
+    def sync_document(self, user_id: int, document_id: int, chunks: Iterable[ChunkVector]) -> int:
+        """
+        Replaces a document's rows in the user's shard: old rows are marked deleted and the
+        current chunks appended. Compacts the shard once it is mostly deleted rows.
+
+        :return: Number of rows appended
+        """
+        with self._write_lock(user_id):
+            path = self._current(user_id)
+            deleted = self._mark_deleted(path, document_id)
+            appended = self._append(path, chunks)
+            if self._deleted_fraction(path) > _COMPACT_DELETED_FRACTION:
+                self._compact(user_id, path)
+        logger.info(f"Vector index for user {user_id}: document {document_id} replaced {deleted} rows with {appended}")
+        return appended
+
+    def remove_document(self, user_id: int, document_id: int) -> int:
+        if not self.has_shard(user_id):
+            return 0
+        with self._write_lock(user_id):
+            path = self._current(user_id)
+            deleted = self._mark_deleted(path, document_id)
+            if self._deleted_fraction(path) > _COMPACT_DELETED_FRACTION:
+                self._compact(user_id, path)
+        return deleted
+
+    def rebuild_user(self, user_id: int, chunks: Iterable[ChunkVector]) -> int:
+        """
+        Writes a fresh shard for the user from all their chunks and swaps it in
+
+        :return: Number of rows written
+        """
+        with self._write_lock(user_id):
+            path = self._new_generation(user_id)
+            written = self._append(path, chunks)
+            self._swap(user_id, path)
+        logger.info(f"Vector index for user {user_id} rebuilt with {written} rows")
+        return written
+
+    # ---------- Internals ----------
+    def _link(self, user_id: int) -> Path:
+        return self.directory / f"user_{user_id}"
+
+    def _shard(self, user_id: int) -> _Shard | None:
+        link = self._link(user_id)
+        try:
+            target = link.resolve(strict=True)
+        except FileNotFoundError:
+            return None
+
+        with self._shards_lock:
+            shard = self._shards.get(user_id)
+            if shard is not None and shard.path != target:
+                # compacted or rebuilt since we opened it
+                shard.close()
+                shard = None
+            if shard is None:
+                shard = self._shards[user_id] = _Shard(target, self.dimensions, self.dtype)
+            else:
+                shard.refresh()
+            return shard
+
+    @contextmanager
+    def _write_lock(self, user_id: int) -> Iterator[None]:
+        with open(self.directory / f"user_{user_id}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _current(self, user_id: int) -> Path:
+        link = self._link(user_id)
+        if link.exists():
+            return link.resolve()
+        path = self._new_generation(user_id)
+        self._swap(user_id, path)
+        return path
+
+    def _new_generation(self, user_id: int) -> Path:
+        generation = 1
+        for existing in self.directory.glob(f"user_{user_id}.g*"):
+            suffix = existing.name.rsplit(".g", 1)[1]
+            if suffix.isdigit():
+                generation = max(generation, int(suffix) + 1)
+        path = self.directory / f"user_{user_id}.g{generation}"
+        path.mkdir()
+        for name in ("vectors.bin", "rows.bin", "texts.bin"):
+            (path / name).touch()
+        return path
+
+    def _swap(self, user_id: int, path: Path) -> None:
+        link = self._link(user_id)
+        previous = link.resolve() if link.exists() else None
+        temp_link = self.directory / f".user_{user_id}.link"
+        if temp_link.is_symlink():
+            temp_link.unlink()
+        temp_link.symlink_to(path.name)
+        os.replace(temp_link, link)
+        if previous is not None and previous != path:
+            # readers that still map the old files keep them until they notice the swap
+            shutil.rmtree(previous, ignore_errors=True)
+
+    def _append(self, path: Path, chunks: Iterable[ChunkVector]) -> int:
+        appended = 0
+        with open(path / "texts.bin", "ab") as texts, \
+                open(path / "vectors.bin", "ab") as vectors, \
+                open(path / "rows.bin", "ab") as rows:
+            text_offset = texts.tell()
+            batch: List[np.ndarray] = []
+
+            def write_records() -> None:
+                # a buffer spills whenever it fills, so the batch's texts and vectors are flushed
+                # before its row records are written: readers only see rows whose data is there
+                texts.flush()
+                vectors.flush()
+                rows.write(np.concatenate(batch).tobytes())
+                rows.flush()
+                batch.clear()
+
+            for chunk in chunks:
+                text = chunk.content.encode("utf-8")
+                vector = np.asarray(chunk.embedding, dtype=np.float32)
+                vector /= np.linalg.norm(vector) or 1.0
+
+                record = np.zeros(1, dtype=ROW_DTYPE)
+                record["chunk_id"] = chunk.id
+                record["document_id"] = chunk.document_id
+                record["page_number"] = -1 if chunk.page_number is None else chunk.page_number
+                record["chunk_index"] = -1 if chunk.chunk_index is None else chunk.chunk_index
+                record["content_key"] = _content_key(chunk)
+                record["text_offset"] = text_offset
+                record["text_length"] = len(text)
+
+                texts.write(text)
+                vectors.write(vector.astype(self.dtype).tobytes())
+                batch.append(record)
+                text_offset += len(text)
+                appended += 1
+                if len(batch) == _APPEND_BATCH_ROWS:
+                    write_records()
+
+            if batch:
+                write_records()
+        return appended
+
+    def _mark_deleted(self, path: Path, document_id: int) -> int:
+        rows = os.path.getsize(path / "rows.bin") // ROW_DTYPE.itemsize
+        if rows == 0:
+            return 0
+        records = np.memmap(path / "rows.bin", dtype=ROW_DTYPE, mode="r+", shape=(rows,))
+        matches = (records["document_id"] == document_id) & (records["deleted"] == 0)
+        records["deleted"][matches] = 1
+        records.flush()
+        return int(matches.sum())
+
+    def _deleted_fraction(self, path: Path) -> float:
+        rows = os.path.getsize(path / "rows.bin") // ROW_DTYPE.itemsize
+        if rows == 0:
+            return 0.0
+        records = np.memmap(path / "rows.bin", dtype=ROW_DTYPE, mode="r", shape=(rows,))
+        return float((records["deleted"] != 0).mean())
+
+    def _compact(self, user_id: int, path: Path) -> None:
+        rows = os.path.getsize(path / "rows.bin") // ROW_DTYPE.itemsize
+        records = np.memmap(path / "rows.bin", dtype=ROW_DTYPE, mode="r", shape=(rows,))
+        vectors = np.memmap(path / "vectors.bin", dtype=self.dtype, mode="r", shape=(rows, self.dimensions))
+
+        def live_chunks() -> Iterator[ChunkVector]:
+            with open(path / "texts.bin", "rb") as texts:
+                for row in np.flatnonzero(records["deleted"] == 0):
+                    record = records[row]
+                    texts.seek(int(record["text_offset"]))
+                    chunk = ChunkVector(
+                        id=int(record["chunk_id"]),
+                        document_id=int(record["document_id"]),
+                        content=texts.read(int(record["text_length"])).decode("utf-8"),
+                        content_hash=None,
+                        # carries the stored key over as is
+                        near_duplicate_key=_content_key_hex(int(record["content_key"])),
+                        page_number=None if record["page_number"] < 0 else int(record["page_number"]),
+                        chunk_index=None if record["chunk_index"] < 0 else int(record["chunk_index"]),
+                        embedding=vectors[row].astype(np.float32),
+                    )
+                    yield chunk
+
+        compacted = self._new_generation(user_id)
+        written = self._append(compacted, live_chunks())
+        self._swap(user_id, compacted)
+        logger.info(f"Vector index for user {user_id} compacted from {rows} to {written} rows")
+
+
+_index: NumpyVectorIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_numpy_index() -> NumpyVectorIndex:
+    # one per process, the shards on disk are shared between processes
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NumpyVectorIndex()
+        return _index
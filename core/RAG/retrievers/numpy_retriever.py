@@ -0,0 +1,48 @@
+"""
+NumPy retriever: embeds the query, then scans the user's memory-mapped shard in process
+(see numpy_index.NumpyVectorIndex). A user's shard is built from postgres on their first search
+and kept up to date by the ingestion worker.
+"""
+from typing import List
+import logging
+import time
+
+from config.settings import settings
+from core.entities.chunk_entity import RetrievedChunk
+from core.RAG.embeddings.query_cache import get_query_embedder
+from core.RAG.retrievers.numpy_index import get_numpy_index
+from core.RAG.retrievers.retriever_interface import RetrieverInterface
+from database.database import SessionLocal
+from database.db_access import chunk_access
+
+
+logger = logging.getLogger(__name__)
+
+
+class NumpyRetriever(RetrieverInterface):
+
+    def __init__(self, overfetch: int = settings.RETRIEVAL_OVERFETCH):
+        self.overfetch = overfetch
+        self.index = get_numpy_index()
+
+    def _build_shard(self, user_id: int) -> None:
+        db = SessionLocal()
+        try:
+            self.index.rebuild_user(user_id, chunk_access.iter_chunk_vectors(db, user_id=user_id))
+        finally:
+            db.close()
+
+    def retrieve(self, user_id: int, query: str, top_k: int) -> List[RetrievedChunk]:
+        started = time.monotonic()
+        if not self.index.has_shard(user_id):
+            self._build_shard(user_id)
+        query_embedding = get_query_embedder().embed_query(query)
+        embedded = time.monotonic()
+
+        chunks = self.index.search(user_id, query_embedding, top_k, self.overfetch)
+
+        logger.info(
+            f"Retrieved {len(chunks)} chunks for user {user_id} "
+            f"(embed {(embedded - started) * 1000:.0f} ms, search {(time.monotonic() - embedded) * 1000:.0f} ms)"
+        )
+        return chunks
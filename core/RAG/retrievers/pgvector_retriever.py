@@ -0,0 +1,49 @@
+"""
+pgvector retriever: embeds the query, then runs one similarity search query in postgres
+(see chunk_access.search_user_chunks).
+"""
+from typing import List
+import logging
+import time
+
+from config.settings import settings
+from core.entities.chunk_entity import RetrievedChunk
+from core.RAG.embeddings.query_cache import get_query_embedder
+from core.RAG.retrievers.retriever_interface import RetrieverInterface
+from database.database import SessionLocal
+from database.db_access import chunk_access
+
+
+logger = logging.getLogger(__name__)
+
+
+class PgVectorRetriever(RetrieverInterface):
+
+    def __init__(
+            self,
+            overfetch: int = settings.RETRIEVAL_OVERFETCH,
+            mode: str = settings.VECTOR_SEARCH_MODE,
+            rescore_factor: int = settings.VECTOR_RESCORE_FACTOR,
+    ):
+        self.overfetch = overfetch
+        self.mode = mode
+        self.rescore_factor = rescore_factor
+
+    def retrieve(self, user_id: int, query: str, top_k: int) -> List[RetrievedChunk]:
+        started = time.monotonic()
+        query_embedding = get_query_embedder().embed_query(query)
+        embedded = time.monotonic()
+
+        db = SessionLocal()
+        try:
+            chunks = chunk_access.search_user_chunks(
+                user_id, query_embedding, top_k, self.overfetch, db, self.mode, self.rescore_factor
+            )
+        finally:
+            db.close()
+
+        logger.info(
+            f"Retrieved {len(chunks)} chunks for user {user_id} "
+            f"(embed {(embedded - started) * 1000:.0f} ms, search {(time.monotonic() - embedded) * 1000:.0f} ms)"
+        )
+        return chunks
@@ -0,0 +1,41 @@
+"""
+Reciprocal rank fusion: merges ranked lists whose scores aren't comparable (cosine similarity,
+ts_rank_cd) using only the ranks. A chunk's fused score is the sum of 1 / (k + rank) over the
+lists it appears in, so chunks found by both searches come first. Chunks are matched on their
+content_key: each search keeps one chunk per near-duplicate cluster, but not necessarily the
+same one.
+"""
+from dataclasses import replace
+from typing import Dict, List, Sequence
+
+from core.entities.chunk_entity import RetrievedChunk
+
+
+DEFAULT_RRF_K = 60
+
+
+def reciprocal_rank_fusion(
+        rankings: Sequence[List[RetrievedChunk]],
+        top_k: int,
+        k: int = DEFAULT_RRF_K,
+) -> List[RetrievedChunk]:
+    """
+    Fuses ranked lists of chunks
+
+    :param rankings: Lists of RetrievedChunk, each best first
+    :param top_k: Number of chunks to return
+    :param k: Damping constant, higher values flatten the difference between top ranks
+
+    :return: List of RetrievedChunk, best fused score first, score is the fused score
+    """
+    scores: Dict[str, float] = {}
+    chunks: Dict[str, RetrievedChunk] = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, start=1):
+            # the same (or nearly the same) content under another chunk id is one result
+            key = chunk.content_key or chunk.content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            chunks.setdefault(key, chunk)
+
+    fused = sorted(scores, key=scores.__getitem__, reverse=True)[:top_k]
+    return [replace(chunks[key], score=scores[key]) for key in fused]
@@ -0,0 +1,36 @@
+"""
+Retriever factory -> returns the retriever RAG implementations search with.
+Set RETRIEVER_BACKEND (where vectors are searched) and RETRIEVAL_MODE (vector only, or hybrid
+with full text search) in your .env.
+"""
+from config.settings import settings
+from core.RAG.retrievers.retriever_interface import RetrieverInterface
+
+
+def _get_vector_retriever() -> RetrieverInterface:
+    backend = settings.RETRIEVER_BACKEND
+
+    if backend == "pgvector":
+        from core.RAG.retrievers.pgvector_retriever import PgVectorRetriever
+        return PgVectorRetriever()
+
+    elif backend == "numpy":
+        from core.RAG.retrievers.numpy_retriever import NumpyRetriever
+        return NumpyRetriever()
+
+    else:
+        raise ValueError(f"Unknown RETRIEVER_BACKEND: '{backend}'. Must be 'pgvector' or 'numpy'.")
+
+
+def get_retriever() -> RetrieverInterface:
+    mode = settings.RETRIEVAL_MODE
+
+    if mode == "vector":
+        return _get_vector_retriever()
+
+    elif mode == "hybrid":
+        from core.RAG.retrievers.hybrid_retriever import HybridRetriever
+        return HybridRetriever(_get_vector_retriever())
+
+    else:
+        raise ValueError(f"Unknown RETRIEVAL_MODE: '{mode}'. Must be 'vector' or 'hybrid'.")
@@ -0,0 +1,23 @@
+"""
+Abstract interface for retrievers: query text in, the user's most relevant chunks out.
+RAG implementations get one from core/RAG/retrievers/retriever_factory.py.
+"""
+from abc import ABC, abstractmethod
+from typing import List
+
+from core.entities.chunk_entity import RetrievedChunk
+
+
+class RetrieverInterface(ABC):
+
+    @abstractmethod
+    def retrieve(self, user_id: int, query: str, top_k: int) -> List[RetrievedChunk]:
+        """
+        Finds the chunks of the user's documents most relevant to a query.
+
+        :param user_id: The ID of the user, only their documents are searched
+        :param query: The user's question or prompt
+        :param top_k: Number of chunks to return
+        :return: List of RetrievedChunk, most relevant first, without duplicate content
+        """
+        pass
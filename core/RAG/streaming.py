@@ -0,0 +1,87 @@
+"""
+Generator plumbing for the streaming ingestion pipeline.
+
+Each pipeline stage is a plain generator. bounded() moves a stage onto its own thread and
+connects it to the next stage through a queue of fixed size, so a fast producer (parsing)
+can run ahead of a slow consumer (embedding) by at most `maxsize` items. Memory stays
+constant no matter how many pages the document has.
+"""
+from typing import Iterable, Iterator, List, TypeVar
+import queue
+import threading
+
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def iter_batches(items: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    """
+    Groups an iterable into lists of at most batch_size items
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bounded(iterable: Iterable[T], maxsize: int) -> Iterator[T]:
+    """
+    Runs `iterable` on a background thread and yields its items through a bounded queue.
+    Exceptions raised by the producer are re-raised in the consumer. Closing the returned
+    generator early stops the producer and closes the upstream iterable.
+
+    :param iterable: The upstream stage
+    :param maxsize: Maximum number of items buffered between the two stages
+
+    :return: Generator yielding the upstream items in order
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # blocks while the queue is full, but gives up once the consumer went away
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_StageError(e))
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        producer.join()
@@ -0,0 +1,108 @@
+"""
+Chunk entities used between the ingestion pipeline and the db_access layer
+"""
+
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class ChunkCreate:
+    document_id: int
+    user_id: int
+    content: str
+    embedding: List[float]
+    content_hash: str
+    chunk_index: int
+    page_number: int | None = None
+    char_start: int | None = None
+    char_end: int | None = None
+    minhash: bytes | None = None
+    minhash_bands: List[int] | None = None
+    near_duplicate_key: str | None = None
+
+
+@dataclass
+class ChunkKeep:
+    # an already stored chunk whose content did not change, only its position may have
+    id: int
+    chunk_index: int
+    page_number: int | None = None
+    char_start: int | None = None
+    char_end: int | None = None
+
+
+@dataclass
+class ChunkSyncResult:
+    inserted: int
+    kept: int
+    deleted: int
+
+
+@dataclass
+class IngestionReport:
+    document_id: int
+    total_chunks: int
+    embedded: int
+    reused: int
+    deleted: int
+
+    @property
+    def embedding_calls_saved(self) -> int:
+        # every reused chunk is one embedding input we did not pay for
+        return self.reused
+
+
+@dataclass
+class RetrievedChunk:
+    # a search hit, score is the cosine similarity to the query (1 = identical)
+    id: int
+    document_id: int
+    content: str
+    score: float
+    page_number: int | None = None
+    chunk_index: int | None = None
+    # what results are deduplicated on: the near-duplicate cluster, else the text's sha256,
+    # as 16 hex digits (all the numpy index keeps)
+    content_key: str | None = None
+
+
+@dataclass
+class ChunkVector:
+    # a stored chunk with its embedding, as exported to the in-process vector index
+    id: int
+    document_id: int
+    content: str
+    content_hash: str | None
+    page_number: int | None
+    chunk_index: int | None
+    embedding: List[float]
+    near_duplicate_key: str | None = None
+
+
+@dataclass
+class ChunkText:
+    # a stored chunk from before near-duplicate detection, without a MinHash signature
+    id: int
+    user_id: int
+    content: str
+    content_hash: str | None
+
+
+@dataclass
+class ChunkMinHash:
+    # the near-duplicate columns computed for a ChunkText
+    id: int
+    user_id: int
+    minhash: bytes
+    minhash_bands: List[int]
+    near_duplicate_key: str
+
+
+@dataclass
+class NearDuplicateCandidate:
+    # a stored chunk sharing an LSH band with a new one
+    content_hash: str | None
+    near_duplicate_key: str | None
+    minhash: bytes
+    minhash_bands: List[int]
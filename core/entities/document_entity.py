@@ -21,15 +21,19 @@ class DocumentCreate:
     file_name: str
     file_size: int
     content_type: str
+    content_hash: str
 
 
 @dataclass
 class DocumentUpload:
+    # an uploaded file, either staged in R2 by a direct upload (staged_key) or still spooled by
+    # the API, in which case nothing has been sent to R2 yet
     user_id: int
     file_name: str
     file_size: int
     content_type: str
-    file_bytes: bytes
+    content_hash: str
+    staged_key: str | None = None
 
 
 @dataclass
@@ -41,4 +45,7 @@ class DocumentRetrieve:
     content_type: str
     r2_key: str
     created_at: datetime
-    processing_status: ProcessingStatus
\ No newline at end of file
+    processing_status: ProcessingStatus
+    ingestion_attempts: int = 0
+    content_hash: str | None = None
+    claimed_at: datetime | None = None
\ No newline at end of file
@@ -1,7 +1,10 @@
 from sqlalchemy.orm import Session
-from typing import List
+from typing import AsyncIterator, List
+import asyncio
 import logging
+import time
 
+from database.database import SessionLocal
 from database.db_access import chat_access
 from core.entities import chat_entity
 from core.entities.chat_entity import Role
@@ -86,38 +89,91 @@ def get_all_messages(chat_id: int, db: Session) -> List[dict]:
     return message_list
 
 
-# get all messages for a chat
-def post_message_to_chat(chat_id: int, user_id: int, content: str, db: Session) -> tuple[dict, dict]:
+# posts a user message to a chat and the rag engine's response to it
+async def post_message_to_chat(chat_id: int, user_id: int, content: str, db: Session) -> tuple[dict, dict]:
     logger.info("Posting message to chat via the data access layer")
-    new_message: chat_entity.MessageRetrieve = chat_access.post_message_to_chat(
-        chat_id = chat_id,
-        role = Role.USER,
-        content = content,
-        db = db,
+    # the database calls are short and blocking, the rag engine call is awaited without a thread
+    new_message: chat_entity.MessageRetrieve = await asyncio.to_thread(
+        chat_access.post_message_to_chat, chat_id, Role.USER, content, db
     )
 
     # sending message to the rag inference engine via the service layer
     rag_engine = get_rag_engine()
-    rag_response: str = rag_engine.get_response(user_id=user_id, query=content)
+    rag_response: str = await rag_engine.get_response_async(user_id=user_id, query=content)
 
-    assistant_response = chat_access.post_message_to_chat(
-        chat_id = chat_id,
-        role = Role.AI,
-        content = rag_response,
-        db = db,
+    assistant_response = await asyncio.to_thread(
+        chat_access.post_message_to_chat, chat_id, Role.AI, rag_response, db
     )
-    
+
+    return _message_response(new_message), _message_response(assistant_response)
+
+
+def _message_response(message: chat_entity.MessageRetrieve) -> dict:
     return {
-        "id": new_message.id,
-        "chat_id": new_message.chat_id,
-        "role": new_message.role,
-        "content": new_message.content,
-        "created_at": new_message.created_at,
-    }, {
-        "id": assistant_response.id,
-        "chat_id": assistant_response.chat_id,
-        "role": assistant_response.role,
-        "content": assistant_response.content,
-        "created_at": assistant_response.created_at,
+        "id": message.id,
+        "chat_id": message.chat_id,
+        "role": message.role,
+        "content": message.content,
+        "created_at": message.created_at,
     }
 
+
+# saves the user's message of a streamed exchange, before anything is generated
+def post_user_message(chat_id: int, content: str, db: Session) -> dict:
+    logger.info("Posting user message to chat via the data access layer")
+    new_message = chat_access.post_message_to_chat(
+        chat_id = chat_id,
+        role = Role.USER,
+        content = content,
+        db = db,
+    )
+    return _message_response(new_message)
+
+
+def _save_assistant_message(chat_id: int, content: str) -> dict:
+    # own session, called after the request handler (and its session) is done
+    db = SessionLocal()
+    try:
+        return _message_response(chat_access.post_message_to_chat(
+            chat_id = chat_id,
+            role = Role.AI,
+            content = content,
+            db = db,
+        ))
+    finally:
+        db.close()
+
+
+# streams the rag engine's response to a posted user message
+async def stream_assistant_response(chat_id: int, user_id: int, content: str) -> AsyncIterator[str | dict]:
+    """
+    Streams the response to a user message already saved with post_user_message. Yields the
+    response text as the LLM produces it, then the saved assistant message as a dict. The
+    assistant message is only saved once the response is complete: closing the generator
+    early (the client disconnected) closes the engine's stream, which stops the generation.
+
+    :param chat_id: The ID of the chat the exchange belongs to
+    :param user_id: The ID of the user (scopes document retrieval)
+    :param content: The user's message
+
+    :return: Async generator of response text pieces, then the assistant message dict
+    """
+    started = time.monotonic()
+    first_piece_at = None
+    parts = []
+    pieces = get_rag_engine().stream_response_async(user_id=user_id, query=content)
+    try:
+        async for piece in pieces:
+            if first_piece_at is None:
+                first_piece_at = time.monotonic()
+                logger.info(f"Chat {chat_id}: time to first token {(first_piece_at - started) * 1000:.0f} ms")
+            parts.append(piece)
+            yield piece
+    except (GeneratorExit, asyncio.CancelledError):
+        logger.info(f"Chat {chat_id}: stream closed after {len(parts)} pieces, response not saved")
+        raise
+    finally:
+        await pieces.aclose()
+
+    logger.info(f"Chat {chat_id}: response streamed in {(time.monotonic() - started) * 1000:.0f} ms")
+    yield await asyncio.to_thread(_save_assistant_message, chat_id, "".join(parts))
@@ -1,9 +1,12 @@
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import BinaryIO, List
 import logging
 
-from database.db_access import document_access
+from database.db_access import document_access, user_access
 from core.entities import document_entity
+from core.services.errors.document_errors import DuplicateDocumentException
+from core.services.upload_services import delete_staged_upload, upload_file
 
 from config.settings import settings
 from config.r2_client import s3_client
@@ -13,45 +16,199 @@ from config.r2_client import s3_client
 logger = logging.getLogger(__name__)
 
 
-# upload the document to R2 bucket
-def upload_document(document: document_entity.DocumentUpload, db: Session) -> dict:
-    """
-    Uploads a document to R2 storage and saves the metadata in the database.
+def _document_response(document: document_entity.DocumentRetrieve, is_duplicate: bool) -> dict:
+    return {
+        "id": document.id,
+        "user_id": document.user_id,
+        "file_name": document.file_name,
+        "file_size": document.file_size,
+        "content_type": document.content_type,
+        "processing_status": document.processing_status.value,
+        "is_duplicate": is_duplicate,
+    }
 
-    :param document: DocumentUpload entity containing the document details
-    :param db: Database session
 
-    :return: dict representing the uploaded document's metadata
-    """
+def _drop_staged_upload(document: document_entity.DocumentUpload) -> None:
+    # a spooled upload was never sent, there is nothing to delete
+    if document.staged_key is not None:
+        delete_staged_upload(document.staged_key)
 
-    # using the s3 client to upload the file to R2
-    logger.info(f"Uploading document to R2: {document.file_name} for user {document.user_id}")
 
-    r2_key = f"{document.user_id}/{document.file_name}"
+def _store_blob(document: document_entity.DocumentUpload, file: BinaryIO | None, db: Session) -> str:
+    # same bytes uploaded by another user, share the stored blob
+    shared = document_access.find_document_with_content_hash(document.content_hash, db)
+    if shared is not None:
+        logger.info(f"Reusing stored blob {shared.r2_key} for {document.file_name}")
+        _drop_staged_upload(document)
+        return shared.r2_key
+
+    logger.info(f"Storing document in R2: {document.file_name} for user {document.user_id}")
+
+    # content addressed, so the blob can be shared by every document with the same bytes
+    r2_key = f"blobs/{document.content_hash}"
+    if file is not None:
+        # a spooled upload goes straight to its final key
+        try:
+            upload_file(file, r2_key, document.content_type, document.content_hash)
+        except Exception as e:
+            logger.error(f"Error storing document in R2: {e}")
+            raise Exception("Failed to upload document to R2")
+        return r2_key
+
+    # moving the staged upload to its final key, the copy happens inside R2
     try:
-        s3_client.put_object(
+        s3_client.copy_object(
             Bucket=settings.BUCKET_NAME,
             Key=r2_key,
-            Body=document.file_bytes,
+            CopySource={"Bucket": settings.BUCKET_NAME, "Key": document.staged_key},
             ContentType=document.content_type,
+            MetadataDirective="REPLACE",
         )
     except Exception as e:
-        logger.error(f"Error uploading document to R2: {e}")
+        logger.error(f"Error storing document in R2: {e}")
+        delete_staged_upload(document.staged_key)
         raise Exception("Failed to upload document to R2")
-    
+    delete_staged_upload(document.staged_key)
+    return r2_key
+
+
+def _delete_blob_if_unreferenced(r2_key: str, db: Session) -> None:
+    if document_access.count_documents_with_r2_key(r2_key, db) > 0:
+        return
+    logger.info(f"Deleting unreferenced blob {r2_key} from R2")
+    try:
+        s3_client.delete_object(Bucket=settings.BUCKET_NAME, Key=r2_key)
+    except Exception as e:
+        # an orphaned blob only costs storage, don't fail the request over it
+        logger.error(f"Error deleting blob {r2_key} from R2: {e}")
+
+
+# get a single document by ID
+def get_document_by_id(document_id: int, db: Session) -> dict | None:
+    logger.info("Fetching document by ID from the data access layer")
+    document = document_access.get_document_by_id(document_id, db)
+    if document is None:
+        return None
+
+    return _document_response(document, is_duplicate=False)
+
+
+# upload the document to R2 bucket
+def upload_document(document: document_entity.DocumentUpload, db: Session, file: BinaryIO | None = None) -> dict:
+    """
+    Stores an upload in R2 and saves the metadata in the database.
+    Files are deduplicated by the sha256 of their bytes: re-uploading a file the user already
+    has returns the existing document, and a file another user already uploaded reuses the
+    stored blob (and, during ingestion, its chunks and embeddings). A spooled upload is only
+    sent to R2 when neither matches.
+
+    :param document: DocumentUpload entity of the upload
+    :param db: Database session
+    :param file: The spooled file, for an upload that isn't staged in R2
+
+    :return: dict representing the uploaded document's metadata
+    """
+    content_hash = document.content_hash
+
+    # same bytes already uploaded by this user, nothing to do
+    existing = document_access.get_document_by_content_hash(document.user_id, content_hash, db)
+    if existing is not None:
+        logger.info(f"Duplicate upload of document {existing.id} by user {document.user_id}, dropping the upload")
+        _drop_staged_upload(document)
+        return _document_response(existing, is_duplicate=True)
+
+    r2_key = _store_blob(document, file, db)
+
     # now saving doc metadata in the database
     document_meta_data = document_entity.DocumentCreate(
         user_id=document.user_id,
         file_name=document.file_name,
         file_size=document.file_size,
         content_type=document.content_type,
-        r2_key=r2_key
+        r2_key=r2_key,
+        content_hash=content_hash,
     )
-    result = document_access.save_document_metadata(document_meta_data, db)
+    try:
+        result = document_access.save_document_metadata(document_meta_data, db)
+    except IntegrityError:
+        # a concurrent upload of the same file won the race on the unique index
+        db.rollback()
+        existing = document_access.get_document_by_content_hash(document.user_id, content_hash, db)
+        return _document_response(existing, is_duplicate=True)
 
-    return {
-        "user_id": result.user_id,
-        "file_name": result.file_name,
-        "file_size": result.file_size,
-        "content_type": result.content_type,
-    }
+    user_access.bump_document_set_version(document.user_id, db)
+    return _document_response(result, is_duplicate=False)
+
+
+# replace the file behind an existing document
+def replace_document(
+        document_id: int,
+        document: document_entity.DocumentUpload,
+        db: Session,
+        file: BinaryIO | None = None,
+) -> dict:
+    """
+    Replaces the file of an existing document and queues it for re-ingestion. The stored
+    chunks stay in place: the ingestion worker diffs them against the new file by content
+    hash and only embeds chunks that are new or changed.
+
+    :param document_id: The ID of the document being replaced (ownership checked by the caller)
+    :param document: DocumentUpload entity of the new file
+    :param db: Database session
+    :param file: The spooled file, for an upload that isn't staged in R2
+
+    :return: dict representing the updated document's metadata
+    """
+    content_hash = document.content_hash
+    current = document_access.get_document_by_id(document_id, db)
+
+    if current.content_hash == content_hash:
+        logger.info(f"Replacement of document {document_id} has identical content, nothing to do")
+        _drop_staged_upload(document)
+        return _document_response(current, is_duplicate=True)
+
+    existing = document_access.get_document_by_content_hash(document.user_id, content_hash, db)
+    if existing is not None:
+        logger.info(f"Replacement of document {document_id} duplicates document {existing.id}")
+        _drop_staged_upload(document)
+        raise DuplicateDocumentException()
+
+    r2_key = _store_blob(document, file, db)
+    result = document_access.replace_document_file(
+        document_id,
+        document_entity.DocumentCreate(
+            user_id=document.user_id,
+            file_name=document.file_name,
+            file_size=document.file_size,
+            content_type=document.content_type,
+            r2_key=r2_key,
+            content_hash=content_hash,
+        ),
+        db,
+    )
+    if current.r2_key != r2_key:
+        _delete_blob_if_unreferenced(current.r2_key, db)
+
+    user_access.bump_document_set_version(document.user_id, db)
+    return _document_response(result, is_duplicate=False)
+
+
+# delete a document, its chunks and (if no other document uses it) its file
+def delete_document(document_id: int, db: Session) -> None:
+    """
+    Deletes a document with its chunks, and its blob in R2 once no document references it.
+    Bumps the user's document set version, so answers cached over the old set are dropped.
+
+    :param document_id: The ID of the document being deleted (ownership checked by the caller)
+    :param db: Database session
+    """
+    document = document_access.get_document_by_id(document_id, db)
+
+    document_access.delete_document(document_id, db)
+    _delete_blob_if_unreferenced(document.r2_key, db)
+
+    if settings.RETRIEVER_BACKEND == "numpy":
+        from core.RAG.retrievers.numpy_index import get_numpy_index
+        get_numpy_index().remove_document(document.user_id, document_id)
+    # after the index no longer returns the document, so no answer over it is cached under the new version
+    user_access.bump_document_set_version(document.user_id, db)
@@ -0,0 +1,40 @@
+# contains custom exceptions for the document service layer
+
+
+class DuplicateDocumentException(Exception):
+    """
+    Exception raised when a file would duplicate another document the user already has
+    """
+    def __init__(self, message: str = "Another document with the same content already exists"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class FileTooLargeException(Exception):
+    """
+    Exception raised when an upload goes over the size limit while it is being streamed
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.message = f"File size exceeds {max_bytes // (1024 * 1024)} MB limit"
+        super().__init__(self.message)
+
+
+class InvalidUploadException(Exception):
+    """
+    Exception raised when a direct upload is missing from R2 or doesn't match what was presigned
+    """
+    def __init__(self, message: str = "Upload not found or does not match the presigned request"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class ClaimLostException(Exception):
+    """
+    Exception raised when a document's ingestion lease expired and another worker claimed it
+    before this worker's chunk writes committed
+    """
+    def __init__(self, document_id: int):
+        self.document_id = document_id
+        self.message = f"Document {document_id} was claimed by another worker"
+        super().__init__(self.message)
@@ -0,0 +1,319 @@
+# services for document ingestion
+# used by the ingestion worker (core/workers/ingestion_worker.py), never by the API
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, Iterator, List
+import datetime
+import hashlib
+import logging
+import random
+
+from database.db_access import document_access, chunk_access, user_access
+from core.entities import document_entity, chunk_entity
+from core.RAG import ingestion
+from core.services.errors.document_errors import ClaimLostException
+from core.RAG.minhash import NearDuplicateIndex, lsh_bands, minhash_signature, signature_bytes, signature_from_bytes
+from core.storage.r2_cache import get_r2_cache
+
+from config.settings import settings
+from config.r2_client import s3_client
+from database.database import SessionLocal
+
+
+logger = logging.getLogger(__name__)
+
+
+def _download_from_r2(r2_key: str) -> bytes:
+    response = s3_client.get_object(Bucket=settings.BUCKET_NAME, Key=r2_key)
+    return response["Body"].read()
+
+
+def compute_retry_delay(attempts: int) -> float:
+    """
+    Exponential backoff with jitter for failed ingestion attempts
+
+    :param attempts: Number of attempts made so far (1 after the first failure)
+    :return: Delay in seconds before the document should be retried
+    """
+    delay = settings.INGESTION_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    delay = min(delay, settings.INGESTION_RETRY_MAX_SECONDS)
+    # full jitter on the upper half so workers don't retry in lockstep
+    return random.uniform(delay / 2, delay)
+
+
+def assign_near_duplicate_keys(
+        user_id: int,
+        chunk_batches: Iterable[List[chunk_entity.ChunkCreate | chunk_entity.ChunkKeep]],
+        threshold: float = settings.NEAR_DUPLICATE_THRESHOLD,
+) -> Iterator[List[chunk_entity.ChunkCreate | chunk_entity.ChunkKeep]]:
+    """
+    Puts each new chunk in a near-duplicate cluster: a chunk whose MinHash signature matches
+    a stored chunk of the user (or an earlier chunk of this document) above `threshold`
+    takes that chunk's cluster key, any other chunk starts a cluster keyed by its own hash.
+    Retrieval then collapses every cluster to one result inside the search query.
+
+    :param user_id: The ID of the user owning the document
+    :param chunk_batches: Batches from the ingestion pipeline
+    :param threshold: Estimated Jaccard similarity above which chunks are near-duplicates
+
+    :return: The same batches, ChunkCreate items with near_duplicate_key set
+    """
+    # this document's chunks so far
+    document_clusters = NearDuplicateIndex(threshold)
+
+    # own session: the ingestion session is busy streaming the COPY these batches feed
+    db = SessionLocal()
+    try:
+        for chunks in chunk_batches:
+            new_chunks = [chunk for chunk in chunks if isinstance(chunk, chunk_entity.ChunkCreate)]
+            stored_clusters = NearDuplicateIndex(threshold)
+            for candidate in chunk_access.find_near_duplicate_candidates(
+                    user_id, (band for chunk in new_chunks for band in chunk.minhash_bands or ()), db
+            ):
+                stored_clusters.add(
+                    candidate.near_duplicate_key or candidate.content_hash,
+                    signature_from_bytes(candidate.minhash),
+                    candidate.minhash_bands,
+                )
+
+            for chunk in new_chunks:
+                if chunk.minhash is None:
+                    continue
+                signature = signature_from_bytes(chunk.minhash)
+                chunk.near_duplicate_key = (
+                    document_clusters.find(signature, chunk.minhash_bands)
+                    or stored_clusters.find(signature, chunk.minhash_bands)
+                    or chunk.content_hash
+                )
+                document_clusters.add(chunk.near_duplicate_key, signature, chunk.minhash_bands)
+            yield chunks
+    finally:
+        db.close()
+
+
+def backfill_near_duplicate_keys(
+        db: Session,
+        batch_size: int = 1000,
+        threshold: float = settings.NEAR_DUPLICATE_THRESHOLD,
+) -> int:
+    """
+    Fills minhash, minhash_bands and near_duplicate_key of chunks stored before near-duplicate
+    detection (the e5d2a8b61f07 migration added the columns empty). Chunks are clustered like
+    assign_near_duplicate_keys does for new ones: against the user's chunks that already have a
+    signature, then against the earlier chunks of the batch. Every batch is its own transaction,
+    so the backfill can run next to the ingestion workers and be restarted at any point.
+
+    :param db: Database session
+    :param batch_size: Chunks read, hashed and updated at a time
+    :param threshold: Estimated Jaccard similarity above which chunks are near-duplicates
+
+    :return: Number of chunks backfilled
+    """
+    backfilled = 0
+    users = set()
+    after_id = 0
+    while True:
+        chunks = chunk_access.get_chunks_without_minhash(after_id, batch_size, db)
+        if not chunks:
+            break
+        after_id = chunks[-1].id
+
+        by_user: Dict[int, List[chunk_entity.ChunkText]] = {}
+        for chunk in chunks:
+            by_user.setdefault(chunk.user_id, []).append(chunk)
+
+        updates = []
+        for user_id, user_chunks in by_user.items():
+            signatures = [minhash_signature(chunk.content) for chunk in user_chunks]
+            bands = [lsh_bands(signature) for signature in signatures]
+
+            clusters = NearDuplicateIndex(threshold)
+            for candidate in chunk_access.find_near_duplicate_candidates(
+                    user_id, (band for chunk_bands in bands for band in chunk_bands), db
+            ):
+                clusters.add(
+                    candidate.near_duplicate_key or candidate.content_hash,
+                    signature_from_bytes(candidate.minhash),
+                    candidate.minhash_bands,
+                )
+
+            for chunk, signature, chunk_bands in zip(user_chunks, signatures, bands):
+                key = (
+                    clusters.find(signature, chunk_bands)
+                    or chunk.content_hash
+                    or hashlib.sha256(chunk.content.encode("utf-8")).hexdigest()
+                )
+                clusters.add(key, signature, chunk_bands)
+                updates.append(chunk_entity.ChunkMinHash(
+                    id=chunk.id,
+                    user_id=user_id,
+                    minhash=signature_bytes(signature),
+                    minhash_bands=chunk_bands,
+                    near_duplicate_key=key,
+                ))
+
+        backfilled += chunk_access.update_chunk_minhashes(updates, db)
+        users.update(by_user)
+        logger.info(f"Backfilled near-duplicate keys of {backfilled} chunks, up to chunk {after_id}")
+
+    if settings.RETRIEVER_BACKEND == "numpy":
+        # shards keep the content keys they were built with, rebuild the ones that changed
+        from core.RAG.retrievers.numpy_index import get_numpy_index
+
+        index = get_numpy_index()
+        for user_id in users:
+            if index.has_shard(user_id):
+                index.rebuild_user(user_id, chunk_access.iter_chunk_vectors(db, user_id=user_id))
+    return backfilled
+
+
+def ingest_document(
+        document: document_entity.DocumentRetrieve, db: Session
+) -> chunk_entity.IngestionReport:
+    """
+    Runs parse -> chunk -> embed -> insert for a single document.
+    Ingestion is incremental: chunks whose content hash is already stored for the document
+    keep their row and embedding, only new or changed chunks are embedded, and chunks that
+    went away are deleted. A first ingestion simply has nothing stored to reuse.
+
+    :param document: DocumentRetrieve entity of the claimed document
+    :param db: Database session
+
+    :return: IngestionReport with chunk counts and the number of embedding calls saved
+    """
+    logger.info(f"Ingesting document {document.id} ({document.r2_key})")
+
+    # the same file was already ingested (usually for another user), reuse its embeddings
+    if document.content_hash is not None:
+        source = document_access.find_document_with_content_hash(
+            document.content_hash, db, processed_only=True
+        )
+        if source is not None and source.id != document.id:
+            logger.info(f"Document {document.id} has the same bytes as document {source.id}, copying its chunks")
+            copied = chunk_access.copy_document_chunks(source.id, document.id, db, document.claimed_at)
+            if copied is None:
+                raise ClaimLostException(document.id)
+            return chunk_entity.IngestionReport(
+                document_id=document.id, total_chunks=copied, embedded=0, reused=copied, deleted=0,
+            )
+
+    stored_hashes = chunk_access.get_document_chunk_hashes(document.id, db)
+
+    def needs_embedding(chunk) -> bool:
+        # claims one stored chunk with the same content, if any is left
+        stored_ids = stored_hashes.get(chunk.metadata["content_hash"])
+        if stored_ids:
+            chunk.metadata["chunk_id"] = stored_ids.pop(0)
+            return False
+        return True
+
+    # retries and re-processing read the file from the local disk cache, mmapped
+    with get_r2_cache().open(document.r2_key, document.content_hash) as file_data:
+        pages = ingestion.iter_pdf(file_data, source=document.r2_key)
+
+        # parsing, embedding and the database writes overlap; memory stays bounded by the queue sizes
+        chunk_batches = (
+            [
+                chunk_entity.ChunkKeep(
+                    id=chunk.metadata["chunk_id"],
+                    chunk_index=chunk.metadata["chunk_index"],
+                    page_number=chunk.metadata.get("page"),
+                    char_start=chunk.metadata["char_start"],
+                    char_end=chunk.metadata["char_end"],
+                )
+                if embedding is None else
+                chunk_entity.ChunkCreate(
+                    document_id=document.id,
+                    user_id=document.user_id,
+                    content=chunk.page_content,
+                    embedding=embedding,
+                    content_hash=chunk.metadata["content_hash"],
+                    chunk_index=chunk.metadata["chunk_index"],
+                    page_number=chunk.metadata.get("page"),
+                    char_start=chunk.metadata["char_start"],
+                    char_end=chunk.metadata["char_end"],
+                    minhash=chunk.metadata["minhash"],
+                    minhash_bands=chunk.metadata["minhash_bands"],
+                )
+                for chunk, embedding in zip(chunks, embeddings)
+            ]
+            for chunks, embeddings in ingestion.stream_embedded_chunks(pages, needs_embedding=needs_embedding)
+        )
+        chunk_batches = assign_near_duplicate_keys(document.user_id, chunk_batches)
+        result = chunk_access.sync_document_chunks(document.id, chunk_batches, db, document.claimed_at)
+        if result is None:
+            raise ClaimLostException(document.id)
+
+    return chunk_entity.IngestionReport(
+        document_id=document.id,
+        total_chunks=result.inserted + result.kept,
+        embedded=result.inserted,
+        reused=result.kept,
+        deleted=result.deleted,
+    )
+
+
+def _sync_vector_index(document: document_entity.DocumentRetrieve, db: Session) -> None:
+    # the in-process index is a copy of postgres, a failed sync is logged and fixed by a rebuild
+    from core.RAG.retrievers.numpy_index import get_numpy_index
+
+    index = get_numpy_index()
+    if not index.has_shard(document.user_id):
+        # built from postgres on the user's first search
+        return
+    try:
+        index.sync_document(
+            document.user_id, document.id, chunk_access.iter_chunk_vectors(db, document_id=document.id)
+        )
+    except Exception:
+        logger.exception(f"Vector index sync of document {document.id} failed")
+
+
+def process_next_document(db: Session) -> bool:
+    """
+    Claims the next due document and ingests it, moving it to PROCESSED on success.
+    Failures are rescheduled with backoff until INGESTION_MAX_ATTEMPTS, then moved to ERROR.
+
+    :param db: Database session
+    :return: True if a document was claimed, False if the queue was empty
+    """
+    document = document_access.claim_next_document(
+        settings.INGESTION_LEASE_SECONDS, settings.INGESTION_MAX_ATTEMPTS, db
+    )
+    if document is None:
+        return False
+
+    try:
+        report = ingest_document(document, db)
+    except ClaimLostException:
+        # the lease ran out mid-ingestion; the worker holding the new claim owns the document now
+        logger.warning(f"Ingestion of document {document.id} outlived its lease, nothing was written")
+        return True
+    except Exception as e:
+        logger.exception(f"Ingestion of document {document.id} failed")
+        db.rollback()
+
+        retry_at = None
+        if document.ingestion_attempts < settings.INGESTION_MAX_ATTEMPTS:
+            delay = compute_retry_delay(document.ingestion_attempts)
+            retry_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=delay)
+
+        document_access.mark_document_failed(
+            document.id, document.claimed_at, f"{type(e).__name__}: {e}", retry_at, db
+        )
+        return True
+
+    if not document_access.mark_document_processed(document.id, document.claimed_at, db):
+        # re-claimed after the chunks committed, the new claim re-ingests (reusing them), syncs and bumps
+        logger.warning(f"Document {document.id} was claimed by another worker before it was marked processed")
+        return True
+    if settings.RETRIEVER_BACKEND == "numpy":
+        _sync_vector_index(document, db)
+    # the document is searchable now, answers cached without it are stale; bumped after the
+    # index sync, so an answer cached in between is still tagged with the old version
+    user_access.bump_document_set_version(document.user_id, db)
+    logger.info(
+        f"Document {document.id} processed into {report.total_chunks} chunks: "
+        f"{report.embedded} embedded, {report.reused} reused, {report.deleted} deleted, "
+        f"{report.embedding_calls_saved} embedding calls saved"
+    )
+    return True
@@ -0,0 +1,290 @@
+# services for uploads into R2
+# files posted to the API are spooled to disk by starlette, hashed and deduplicated before
+# anything is sent, then streamed to their final key (StreamingUpload). Direct uploads are PUT
+# by the client to a staging key with a presigned URL; document_services then decides where the
+# staged object ends up (see document_services._store_blob)
+from botocore.exceptions import ClientError
+from typing import BinaryIO
+from urllib.parse import quote, unquote
+import base64
+import hashlib
+import logging
+import re
+import uuid
+
+from core.entities import document_entity
+from core.services.errors.document_errors import FileTooLargeException, InvalidUploadException
+
+from config.settings import settings
+from config.r2_client import s3_client
+
+
+logger = logging.getLogger(__name__)
+
+
+def staged_upload_key(user_id: int, upload_id: str) -> str:
+    return f"uploads/{user_id}/{upload_id}"
+
+
+def delete_staged_upload(r2_key: str) -> None:
+    try:
+        s3_client.delete_object(Bucket=settings.BUCKET_NAME, Key=r2_key)
+    except Exception as e:
+        # a leftover staged object only costs storage, don't fail the request over it
+        logger.error(f"Error deleting staged upload {r2_key} from R2: {e}")
+
+
+def _sha256_base64(content_hash: str) -> str:
+    # S3 checksums are base64, content hashes are hex everywhere else
+    return base64.b64encode(bytes.fromhex(content_hash)).decode()
+
+
+def _hash_object(r2_key: str) -> str:
+    # fallback for stores that don't report checksums, hashes the object without buffering it
+    sha256 = hashlib.sha256()
+    body = s3_client.get_object(Bucket=settings.BUCKET_NAME, Key=r2_key)["Body"]
+    for data in body.iter_chunks(settings.UPLOAD_READ_SIZE_KB * 1024):
+        sha256.update(data)
+    return sha256.hexdigest()
+
+
+def hash_file(file: BinaryIO, max_bytes: int = settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024) -> tuple[str, int]:
+    """
+    Hashes a spooled upload a piece at a time and rewinds it
+
+    :param file: The spooled file
+    :param max_bytes: Size limit
+    :return: (hex sha256, size in bytes)
+    :raises FileTooLargeException: If the file is over max_bytes
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    while data := file.read(settings.UPLOAD_READ_SIZE_KB * 1024):
+        size += len(data)
+        if size > max_bytes:
+            raise FileTooLargeException(max_bytes)
+        sha256.update(data)
+    file.seek(0)
+    return sha256.hexdigest(), size
+
+
+def upload_file(file: BinaryIO, r2_key: str, content_type: str, content_hash: str) -> None:
+    """
+    Streams a spooled upload to R2, one part in memory at a time
+
+    :param file: The spooled file, hashed by hash_file
+    :param r2_key: Key to store it under
+    :param content_type: Content type of the object
+    :param content_hash: sha256 from hash_file, the streamed bytes must still match it
+    """
+    upload = StreamingUpload(r2_key, content_type)
+    try:
+        while data := file.read(settings.UPLOAD_READ_SIZE_KB * 1024):
+            upload.write(data)
+        if upload.content_hash != content_hash:
+            # the key is content addressed, it must hold exactly the hashed bytes
+            raise ValueError("The file changed between hashing and uploading")
+        upload.complete()
+    except Exception:
+        upload.abort()
+        raise
+
+
+def create_presigned_upload(user_id: int, file_name: str, content_type: str, content_hash: str) -> dict:
+    """
+    Presigns a PUT of one file to a staging key, so the bytes go from the client straight to
+    R2. The sha256 is part of the signature (x-amz-checksum-sha256): R2 rejects the PUT if the
+    bytes don't match it. Staged objects that are never completed should be expired by a
+    lifecycle rule on the uploads/ prefix.
+
+    :param user_id: The ID of the uploading user, the staging key is scoped to it
+    :param file_name: Original file name, kept in the object metadata
+    :param content_type: Content type the client must PUT with
+    :param content_hash: Hex sha256 of the file, as computed by the client
+
+    :return: dict with upload_id, url, headers to send with the PUT and expires_in
+    :raises InvalidUploadException: If content_hash is not a hex sha256
+    """
+    if not re.fullmatch(r"[0-9a-f]{64}", content_hash):
+        raise InvalidUploadException("sha256 must be a lowercase hex digest")
+
+    upload_id = uuid.uuid4().hex
+    checksum = _sha256_base64(content_hash)
+    # metadata headers must be ascii
+    metadata = {"file-name": quote(file_name), "sha256": content_hash}
+
+    url = s3_client.generate_presigned_url(
+        "put_object",
+        Params={
+            "Bucket": settings.BUCKET_NAME,
+            "Key": staged_upload_key(user_id, upload_id),
+            "ContentType": content_type,
+            "ChecksumSHA256": checksum,
+            "Metadata": metadata,
+        },
+        ExpiresIn=settings.PRESIGNED_UPLOAD_EXPIRES_SECONDS,
+    )
+    logger.info(f"Presigned direct upload {upload_id} for user {user_id}")
+
+    return {
+        "upload_id": upload_id,
+        "url": url,
+        "headers": {
+            "Content-Type": content_type,
+            "x-amz-checksum-sha256": checksum,
+            **{f"x-amz-meta-{key}": value for key, value in metadata.items()},
+        },
+        "expires_in": settings.PRESIGNED_UPLOAD_EXPIRES_SECONDS,
+    }
+
+
+def complete_presigned_upload(user_id: int, upload_id: str) -> document_entity.DocumentUpload:
+    """
+    Verifies a direct upload with a HEAD request: it must exist under the user's staging
+    prefix, be a PDF within the size limit and carry the presigned checksum. Only if the
+    store did not report a checksum is the object read back and hashed.
+
+    :param user_id: The ID of the user completing the upload
+    :param upload_id: upload_id returned by create_presigned_upload
+
+    :return: DocumentUpload entity of the staged file
+    :raises InvalidUploadException: If the object is missing or doesn't match
+    :raises FileTooLargeException: If the object is over MAX_UPLOAD_SIZE_MB
+    """
+    if not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+        raise InvalidUploadException()
+    r2_key = staged_upload_key(user_id, upload_id)
+
+    try:
+        head = s3_client.head_object(Bucket=settings.BUCKET_NAME, Key=r2_key, ChecksumMode="ENABLED")
+    except ClientError as e:
+        logger.warning(f"Direct upload {r2_key} not found: {e}")
+        raise InvalidUploadException()
+
+    max_bytes = settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+    if head["ContentLength"] > max_bytes:
+        delete_staged_upload(r2_key)
+        raise FileTooLargeException(max_bytes)
+    if head.get("ContentType") != "application/pdf":
+        delete_staged_upload(r2_key)
+        raise InvalidUploadException("Only PDF files are allowed")
+
+    metadata = head.get("Metadata", {})
+    content_hash = metadata.get("sha256", "")
+    if not re.fullmatch(r"[0-9a-f]{64}", content_hash) or head.get("ChecksumSHA256") != _sha256_base64(content_hash):
+        logger.info(f"No matching checksum reported for {r2_key}, hashing it")
+        content_hash = _hash_object(r2_key)
+
+    return document_entity.DocumentUpload(
+        user_id=user_id,
+        file_name=unquote(metadata.get("file-name", upload_id)),
+        file_size=head["ContentLength"],
+        content_type=head["ContentType"],
+        staged_key=r2_key,
+        content_hash=content_hash,
+    )
+
+
+class StreamingUpload:
+    """
+    Streams a file into R2 part by part. At most one part (UPLOAD_PART_SIZE_MB) is held in
+    memory, the sha256 and size are computed on the way through and the size limit is
+    enforced before anything over it is sent. Files smaller than one part are sent with a
+    single put_object on complete().
+
+    All methods block on R2, the API runs them with asyncio.to_thread.
+    """
+
+    def __init__(
+            self,
+            r2_key: str,
+            content_type: str,
+            max_bytes: int = settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024,
+            part_size: int = settings.UPLOAD_PART_SIZE_MB * 1024 * 1024,
+    ):
+        self.r2_key = r2_key
+        self.content_type = content_type
+        self.max_bytes = max_bytes
+        self.part_size = part_size
+
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._buffer = bytearray()
+        self._upload_id: str | None = None
+        self._parts = []
+
+    @property
+    def content_hash(self) -> str:
+        return self._sha256.hexdigest()
+
+    def write(self, data: bytes) -> None:
+        """
+        Adds data to the upload, sending a part to R2 each time a full part is buffered
+
+        :param data: Next piece of the file
+        :raises FileTooLargeException: If the file goes over max_bytes
+        """
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise FileTooLargeException(self.max_bytes)
+
+        self._sha256.update(data)
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+
+    def complete(self) -> None:
+        """
+        Sends what is left and finishes the upload
+        """
+        if self._upload_id is None:
+            # the whole file fit in one part
+            s3_client.put_object(
+                Bucket=settings.BUCKET_NAME,
+                Key=self.r2_key,
+                Body=bytes(self._buffer),
+                ContentType=self.content_type,
+            )
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            s3_client.complete_multipart_upload(
+                Bucket=settings.BUCKET_NAME,
+                Key=self.r2_key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+        self._buffer = bytearray()
+        logger.info(f"Streamed {self.size} bytes to R2 as {self.r2_key} in {max(len(self._parts), 1)} part(s)")
+
+    def abort(self) -> None:
+        """
+        Drops the upload, nothing is left behind in R2
+        """
+        self._buffer = bytearray()
+        if self._upload_id is None:
+            return
+        try:
+            s3_client.abort_multipart_upload(
+                Bucket=settings.BUCKET_NAME, Key=self.r2_key, UploadId=self._upload_id
+            )
+        except Exception as e:
+            logger.error(f"Error aborting multipart upload {self.r2_key}: {e}")
+
+    def _upload_part(self, data: bytes) -> None:
+        if self._upload_id is None:
+            response = s3_client.create_multipart_upload(
+                Bucket=settings.BUCKET_NAME, Key=self.r2_key, ContentType=self.content_type
+            )
+            self._upload_id = response["UploadId"]
+
+        part_number = len(self._parts) + 1
+        response = s3_client.upload_part(
+            Bucket=settings.BUCKET_NAME,
+            Key=self.r2_key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        self._parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
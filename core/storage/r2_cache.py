@@ -0,0 +1,192 @@
+"""
+Local disk cache for R2 objects.
+
+Ingestion retries, re-chunking and re-embedding after a model change all read the original
+file again; with the cache, hot documents are read from local disk instead of R2.
+
+- content addressed: files are stored under the document's sha256 (the r2_key's hash when
+  there is none) and verified against it after download
+- atomic writes: downloads go to a temp file in the cache directory and are os.replace()d
+  into place, so readers never see a partial file
+- concurrent readers: hits take no lock; a flock makes sure only one process downloads a
+  given object at a time. Locks are striped, one lock file per shard directory (256 at
+  most), so lock files never pile up next to the entries
+- LRU eviction: a hit touches the file's mtime, and once the cache goes over its size the
+  least recently used files are deleted (open mmaps of deleted files stay valid on POSIX)
+- memory-mapped reads: open() yields a read-only memoryview over an mmap, which pymupdf
+  parses without copying the file onto the heap
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import threading
+
+from config.settings import settings
+from config.r2_client import s3_client
+
+
+logger = logging.getLogger(__name__)
+
+_cache: "R2DiskCache | None" = None
+_cache_lock = threading.Lock()
+
+_DOWNLOAD_CHUNK = 1024 * 1024
+
+
+class R2DiskCache:
+
+    def __init__(
+            self,
+            directory: str = settings.R2_CACHE_DIR,
+            max_bytes: int = settings.R2_CACHE_MAX_MB * 1024 * 1024,
+            enabled: bool = settings.R2_CACHE_ENABLED,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        if enabled:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    # ---------- Public API ----------
+    @contextmanager
+    def open(self, r2_key: str, content_hash: str | None = None) -> Iterator[memoryview | bytes]:
+        """
+        Yields the contents of an R2 object, from the local cache when possible
+
+        :param r2_key: Key of the object in the bucket
+        :param content_hash: Hex sha256 of the object if known (documents.content_hash)
+
+        :return: Context manager yielding a read-only memoryview (bytes when the cache is disabled)
+        """
+        if not self.enabled:
+            yield self._download_bytes(r2_key)
+            return
+
+        path = self._fetch(r2_key, content_hash)
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                # mmap can't map empty files
+                yield b""
+                return
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            try:
+                view.release()
+                mapped.close()
+            except BufferError:
+                # a parser still holds a buffer, the map goes away when it is garbage collected
+                logger.debug(f"Cached object {path.name} still referenced, leaving its mmap to gc")
+
+    def size(self) -> int:
+        return sum(path.stat().st_size for path in self._entries())
+
+    # ---------- Internals ----------
+    def _path(self, r2_key: str, content_hash: str | None) -> Path:
+        digest = content_hash or hashlib.sha256(r2_key.encode("utf-8")).hexdigest()
+        return self.directory / digest[:2] / digest
+
+    def _entries(self) -> Iterator[Path]:
+        for path in self.directory.glob("??/*"):
+            # skips the shard's lock file and temp files of running downloads
+            if path.is_file() and not path.name.startswith("."):
+                yield path
+
+    def _fetch(self, r2_key: str, content_hash: str | None) -> Path:
+        path = self._path(r2_key, content_hash)
+        if self._touch(path):
+            logger.info(f"R2 cache hit for {r2_key}")
+            return path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path.parent / ".download.lock", "a") as lock:
+            # one download per object across threads and processes, the others wait for it
+            # (and so do downloads of other objects in the same shard, 1 in 256)
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if self._touch(path):
+                    return path
+                logger.info(f"R2 cache miss for {r2_key}, downloading")
+                self._download_to(r2_key, path, content_hash)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        self._evict()
+        return path
+
+    def _touch(self, path: Path) -> bool:
+        # marks the entry as recently used, False if it isn't cached
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _download_to(self, r2_key: str, path: Path, content_hash: str | None) -> None:
+        body = s3_client.get_object(Bucket=settings.BUCKET_NAME, Key=r2_key)["Body"]
+        sha256 = hashlib.sha256()
+        descriptor, temp_path = tempfile.mkstemp(prefix=".tmp", dir=path.parent)
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                for data in body.iter_chunks(_DOWNLOAD_CHUNK):
+                    sha256.update(data)
+                    file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+
+            if content_hash is not None and sha256.hexdigest() != content_hash:
+                raise ValueError(f"R2 object {r2_key} does not match its content hash {content_hash}")
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _download_bytes(self, r2_key: str) -> bytes:
+        return s3_client.get_object(Bucket=settings.BUCKET_NAME, Key=r2_key)["Body"].read()
+
+    def _evict(self) -> None:
+        with open(self.directory / ".evict.lock", "a") as lock:
+            try:
+                # another process is already evicting, it will get us under the limit
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            try:
+                entries = []
+                for path in self._entries():
+                    try:
+                        stat = path.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+                total = sum(size for _, size, _ in entries)
+                # least recently used first
+                for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+                    if total <= self.max_bytes:
+                        break
+                    try:
+                        path.unlink()
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    logger.info(f"Evicted {path.name} from the R2 cache")
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def get_r2_cache() -> R2DiskCache:
+    # one per process, the directory itself is shared between processes
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = R2DiskCache()
+        return _cache
@@ -0,0 +1,116 @@
+"""
+Ingestion worker entry point.
+
+Runs N worker processes that claim pending documents from Postgres and ingest them.
+Each process ingests --concurrency documents at once on threads that share one embedding
+batcher, so chunks of different documents are merged into the same embedding requests.
+Scale ingestion throughput by raising --workers or by running this on more machines.
+
+    python -m core.workers.ingestion_worker --workers 4 --concurrency 4
+"""
+import argparse
+import logging
+import multiprocessing
+import signal
+import threading
+
+from config.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = "[ %(asctime)s ] %(lineno)d %(name)s - %(levelname)s - %(message)s"
+
+
+def run_worker(worker_id: int, concurrency: int, stop_event) -> None:
+    """
+    Worker process: runs `concurrency` ingestion loops on threads.
+
+    :param worker_id: Index of the worker, only used for logging
+    :param concurrency: Number of documents ingested at once
+    :param stop_event: multiprocessing.Event set by the parent on shutdown
+    """
+    logging.basicConfig(format=f"[worker {worker_id}] %(threadName)s {LOG_FORMAT}", level=logging.INFO)
+    # the parent owns shutdown, let it tell us through stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    threads = [
+        threading.Thread(target=run_ingestion_loop, args=(stop_event,), name=f"ingest-{i}")
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    logger.info(f"Ingestion worker started with {concurrency} threads")
+    for thread in threads:
+        thread.join()
+
+    from core.RAG.embeddings.cache import get_embedder
+    embedder = get_embedder()
+    logger.info(f"Embedding cache stats: {embedder.stats()}")
+    logger.info(f"Embedding batcher stats: {embedder.batcher.stats()}")
+
+
+def run_ingestion_loop(stop_event) -> None:
+    """
+    Ingestion loop: ingest documents until the queue is empty, then poll.
+
+    :param stop_event: multiprocessing.Event set by the parent on shutdown
+    """
+    # imported here so every spawned process builds its own engine and R2 client
+    from database.database import SessionLocal
+    from core.services import ingestion_services
+
+    while not stop_event.is_set():
+        db = SessionLocal()
+        try:
+            claimed = ingestion_services.process_next_document(db)
+        except Exception:
+            # database hiccups etc., never let the worker die on them
+            logger.exception("Unexpected error in ingestion worker loop")
+            claimed = False
+        finally:
+            db.close()
+
+        if not claimed:
+            stop_event.wait(settings.INGESTION_POLL_INTERVAL_SECONDS)
+
+    logger.info("Ingestion loop stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Background document ingestion worker pool")
+    parser.add_argument(
+        "--workers", type=int, default=settings.INGESTION_WORKERS,
+        help="number of worker processes",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=settings.INGESTION_CONCURRENCY,
+        help="documents ingested at once by each worker process",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+
+    def shutdown(signum, frame):
+        logger.info(f"Received signal {signum}, finishing in-flight documents")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    processes = [
+        ctx.Process(target=run_worker, args=(i, args.concurrency, stop_event), name=f"ingestion-worker-{i}")
+        for i in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"Started {len(processes)} ingestion workers")
+
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Near-duplicate backfill entry point.
+
+Computes the MinHash signature, LSH bands and near-duplicate key of every chunk stored before
+near-duplicate detection existed (see ingestion_services.backfill_near_duplicate_keys). Until it
+has run, retrieval deduplicates those chunks on their exact content hash only. Safe to run
+while the ingestion workers are up, and to stop and run again.
+
+    python -m core.workers.minhash_backfill --batch-size 1000
+"""
+import argparse
+import logging
+
+from core.workers.ingestion_worker import LOG_FORMAT
+
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backfill near-duplicate keys of existing chunks")
+    parser.add_argument("--batch-size", type=int, default=1000, help="chunks updated per transaction")
+    args = parser.parse_args()
+
+    logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
+
+    from database.database import SessionLocal
+    from core.services import ingestion_services
+
+    db = SessionLocal()
+    try:
+        backfilled = ingestion_services.backfill_near_duplicate_keys(db, args.batch_size)
+    finally:
+        db.close()
+    logger.info(f"Near-duplicate backfill done, {backfilled} chunks updated")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.engine import URL
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
@@ -6,8 +6,9 @@ from sqlalchemy.ext.declarative import declarative_base
 from config.settings import settings
 
 
+# psycopg2 explicitly: the chunk writer streams rows with its COPY support
 url = URL.create(
-    drivername="postgresql",
+    drivername="postgresql+psycopg2",
     username=settings.DB_USER,
     password=settings.DB_PASSWORD,
     host=settings.DB_HOST,
@@ -16,6 +17,21 @@ url = URL.create(
 )
 
 engine = create_engine(url)
+
+
+@event.listens_for(engine, "connect")
+def _set_vector_search_params(dbapi_connection, connection_record):
+    # search-time knobs of the pgvector indexes on chunks, once per pooled connection
+    cursor = dbapi_connection.cursor()
+    cursor.execute("SET hnsw.ef_search = %s", (settings.VECTOR_HNSW_EF_SEARCH,))
+    cursor.execute("SET ivfflat.probes = %s", (settings.VECTOR_IVFFLAT_PROBES,))
+    if settings.VECTOR_ITERATIVE_SCAN != "off":
+        cursor.execute("SET hnsw.iterative_scan = %s", (settings.VECTOR_ITERATIVE_SCAN,))
+    cursor.close()
+    # SETs made in a transaction are undone by its rollback, and the pool rolls back on checkin
+    dbapi_connection.commit()
+
+
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
@@ -0,0 +1,631 @@
+"""
+This module talks to the database models related to document chunks and their embeddings
+"""
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
+from sqlalchemy import BigInteger, String, bindparam, cast, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, REGCONFIG
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, Iterator, List
+import datetime
+import logging
+import struct
+import time
+
+from database import models
+from core.entities import chunk_entity
+
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Binary COPY ----------
+# chunks are written with COPY ... FROM STDIN (FORMAT binary): one statement streams every new
+# chunk of a document, and embeddings go over the wire as packed float4 instead of text
+_COPY_COLUMNS = (
+    "document_id", "user_id", "content", "embedding", "content_hash", "chunk_index",
+    "page_number", "char_start", "char_end", "minhash", "minhash_bands", "near_duplicate_key",
+)
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_COPY_TRAILER = struct.pack(">h", -1)
+_NULL = struct.pack(">i", -1)
+
+
+def _copy_int(value: int | None) -> bytes:
+    if value is None:
+        return _NULL
+    return struct.pack(">ii", 4, value)
+
+
+def _copy_text(value: str | None) -> bytes:
+    if value is None:
+        return _NULL
+    data = value.encode("utf-8")
+    return struct.pack(">i", len(data)) + data
+
+
+def _copy_bytes(value: bytes | None) -> bytes:
+    if value is None:
+        return _NULL
+    return struct.pack(">i", len(value)) + value
+
+
+def _copy_bigint_array(values: List[int] | None) -> bytes:
+    # one dimensional int8[] without NULLs: header (ndim, has nulls, element oid, length,
+    # lower bound), then a length-prefixed value per element
+    if values is None:
+        return _NULL
+    count = len(values)
+    data = struct.pack(f">iiiii{'iq' * count}", 1, 0, 20, count, 1, *(part for value in values for part in (8, value)))
+    return struct.pack(">i", len(data)) + data
+
+
+def _copy_vector(value: List[float] | None) -> bytes:
+    # pgvector's binary format: int16 dimensions, int16 unused, float4 values
+    if value is None:
+        return _NULL
+    dimensions = len(value)
+    return struct.pack(f">ihh{dimensions}f", 4 + 4 * dimensions, dimensions, 0, *value)
+
+
+def _copy_row(chunk: chunk_entity.ChunkCreate) -> bytes:
+    return b"".join((
+        struct.pack(">h", len(_COPY_COLUMNS)),
+        _copy_int(chunk.document_id),
+        _copy_int(chunk.user_id),
+        _copy_text(chunk.content),
+        _copy_vector(chunk.embedding),
+        _copy_text(chunk.content_hash),
+        _copy_int(chunk.chunk_index),
+        _copy_int(chunk.page_number),
+        _copy_int(chunk.char_start),
+        _copy_int(chunk.char_end),
+        _copy_bytes(chunk.minhash),
+        _copy_bigint_array(chunk.minhash_bands),
+        _copy_text(chunk.near_duplicate_key),
+    ))
+
+
+class _CopyStream:
+    # file-like view over a generator of bytes, read by psycopg2 as COPY data
+    def __init__(self, parts: Iterator[bytes]):
+        self._parts = parts
+        self._buffer = bytearray()
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            part = next(self._parts, None)
+            if part is None:
+                break
+            self._buffer += part
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+def copy_chunks(chunks: Iterable[chunk_entity.ChunkCreate], db: Session) -> int:
+    """
+    Streams chunks into the chunks table with a single binary COPY, inside the session's
+    current transaction (nothing is committed). Rows are encoded as they are pulled from
+    `chunks`, so a generator keeps memory flat however large the document is.
+
+    :param chunks: Iterable of ChunkCreate entities
+    :param db: Database session
+
+    :return: Number of rows written
+    """
+    written = 0
+
+    def parts() -> Iterator[bytes]:
+        nonlocal written
+        yield _COPY_SIGNATURE
+        for chunk in chunks:
+            yield _copy_row(chunk)
+            written += 1
+        yield _COPY_TRAILER
+
+    # the raw psycopg2 connection behind the session, same transaction as the ORM statements
+    cursor = db.connection().connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {models.Chunk.__tablename__} ({', '.join(_COPY_COLUMNS)}) FROM STDIN WITH (FORMAT binary)",
+            _CopyStream(parts()),
+        )
+    finally:
+        cursor.close()
+    return written
+
+
+# maps content hashes to the ids of a document's stored chunks
+def get_document_chunk_hashes(document_id: int, db: Session) -> Dict[str, List[int]]:
+    """
+    Retrieves the content hashes of a document's stored chunks
+
+    :param document_id: The ID of the document
+    :param db: Database session
+
+    :return: dict of content_hash -> list of chunk IDs with that hash
+    """
+    logger.info(f"Querying to db for chunk hashes of document {document_id}")
+    rows = db.query(models.Chunk.id, models.Chunk.content_hash).filter(
+        models.Chunk.document_id == document_id
+    ).order_by(models.Chunk.id.asc()).all()
+
+    hashes: Dict[str, List[int]] = {}
+    for chunk_id, content_hash in rows:
+        if content_hash is not None:
+            hashes.setdefault(content_hash, []).append(chunk_id)
+    return hashes
+
+
+def _holds_claim(document_id: int, claimed_at: datetime.datetime | None, db: Session) -> bool:
+    # the ingestion claim is checked right before the chunk writes commit; the row lock keeps
+    # another worker from taking the document over between the check and the commit
+    if claimed_at is None:
+        return True
+    return db.query(models.Document.id).filter(
+        models.Document.id == document_id,
+        models.Document.processing_status == models.ProcessingStatus.PROCESSING,
+        models.Document.claimed_at == claimed_at,
+    ).with_for_update().first() is not None
+
+
+# brings a document's stored chunks in line with a new chunk set, in a single transaction
+def sync_document_chunks(
+        document_id: int,
+        chunk_batches: Iterable[List[chunk_entity.ChunkCreate | chunk_entity.ChunkKeep]],
+        db: Session,
+        claimed_at: datetime.datetime | None = None,
+) -> chunk_entity.ChunkSyncResult | None:
+    """
+    Applies a chunk diff to a document: ChunkCreate items are inserted, ChunkKeep items keep
+    their row (and embedding) and only get their new position, and every other stored chunk
+    of the document is deleted. Everything happens in one transaction, so a retried ingestion
+    never leaves duplicate or half-written chunks behind. New chunks are written with a single
+    binary COPY that pulls batches as they arrive, so callers can stream them from the
+    ingestion pipeline.
+
+    :param document_id: The ID of the document the chunks belong to
+    :param chunk_batches: Iterable of lists of ChunkCreate / ChunkKeep entities
+    :param db: Database session
+    :param claimed_at: claimed_at of the ingestion claim; when given, nothing is committed
+                       unless the document is still held by that claim
+
+    :return: ChunkSyncResult with the number of inserted, kept and deleted chunks,
+             None if the claim was lost and the changes were rolled back
+    """
+    logger.info(f"Syncing chunks for document {document_id}")
+
+    # id -> user_id, the primary key of the partitioned table that the kept chunks are updated on
+    existing = dict(
+        db.query(models.Chunk.id, models.Chunk.user_id).filter(models.Chunk.document_id == document_id).all()
+    )
+    existing_ids = set(existing)
+
+    # new chunks are streamed straight into COPY; kept chunks are only small position updates,
+    # so they are collected and applied once the COPY is done
+    kept_chunks: List[chunk_entity.ChunkKeep] = []
+
+    def new_chunks() -> Iterator[chunk_entity.ChunkCreate]:
+        for chunks in chunk_batches:
+            for chunk in chunks:
+                if isinstance(chunk, chunk_entity.ChunkKeep):
+                    kept_chunks.append(chunk)
+                else:
+                    yield chunk
+
+    started = time.monotonic()
+    inserted = copy_chunks(new_chunks(), db)
+    elapsed = time.monotonic() - started
+
+    if kept_chunks:
+        db.bulk_update_mappings(models.Chunk, [
+            {
+                "id": chunk.id,
+                "user_id": existing[chunk.id],
+                "chunk_index": chunk.chunk_index,
+                "page_number": chunk.page_number,
+                "char_start": chunk.char_start,
+                "char_end": chunk.char_end,
+            }
+            for chunk in kept_chunks
+        ])
+    kept_ids = {chunk.id for chunk in kept_chunks}
+
+    stale_ids = existing_ids - kept_ids
+    if stale_ids:
+        db.query(models.Chunk).filter(models.Chunk.id.in_(stale_ids)).delete(
+            synchronize_session=False
+        )
+
+    if not _holds_claim(document_id, claimed_at, db):
+        db.rollback()
+        logger.warning(f"Document {document_id} was claimed by another worker, its chunk changes were rolled back")
+        return None
+    db.commit()
+    # elapsed includes waiting on the upstream pipeline, so this is end to end throughput
+    rows_per_second = inserted / elapsed if elapsed > 0 else 0.0
+    logger.info(
+        f"Document {document_id}: inserted {inserted} ({rows_per_second:.0f} rows/s), "
+        f"kept {len(kept_ids)}, deleted {len(stale_ids)} chunks"
+    )
+
+    return chunk_entity.ChunkSyncResult(
+        inserted=inserted,
+        kept=len(kept_ids),
+        deleted=len(stale_ids),
+    )
+
+
+# copies the chunks (and embeddings) of an already ingested document
+def copy_document_chunks(
+        source_document_id: int,
+        target_document_id: int,
+        db: Session,
+        claimed_at: datetime.datetime | None = None,
+) -> int | None:
+    """
+    Replaces the chunks of the target document with copies of the source document's chunks.
+    Used when the same file was already ingested for another user, so nothing is re-embedded.
+    The copy happens inside postgres in one transaction.
+
+    :param source_document_id: The ID of the ingested document to copy from
+    :param target_document_id: The ID of the document to copy into
+    :param db: Database session
+    :param claimed_at: claimed_at of the target's ingestion claim, see sync_document_chunks
+
+    :return: Number of chunks copied, None if the claim was lost and the copy was rolled back
+    """
+    logger.info(f"Copying chunks of document {source_document_id} to document {target_document_id}")
+
+    db.query(models.Chunk).filter(models.Chunk.document_id == target_document_id).delete(
+        synchronize_session=False
+    )
+    target_user_id = select(models.Document.user_id).where(
+        models.Document.id == target_document_id
+    ).scalar_subquery()
+    source_chunks = select(
+        literal(target_document_id),
+        target_user_id,
+        models.Chunk.content,
+        models.Chunk.embedding,
+        models.Chunk.content_hash,
+        models.Chunk.chunk_index,
+        models.Chunk.page_number,
+        models.Chunk.char_start,
+        models.Chunk.char_end,
+        models.Chunk.minhash,
+        models.Chunk.minhash_bands,
+        models.Chunk.near_duplicate_key,
+    ).where(models.Chunk.document_id == source_document_id).order_by(models.Chunk.id)
+
+    result = db.execute(
+        insert(models.Chunk).from_select(
+            [
+                "document_id", "user_id", "content", "embedding", "content_hash", "chunk_index",
+                "page_number", "char_start", "char_end", "minhash", "minhash_bands", "near_duplicate_key",
+            ],
+            source_chunks,
+        )
+    )
+    if not _holds_claim(target_document_id, claimed_at, db):
+        db.rollback()
+        logger.warning(f"Document {target_document_id} was claimed by another worker, its chunk copy was rolled back")
+        return None
+    db.commit()
+
+    return result.rowcount
+
+
+def _content_key():
+    # search results are deduplicated on this: a near-duplicate cluster, else the exact text
+    # (same key as the numpy index, RetrievedChunk.content_key is its first 16 digits)
+    return func.coalesce(
+        models.Chunk.near_duplicate_key,
+        models.Chunk.content_hash,
+        func.encode(func.sha256(func.convert_to(models.Chunk.content, "UTF8")), "hex"),
+    )
+
+
+# similarity search over one user's chunks, entirely in postgres
+def search_user_chunks(
+        user_id: int,
+        query_embedding: List[float],
+        top_k: int,
+        overfetch: int,
+        db: Session,
+        mode: str = "halfvec",
+        rescore_factor: int = 4,
+) -> List[chunk_entity.RetrievedChunk]:
+    """
+    Finds the user's chunks closest to a query embedding, in one query and one round trip:
+    the user filter, the distance ordering (on the hnsw index), the over-fetch and the
+    content deduplication all run in postgres.
+
+    In "binary" and "matryoshka" modes the first pass runs on a smaller index, the binary
+    quantized embeddings (hamming distance, 1 bit per dimension) or their first
+    CHUNK_MATRYOSHKA_DIMENSIONS dimensions (text-embedding-3 embeddings are trained so a
+    prefix is an embedding on its own). Its top candidates are rescored against the full
+    precision embeddings before the over-fetch and deduplication.
+
+    :param user_id: The ID of the user whose chunks are searched
+    :param query_embedding: Embedding of the query
+    :param top_k: Number of chunks to return
+    :param overfetch: Candidates fetched per returned chunk, so duplicates can be dropped
+    :param db: Database session
+    :param mode: "halfvec" (ix_chunks_embedding_hnsw), "binary" (ix_chunks_embedding_binary_hnsw)
+                 or "matryoshka" (ix_chunks_embedding_prefix_hnsw)
+    :param rescore_factor: Binary and matryoshka modes, first pass candidates per over-fetched chunk
+
+    :return: List of RetrievedChunk, most similar first
+    """
+    dimensions = models.CHUNK_EMBEDDING_DIMENSIONS
+    columns = (
+        models.Chunk.id,
+        models.Chunk.document_id,
+        models.Chunk.content,
+        models.Chunk.page_number,
+        models.Chunk.chunk_index,
+        _content_key().label("content_key"),
+    )
+    user_chunks = (models.Chunk.user_id == user_id, models.Chunk.embedding.is_not(None))
+
+    if mode in ("binary", "matryoshka"):
+        vector = Vector(dimensions)
+        query = cast(bindparam("query_embedding", query_embedding, type_=vector), vector)
+        # must be the same expressions as the ix_chunks_embedding_*_hnsw indexes
+        if mode == "binary":
+            bit = BIT(dimensions)
+            first_pass = cast(func.binary_quantize(models.Chunk.embedding), bit).hamming_distance(
+                cast(func.binary_quantize(query), bit)
+            )
+        else:
+            prefix = Vector(models.CHUNK_MATRYOSHKA_DIMENSIONS)
+            first_pass = cast(func.subvector(models.Chunk.embedding, 1, prefix.dim), prefix).cosine_distance(
+                cast(func.subvector(query, 1, prefix.dim), prefix)
+            )
+        shortlist = select(*columns, models.Chunk.embedding).where(*user_chunks).order_by(
+            first_pass
+        ).limit(top_k * overfetch * rescore_factor).cte("shortlist")
+
+        # exact cosine distance on the full precision vectors, only for the shortlist
+        distance = shortlist.c.embedding.cosine_distance(query)
+        candidates = select(
+            *(shortlist.c[column.key] for column in columns), distance.label("distance")
+        ).order_by(distance).limit(top_k * overfetch).cte("candidates")
+
+    elif mode == "halfvec":
+        halfvec = HALFVEC(dimensions)
+        # must be the same expression as ix_chunks_embedding_hnsw for the index to be used
+        distance = cast(models.Chunk.embedding, halfvec).cosine_distance(
+            cast(bindparam("query_embedding", query_embedding, type_=halfvec), halfvec)
+        )
+        candidates = select(*columns, distance.label("distance")).where(*user_chunks).order_by(
+            distance
+        ).limit(top_k * overfetch).cte("candidates")
+
+    else:
+        raise ValueError(f"Unknown vector search mode: '{mode}'. Must be 'halfvec', 'binary' or 'matryoshka'.")
+
+    # the same or nearly the same text in several documents (or twice in one) is returned once,
+    # its closest copy
+    unique_chunks = select(candidates).distinct(candidates.c.content_key).order_by(
+        candidates.c.content_key, candidates.c.distance
+    ).subquery("unique_chunks")
+
+    rows = db.execute(
+        select(unique_chunks).order_by(unique_chunks.c.distance).limit(top_k)
+    ).all()
+
+    return [
+        chunk_entity.RetrievedChunk(
+            id=row.id,
+            document_id=row.document_id,
+            content=row.content,
+            score=1.0 - row.distance,
+            page_number=row.page_number,
+            chunk_index=row.chunk_index,
+            content_key=row.content_key[:16],
+        )
+        for row in rows
+    ]
+
+
+# full text search over one user's chunks
+def search_user_chunks_lexical(
+        user_id: int,
+        query: str,
+        limit: int,
+        db: Session,
+) -> List[chunk_entity.RetrievedChunk]:
+    """
+    Finds the user's chunks sharing the most terms with the query (ts_rank_cd on the gin
+    indexed content_tsv). Terms are OR-ed: a question rarely has every one of its words in
+    the same chunk, the ranking favours the chunks that have more of them.
+
+    :param user_id: The ID of the user whose chunks are searched
+    :param query: The user's query, as typed
+    :param limit: Number of chunks to return
+    :param db: Database session
+
+    :return: List of RetrievedChunk, best match first, score is the ts_rank_cd rank
+    """
+    config = cast(models.CHUNK_TEXT_SEARCH_CONFIG, REGCONFIG)
+    # plainto_tsquery stems the terms and drops stop words, then & becomes |
+    terms = func.to_tsquery(
+        config, func.replace(cast(func.plainto_tsquery(config, query), String), " & ", " | ")
+    )
+    rank = func.ts_rank_cd(models.Chunk.content_tsv, terms)
+
+    candidates = select(
+        models.Chunk.id,
+        models.Chunk.document_id,
+        models.Chunk.content,
+        models.Chunk.page_number,
+        models.Chunk.chunk_index,
+        _content_key().label("content_key"),
+        rank.label("rank"),
+    ).where(
+        models.Chunk.user_id == user_id,
+        models.Chunk.content_tsv.op("@@")(terms),
+    ).order_by(rank.desc()).limit(limit * 2).cte("candidates")
+
+    # same deduplication as the vector search
+    unique_chunks = select(candidates).distinct(candidates.c.content_key).order_by(
+        candidates.c.content_key, candidates.c.rank.desc()
+    ).subquery("unique_chunks")
+
+    rows = db.execute(
+        select(unique_chunks).order_by(unique_chunks.c.rank.desc()).limit(limit)
+    ).all()
+
+    return [
+        chunk_entity.RetrievedChunk(
+            id=row.id,
+            document_id=row.document_id,
+            content=row.content,
+            score=row.rank,
+            page_number=row.page_number,
+            chunk_index=row.chunk_index,
+            content_key=row.content_key[:16],
+        )
+        for row in rows
+    ]
+
+
+# streams stored chunks with their embeddings, for the in-process vector index
+def iter_chunk_vectors(
+        db: Session,
+        user_id: int | None = None,
+        document_id: int | None = None,
+        batch_size: int = 1000,
+) -> Iterator[chunk_entity.ChunkVector]:
+    """
+    Streams a user's or a document's embedded chunks, batch_size rows at a time
+
+    :param db: Database session
+    :param user_id: Only chunks of this user
+    :param document_id: Only chunks of this document
+
+    :return: Generator of ChunkVector entities in (document_id, chunk_index) order
+    """
+    query = db.query(
+        models.Chunk.id,
+        models.Chunk.document_id,
+        models.Chunk.content,
+        models.Chunk.content_hash,
+        models.Chunk.page_number,
+        models.Chunk.chunk_index,
+        models.Chunk.embedding,
+        models.Chunk.near_duplicate_key,
+    ).filter(models.Chunk.embedding.is_not(None))
+    if user_id is not None:
+        query = query.filter(models.Chunk.user_id == user_id)
+    if document_id is not None:
+        query = query.filter(models.Chunk.document_id == document_id)
+
+    for row in query.order_by(models.Chunk.document_id, models.Chunk.chunk_index).yield_per(batch_size):
+        yield chunk_entity.ChunkVector(
+            id=row.id,
+            document_id=row.document_id,
+            content=row.content,
+            content_hash=row.content_hash,
+            page_number=row.page_number,
+            chunk_index=row.chunk_index,
+            embedding=row.embedding,
+            near_duplicate_key=row.near_duplicate_key,
+        )
+
+
+# stored chunks sharing an LSH band with any of the given ones
+def find_near_duplicate_candidates(
+        user_id: int,
+        bands: Iterable[int],
+        db: Session,
+) -> List[chunk_entity.NearDuplicateCandidate]:
+    """
+    Finds the user's stored chunks that share at least one MinHash LSH band hash with `bands`
+    (gin index on minhash_bands); callers confirm them on the full signature
+
+    :param user_id: The ID of the user whose chunks are searched
+    :param bands: Band hashes of the new chunks
+    :param db: Database session
+
+    :return: List of NearDuplicateCandidate
+    """
+    bands = list(set(bands))
+    if not bands:
+        return []
+
+    rows = db.query(
+        models.Chunk.content_hash,
+        models.Chunk.near_duplicate_key,
+        models.Chunk.minhash,
+        models.Chunk.minhash_bands,
+    ).filter(
+        models.Chunk.user_id == user_id,
+        models.Chunk.minhash_bands.op("&&")(cast(bands, ARRAY(BigInteger))),
+    ).all()
+
+    return [
+        chunk_entity.NearDuplicateCandidate(
+            content_hash=row.content_hash,
+            near_duplicate_key=row.near_duplicate_key,
+            minhash=row.minhash,
+            minhash_bands=row.minhash_bands,
+        )
+        for row in rows
+    ]
+
+
+# stored chunks without a MinHash signature, in id order, for the backfill
+def get_chunks_without_minhash(after_id: int, limit: int, db: Session) -> List[chunk_entity.ChunkText]:
+    """
+    Retrieves chunks whose minhash is NULL (stored before e5d2a8b61f07), keyset paginated on id
+
+    :param after_id: Only chunks with a greater ID, the last ID of the previous page
+    :param limit: Maximum number of chunks
+    :param db: Database session
+
+    :return: List of ChunkText in ID order
+    """
+    rows = db.query(
+        models.Chunk.id,
+        models.Chunk.user_id,
+        models.Chunk.content,
+        models.Chunk.content_hash,
+    ).filter(
+        models.Chunk.minhash.is_(None),
+        models.Chunk.id > after_id,
+    ).order_by(models.Chunk.id.asc()).limit(limit).all()
+
+    return [
+        chunk_entity.ChunkText(id=row.id, user_id=row.user_id, content=row.content, content_hash=row.content_hash)
+        for row in rows
+    ]
+
+
+def update_chunk_minhashes(chunks: List[chunk_entity.ChunkMinHash], db: Session) -> int:
+    """
+    Stores computed near-duplicate columns, in one transaction
+
+    :param chunks: List of ChunkMinHash
+    :param db: Database session
+
+    :return: Number of chunks updated
+    """
+    if not chunks:
+        return 0
+    db.bulk_update_mappings(models.Chunk, [
+        {
+            "id": chunk.id,
+            "user_id": chunk.user_id,
+            "minhash": chunk.minhash,
+            "minhash_bands": chunk.minhash_bands,
+            "near_duplicate_key": chunk.near_duplicate_key,
+        }
+        for chunk in chunks
+    ])
+    db.commit()
+    return len(chunks)
@@ -1,10 +1,12 @@
 """
-This module contains functions for accessing and manipulating document data in the database. 
+This module contains functions for accessing and manipulating document data in the database.
 It provides an abstraction layer between the database models and the API routes.
 """
 
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from typing import List
+import datetime
 import logging
 
 from database import models
@@ -14,6 +16,22 @@ from core.entities import document_entity
 logger = logging.getLogger(__name__)
 
 
+def _to_document_entity(doc: models.Document) -> document_entity.DocumentRetrieve:
+    return document_entity.DocumentRetrieve(
+        id=doc.id,
+        user_id=doc.user_id,
+        file_name=doc.file_name,
+        file_size=doc.file_size,
+        content_type=doc.content_type,
+        r2_key=doc.r2_key,
+        created_at=doc.created_at,
+        processing_status=document_entity.ProcessingStatus(doc.processing_status.value),
+        ingestion_attempts=doc.ingestion_attempts,
+        content_hash=doc.content_hash,
+        claimed_at=doc.claimed_at,
+    )
+
+
 # adds a new document record to the database
 def save_document_metadata(
         file_meta_data: document_entity.DocumentCreate, db: Session
@@ -34,7 +52,8 @@ def save_document_metadata(
         file_size=file_meta_data.file_size,
         content_type=file_meta_data.content_type,
         r2_key=file_meta_data.r2_key,
-        processing_status=models.ProcessingStatus.PROCESSING
+        content_hash=file_meta_data.content_hash,
+        processing_status=models.ProcessingStatus.PENDING
     )
 
     # adding the new document record to the database
@@ -42,13 +61,273 @@ def save_document_metadata(
     db.commit()
     db.refresh(new_doc)
 
-    return document_entity.DocumentRetrieve(
-        id=new_doc.id,
-        user_id=new_doc.user_id,
-        file_name=new_doc.file_name,
-        file_size=new_doc.file_size,
-        content_type=new_doc.content_type,
-        r2_key=new_doc.r2_key,
-        created_at=new_doc.created_at,
-        processing_status=document_entity.ProcessingStatus(new_doc.processing_status.value)
-    )
\ No newline at end of file
+    return _to_document_entity(new_doc)
+
+
+# looks up a user's document by the hash of its bytes
+def get_document_by_content_hash(
+        user_id: int, content_hash: str, db: Session
+) -> document_entity.DocumentRetrieve | None:
+    """
+    Retrieves the user's document with the given content hash
+
+    :param user_id: The ID of the user owning the document
+    :param content_hash: sha256 hex digest of the file bytes
+    :param db: Database session
+
+    :return: DocumentRetrieve entity if found, else None
+    """
+    logger.info(f"Querying to db for document of user {user_id} with hash {content_hash}")
+    doc = db.query(models.Document).filter(
+        models.Document.user_id == user_id,
+        models.Document.content_hash == content_hash,
+    ).first()
+    if doc is None:
+        return None
+
+    return _to_document_entity(doc)
+
+
+# looks up the same file uploaded by any user
+def find_document_with_content_hash(
+        content_hash: str, db: Session, processed_only: bool = False
+) -> document_entity.DocumentRetrieve | None:
+    """
+    Retrieves any document (from any user) with the given content hash, used to share
+    the stored blob and its chunks across users
+
+    :param content_hash: sha256 hex digest of the file bytes
+    :param db: Database session
+    :param processed_only: Only consider documents whose chunks are already ingested
+
+    :return: DocumentRetrieve entity if found, else None
+    """
+    doc = db.query(models.Document).filter(models.Document.content_hash == content_hash)
+    if processed_only:
+        doc = doc.filter(models.Document.processing_status == models.ProcessingStatus.PROCESSED)
+    doc = doc.order_by(models.Document.id.asc()).first()
+    if doc is None:
+        return None
+
+    return _to_document_entity(doc)
+
+
+# retrieves a single document's meta data by ID
+def get_document_by_id(document_id: int, db: Session) -> document_entity.DocumentRetrieve | None:
+    """
+    Retrieves a single document's metadata from the database by document ID
+
+    :param document_id: The ID of the document being retrieved
+    :param db: Database session
+
+    :return: DocumentRetrieve entity if found, else None
+    """
+    logger.info(f"Querying to db for document with id: {document_id}")
+    doc = db.query(models.Document).filter(models.Document.id == document_id).first()
+    if doc is None:
+        return None
+
+    return _to_document_entity(doc)
+
+
+# points an existing document at a new file and queues it for re-ingestion
+def replace_document_file(
+        document_id: int, file_meta_data: document_entity.DocumentCreate, db: Session
+) -> document_entity.DocumentRetrieve:
+    """
+    Replaces the file behind an existing document. The stored chunks are kept so the
+    ingestion worker can re-ingest incrementally; the document goes back to PENDING.
+
+    :param document_id: The ID of the document being replaced
+    :param file_meta_data: DocumentCreate entity describing the new file
+    :param db: Database session
+
+    :return: DocumentRetrieve entity of the updated document
+    """
+    logger.info(f"Replacing file of document {document_id} with {file_meta_data.file_name}")
+    doc = db.query(models.Document).filter(models.Document.id == document_id).first()
+
+    doc.file_name = file_meta_data.file_name
+    doc.file_size = file_meta_data.file_size
+    doc.content_type = file_meta_data.content_type
+    doc.r2_key = file_meta_data.r2_key
+    doc.content_hash = file_meta_data.content_hash
+    doc.processing_status = models.ProcessingStatus.PENDING
+    doc.ingestion_attempts = 0
+    doc.next_attempt_at = datetime.datetime.now(datetime.timezone.utc)
+    doc.claimed_at = None
+    doc.last_error = None
+
+    db.commit()
+    db.refresh(doc)
+
+    return _to_document_entity(doc)
+
+
+# counts the documents stored under an R2 key
+def count_documents_with_r2_key(r2_key: str, db: Session) -> int:
+    """
+    Counts the documents (from any user) that reference an R2 object
+
+    :param r2_key: The R2 object key
+    :param db: Database session
+
+    :return: Number of referencing documents
+    """
+    return db.query(models.Document).filter(models.Document.r2_key == r2_key).count()
+
+
+# deletes a document, its chunks go with it (ON DELETE CASCADE)
+def delete_document(document_id: int, db: Session) -> None:
+    """
+    Deletes a document row; postgres deletes its chunks through the foreign key
+
+    :param document_id: The ID of the document being deleted
+    :param db: Database session
+    """
+    logger.info(f"Deleting document {document_id} from the database")
+    db.query(models.Document).filter(models.Document.id == document_id).delete(synchronize_session=False)
+    db.commit()
+
+
+"""
+Methods used by the ingestion worker
+"""
+
+# claims the next document that is due for ingestion
+def claim_next_document(
+        lease_seconds: int,
+        max_attempts: int,
+        db: Session,
+) -> document_entity.DocumentRetrieve | None:
+    """
+    Claims one document for ingestion using FOR UPDATE SKIP LOCKED, so concurrent workers never
+    pick the same row. Pending documents whose retry time has passed are eligible, and so are
+    documents stuck in PROCESSING whose lease expired (the worker holding them died). An expired
+    lease on a document that already used max_attempts moves it to ERROR instead: a file that
+    kills the worker every time would otherwise be reclaimed forever.
+
+    :param lease_seconds: How long a claim is valid before another worker may take the document over
+    :param max_attempts: Claims a document gets before it is given up on
+    :param db: Database session
+
+    :return: DocumentRetrieve entity of the claimed document, or None if nothing is due
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    lease_cutoff = now - datetime.timedelta(seconds=lease_seconds)
+
+    abandoned = db.query(models.Document).filter(
+        models.Document.processing_status == models.ProcessingStatus.PROCESSING,
+        models.Document.claimed_at < lease_cutoff,
+        models.Document.ingestion_attempts >= max_attempts,
+    ).update(
+        {
+            models.Document.processing_status: models.ProcessingStatus.ERROR,
+            models.Document.claimed_at: None,
+            models.Document.last_error: f"Lease expired on attempt {max_attempts} of {max_attempts}, the worker died",
+        },
+        synchronize_session=False,
+    )
+    if abandoned:
+        logger.info(f"Marked {abandoned} documents as errored, their last attempt's lease expired")
+    db.commit()
+
+    doc = db.query(models.Document).filter(
+        or_(
+            and_(
+                models.Document.processing_status == models.ProcessingStatus.PENDING,
+                models.Document.next_attempt_at <= now,
+            ),
+            and_(
+                models.Document.processing_status == models.ProcessingStatus.PROCESSING,
+                models.Document.claimed_at < lease_cutoff,
+                models.Document.ingestion_attempts < max_attempts,
+            ),
+        )
+    )
+    doc = doc.order_by(models.Document.next_attempt_at.asc())
+    doc = doc.with_for_update(skip_locked=True).first()
+
+    if doc is None:
+        # releasing the (empty) transaction
+        db.rollback()
+        return None
+
+    logger.info(f"Claimed document {doc.id} for ingestion (attempt {doc.ingestion_attempts + 1})")
+    doc.processing_status = models.ProcessingStatus.PROCESSING
+    doc.claimed_at = now
+    doc.ingestion_attempts = doc.ingestion_attempts + 1
+    db.commit()
+    db.refresh(doc)
+
+    return _to_document_entity(doc)
+
+
+def _claimed_document(document_id: int, claimed_at: datetime.datetime, db: Session):
+    # claimed_at acts as the claim token: if the document was replaced or re-claimed by
+    # another worker in the meantime, the status update must not touch it
+    return db.query(models.Document).filter(
+        models.Document.id == document_id,
+        models.Document.processing_status == models.ProcessingStatus.PROCESSING,
+        models.Document.claimed_at == claimed_at,
+    )
+
+
+# marks a document as successfully ingested
+def mark_document_processed(document_id: int, claimed_at: datetime.datetime, db: Session) -> int:
+    """
+    Moves a document to PROCESSED and clears its ingestion bookkeeping
+
+    :param document_id: The ID of the ingested document
+    :param claimed_at: claimed_at of the claim that ingested it
+    :param db: Database session
+
+    :return: Number of documents updated, 0 if the claim was lost in the meantime
+    """
+    logger.info(f"Marking document {document_id} as processed")
+    updated = _claimed_document(document_id, claimed_at, db).update(
+        {
+            models.Document.processing_status: models.ProcessingStatus.PROCESSED,
+            models.Document.claimed_at: None,
+            models.Document.last_error: None,
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+    return updated
+
+
+# records a failed ingestion attempt
+def mark_document_failed(
+        document_id: int,
+        claimed_at: datetime.datetime,
+        error: str,
+        retry_at: datetime.datetime | None,
+        db: Session,
+) -> None:
+    """
+    Records a failed ingestion attempt. The document goes back to PENDING until retry_at,
+    or to ERROR when no retry is scheduled.
+
+    :param document_id: The ID of the document that failed
+    :param claimed_at: claimed_at of the claim that failed
+    :param error: Error message stored on the row for debugging
+    :param retry_at: When the document becomes claimable again, None to give up
+    :param db: Database session
+    """
+    values = {
+        models.Document.claimed_at: None,
+        models.Document.last_error: error[:1000],
+    }
+    if retry_at is None:
+        logger.info(f"Marking document {document_id} as errored")
+        values[models.Document.processing_status] = models.ProcessingStatus.ERROR
+    else:
+        logger.info(f"Scheduling document {document_id} for retry at {retry_at}")
+        values[models.Document.processing_status] = models.ProcessingStatus.PENDING
+        values[models.Document.next_attempt_at] = retry_at
+
+    _claimed_document(document_id, claimed_at, db).update(
+        values, synchronize_session=False
+    )
+    db.commit()
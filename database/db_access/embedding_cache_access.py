@@ -0,0 +1,108 @@
+"""
+This module talks to the embedding_cache table, a persistent cache of embeddings keyed by
+(model, sha256 of the text)
+"""
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from typing import Dict, List
+import datetime
+import logging
+
+from database import models
+
+
+logger = logging.getLogger(__name__)
+
+# how stale last_used_at may get before a cache hit refreshes it
+LAST_USED_RESOLUTION = datetime.timedelta(days=1)
+
+
+# fetches cached embeddings and marks them as recently used
+def get_cached_embeddings(model: str, text_hashes: List[str], db: Session) -> Dict[str, List[float]]:
+    """
+    Looks up cached embeddings with a plain SELECT. Hits whose last_used_at is older than
+    LAST_USED_RESOLUTION get it bumped in a separate UPDATE, so most hits write nothing and
+    concurrent lookups of the same texts don't queue on row locks; eviction only needs to
+    tell entries apart at that resolution.
+
+    :param model: Embedding model key
+    :param text_hashes: sha256 hex digests of the texts
+    :param db: Database session
+
+    :return: dict of text_hash -> embedding for the hashes found in the cache
+    """
+    if not text_hashes:
+        return {}
+
+    rows = db.query(
+        models.EmbeddingCache.text_hash,
+        models.EmbeddingCache.embedding,
+    ).filter(
+        models.EmbeddingCache.model == model,
+        models.EmbeddingCache.text_hash.in_(text_hashes),
+    ).all()
+
+    if rows:
+        db.query(models.EmbeddingCache).filter(
+            models.EmbeddingCache.model == model,
+            models.EmbeddingCache.text_hash.in_([text_hash for text_hash, _ in rows]),
+            models.EmbeddingCache.last_used_at < func.now() - LAST_USED_RESOLUTION,
+        ).update({models.EmbeddingCache.last_used_at: func.now()}, synchronize_session=False)
+    db.commit()
+
+    return {text_hash: [float(value) for value in embedding] for text_hash, embedding in rows}
+
+
+# stores new embeddings in the cache
+def save_embeddings(model: str, embeddings: Dict[str, List[float]], db: Session) -> None:
+    """
+    Inserts embeddings into the cache, ignoring ones another process stored meanwhile
+
+    :param model: Embedding model key
+    :param embeddings: dict of text_hash -> embedding
+    :param db: Database session
+    """
+    if not embeddings:
+        return
+
+    db.execute(
+        insert(models.EmbeddingCache)
+        .values([
+            {"model": model, "text_hash": text_hash, "embedding": embedding}
+            for text_hash, embedding in embeddings.items()
+        ])
+        .on_conflict_do_nothing(index_elements=["model", "text_hash"])
+    )
+    db.commit()
+
+
+# trims the cache down to max_entries, least recently used first
+def evict_embeddings(max_entries: int, db: Session) -> int:
+    """
+    Deletes the least recently used entries beyond max_entries
+
+    :param max_entries: Number of entries to keep
+    :param db: Database session
+
+    :return: Number of entries evicted
+    """
+    total = db.query(func.count()).select_from(models.EmbeddingCache).scalar()
+    overflow = total - max_entries
+    if overflow <= 0:
+        return 0
+
+    logger.info(f"Evicting {overflow} embeddings from the cache")
+    oldest = (
+        select(models.EmbeddingCache.model, models.EmbeddingCache.text_hash)
+        .order_by(models.EmbeddingCache.last_used_at.asc())
+        .limit(overflow)
+    )
+    result = db.execute(
+        delete(models.EmbeddingCache).where(
+            tuple_(models.EmbeddingCache.model, models.EmbeddingCache.text_hash).in_(oldest)
+        )
+    )
+    db.commit()
+
+    return result.rowcount
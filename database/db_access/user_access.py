@@ -62,4 +62,33 @@ def create_user(user_info: user_entity.UserCreate, db: Session) -> user_entity.U
         first_name=new_user.first_name,
         last_name=new_user.last_name,
         email=new_user.email,
-    )
\ No newline at end of file
+    )
+
+
+def get_document_set_version(user_id: int, db: Session) -> int:
+    """
+    Gets the version of the user's document set, bumped on every upload, replacement,
+    deletion and finished ingestion
+
+    :param user_id: The ID of the user
+    :param db: Database session
+
+    :return: The current document set version
+    """
+    version = db.query(models.User.document_set_version).filter(models.User.id == user_id).scalar()
+    return version or 0
+
+
+def bump_document_set_version(user_id: int, db: Session) -> None:
+    """
+    Increments the version of the user's document set, atomically in the database
+
+    :param user_id: The ID of the user
+    :param db: Database session
+    """
+    logger.info(f"Bumping document set version of user {user_id}")
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.document_set_version: models.User.document_set_version + 1},
+        synchronize_session=False,
+    )
+    db.commit()
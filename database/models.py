@@ -1,4 +1,8 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, ARRAY, Float, Enum
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Boolean, ForeignKey, ARRAY, Float, Enum, Index, LargeBinary,
+    DDL, event,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from sqlalchemy.sql.expression import text
@@ -13,6 +17,18 @@ from core.entities.chat_entity import Role
 from core.entities.document_entity import ProcessingStatus
 
 
+# fixed by the chunks HNSW migration, must match settings.EMBEDDING_DIMENSIONS
+# hnsw indexes vector columns of up to 2000 dimensions, so the index is built on a halfvec cast
+CHUNK_EMBEDDING_DIMENSIONS = 3072
+# prefix indexed for VECTOR_SEARCH_MODE=matryoshka, fixed by its migration
+CHUNK_MATRYOSHKA_DIMENSIONS = 512
+# chunks is hash partitioned on user_id, fixed by the partitioning migration; a user's
+# search only touches one partition and that partition's (smaller) indexes
+CHUNK_PARTITIONS = 16
+# text search configuration of chunks.content_tsv, lexical queries must use the same one
+CHUNK_TEXT_SEARCH_CONFIG = "english"
+
+
 class User(Base):
     # id, email, hased_password
     __tablename__ = "users"
@@ -23,6 +39,8 @@ class User(Base):
     email = Column(String(100), unique=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("now()"))
+    # bumped whenever the user's searchable documents change, invalidates cached answers
+    document_set_version = Column(Integer, nullable=False, default=0, server_default=text("0"))
 
     # relationships
     documents = relationship("Document", back_populates="owner")
@@ -39,29 +57,131 @@ class Document(Base):
     file_size = Column(Integer, nullable=False)
     content_type = Column(String, nullable=False)
     r2_key = Column(String, nullable=False)
+    content_hash = Column(String(64), nullable=True)    # sha256 hex digest of the file bytes
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
     processing_status = Column(
         Enum(ProcessingStatus), 
-        default=ProcessingStatus.PROCESSING, nullable=False
+        default=ProcessingStatus.PENDING, nullable=False
     )
 
+    # ingestion bookkeeping, owned by the ingestion worker
+    ingestion_attempts = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    next_attempt_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("now()"))
+    claimed_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    last_error = Column(String, nullable=True)
+
     # relationships
     owner = relationship("User", back_populates="documents")
     chunks = relationship("Chunk", back_populates="document", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # the worker polls on (status, next_attempt_at)
+        Index("ix_documents_processing_status_next_attempt_at", "processing_status", "next_attempt_at"),
+        # one copy of a file per user, and fast lookup of the same file across users
+        Index("ux_documents_user_id_content_hash", "user_id", "content_hash", unique=True),
+        Index("ix_documents_content_hash", "content_hash"),
+    )
+
 
 class Chunk(Base):
-    # id, document_id(FK), content, embedding
+    # id, document_id(FK), user_id(FK), content, embedding
     __tablename__ = "chunks"
 
-    id = Column(Integer, primary_key=True, nullable=False)
+    # the primary key of a partitioned table must include the partition key; id alone is still
+    # unique (one sequence) and is the ORM identity, see __mapper_args__
+    id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
     document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, nullable=False)   # = documents.user_id
     content = Column(String, nullable=False)
-    embedding = Column(Vector)
+    embedding = Column(Vector(CHUNK_EMBEDDING_DIMENSIONS))
+    content_hash = Column(String(64), nullable=True)    # sha256 hex digest of content
+    chunk_index = Column(Integer, nullable=True)        # position of the chunk within the document
+    page_number = Column(Integer, nullable=True)        # 0-based page the chunk was cut from
+    char_start = Column(Integer, nullable=True)         # character offsets of the chunk within that page
+    char_end = Column(Integer, nullable=True)
+    # near-duplicate detection (core/RAG/minhash.py): chunks in the same cluster share a key,
+    # the content_hash of the first chunk of the cluster
+    minhash = Column(LargeBinary, nullable=True)                    # NUM_PERM little endian uint32
+    minhash_bands = Column(ARRAY(BigInteger), nullable=True)        # LSH band hashes
+    near_duplicate_key = Column(String(64), nullable=True)
+    # lexical search, computed from content by the chunks_content_tsv trigger (a generated
+    # column could only have been added to the existing table by rewriting it)
+    content_tsv = Column(TSVECTOR, nullable=True)
 
     # relationships
     document = relationship("Document", back_populates="chunks")
 
+    __table_args__ = (
+        # re-ingestion diffs a document's chunks by hash
+        Index("ix_chunks_document_id_content_hash", "document_id", "content_hash"),
+        # similarity search is always scoped to a user
+        Index("ix_chunks_user_id", "user_id"),
+        # approximate nearest neighbour search on cosine distance, queries must use the same cast
+        Index(
+            "ix_chunks_embedding_hnsw",
+            text(f"(embedding::halfvec({CHUNK_EMBEDDING_DIMENSIONS})) halfvec_cosine_ops"),
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+        ),
+        # VECTOR_SEARCH_MODE=binary: 1 bit per dimension (384 bytes per chunk instead of 6 KB),
+        # first pass only, candidates are rescored on the full precision embedding
+        Index(
+            "ix_chunks_embedding_binary_hnsw",
+            text(f"(binary_quantize(embedding)::bit({CHUNK_EMBEDDING_DIMENSIONS})) bit_hamming_ops"),
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+        ),
+        # VECTOR_SEARCH_MODE=matryoshka: the first 512 dimensions (2 KB per chunk), cosine distance
+        # ignores the norm so the prefix needs no renormalizing; rescored like the binary index
+        Index(
+            "ix_chunks_embedding_prefix_hnsw",
+            text(f"(subvector(embedding, 1, {CHUNK_MATRYOSHKA_DIMENSIONS})::vector({CHUNK_MATRYOSHKA_DIMENSIONS})) vector_cosine_ops"),
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+        ),
+        # full text search on exact terms (names, skills, acronyms) the embeddings miss
+        Index("ix_chunks_content_tsv", "content_tsv", postgresql_using="gin"),
+        # near-duplicate candidates share a band hash (minhash_bands && ...)
+        Index("ix_chunks_minhash_bands", "minhash_bands", postgresql_using="gin"),
+        # partitions chunks_p00 .. chunks_p15 are created by the migration, each with its own indexes
+        {"postgresql_partition_by": "HASH (user_id)"},
+    )
+    __mapper_args__ = {"primary_key": [id]}
+
+
+# the same trigger as the content_tsv migration, for create_all
+event.listen(Chunk.__table__, "after_create", DDL(
+    "CREATE OR REPLACE FUNCTION chunks_content_tsv() RETURNS trigger LANGUAGE plpgsql AS $$\n"
+    "BEGIN\n"
+    f"    NEW.content_tsv := to_tsvector('{CHUNK_TEXT_SEARCH_CONFIG}', NEW.content);\n"
+    "    RETURN NEW;\n"
+    "END\n"
+    "$$"
+))
+event.listen(Chunk.__table__, "after_create", DDL(
+    "CREATE TRIGGER chunks_content_tsv BEFORE INSERT OR UPDATE OF content ON chunks "
+    "FOR EACH ROW EXECUTE FUNCTION chunks_content_tsv()"
+))
+
+# a partitioned table takes no rows until its partitions exist; create_all (api startup on an
+# empty database) makes the same partitions as the migration
+for _remainder in range(CHUNK_PARTITIONS):
+    event.listen(Chunk.__table__, "after_create", DDL(
+        f"CREATE TABLE chunks_p{_remainder:02d} PARTITION OF chunks "
+        f"FOR VALUES WITH (MODULUS {CHUNK_PARTITIONS}, REMAINDER {_remainder})"
+    ))
+
+
+class EmbeddingCache(Base):
+    # model, text_hash, embedding, last_used_at
+    __tablename__ = "embedding_cache"
+
+    model = Column(String, primary_key=True, nullable=False)             # embedding model (and dimensions)
+    text_hash = Column(String(64), primary_key=True, nullable=False)     # sha256 hex digest of the text
+    embedding = Column(Vector, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("now()"))
+    last_used_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("now()"), index=True)
+
 
 class Chat(Base):
     # id, user_id (FK), title, created_at